@@ -0,0 +1,217 @@
+"""
+Autor: Steeven Vargas
+Fecha: Noviembre 2024
+Descripción: Comandos administrativos de mantenimiento de la base de datos.
+             Uso: python administrar.py <comando> [opciones]
+Argumentos entrada: Comando y opciones por línea de comandos
+Returns: None
+Modificaciones: Ninguna
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import app, db
+from sqlalchemy import func, text
+
+from modelos import Analisis, Etiqueta, Usuario, aplicar_migraciones
+from modelos.migraciones import SENTENCIA_RECONCILIAR_TOTALES
+from servicios.servicio_interpretacion import ServicioInterpretacion
+from servicios.servicio_analisis import ServicioAnalisis
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def sembrar_traducciones(argumentos):
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Pre-carga el diccionario de traducciones con todas las etiquetas
+                 de los análisis existentes que aún no estén traducidas
+    Argumentos entrada:
+        argumentos: Namespace con tamano_lote
+    Returns: None
+    Modificaciones: Ninguna
+    """
+    with app.app_context():
+        print("=" * 60)
+        print("🌐 SEMBRANDO DICCIONARIO DE TRADUCCIONES")
+        print("=" * 60)
+
+        aplicar_migraciones()
+
+        diccionario = app.extensions['diccionario_traducciones']
+
+        terminos = {nombre for (nombre,) in db.session.query(Etiqueta.nombre).yield_per(1000)}
+
+        print(f"\n📋 Términos distintos en análisis: {len(terminos)}")
+
+        conocidos = diccionario.buscar(list(terminos))
+        faltantes = sorted(terminos - set(conocidos))
+        print(f"   Ya traducidos: {len(conocidos)}")
+        print(f"   Por traducir: {len(faltantes)}")
+
+        insertados = 0
+        for inicio in range(0, len(faltantes), argumentos.tamano_lote):
+            lote = faltantes[inicio:inicio + argumentos.tamano_lote]
+            traducciones = ServicioInterpretacion.traducir_lote(lote)
+            insertados += diccionario.guardar(dict(zip(lote, traducciones)))
+            print(f"   ... {min(inicio + len(lote), len(faltantes))}/{len(faltantes)}")
+
+        print(f"\n✅ Traducciones nuevas registradas: {insertados}")
+        print("=" * 60)
+
+
+def migrar(argumentos):
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Crea tablas nuevas y aplica las migraciones de esquema pendientes
+    Argumentos entrada:
+        argumentos: Namespace (sin opciones)
+    Returns: None
+    Modificaciones: Ninguna
+    """
+    with app.app_context():
+        print("🗄️  Aplicando migraciones de esquema...")
+        db.create_all()
+        aplicar_migraciones()
+        print("✅ Esquema actualizado")
+
+
+def rellenar_interpretaciones(argumentos):
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Calcula y guarda la traducción e interpretación de los análisis
+                 creados antes de que se almacenaran junto al registro
+    Argumentos entrada:
+        argumentos: Namespace con tamano_lote
+    Returns: None
+    Modificaciones: Ninguna
+    """
+    with app.app_context():
+        print("=" * 60)
+        print("📝 RELLENANDO INTERPRETACIONES DE ANÁLISIS")
+        print("=" * 60)
+
+        aplicar_migraciones()
+
+        pendientes = Analisis.query.filter(
+            (Analisis.interpretacion.is_(None)) | (Analisis.etiquetas_traducidas_json.is_(None))
+        ).count()
+        print(f"\n📋 Análisis sin interpretación: {pendientes}")
+
+        procesados = 0
+        ultimo_id = ''
+        while True:
+            lote = Analisis.query.filter(
+                Analisis.id > ultimo_id,
+                (Analisis.interpretacion.is_(None)) | (Analisis.etiquetas_traducidas_json.is_(None))
+            ).order_by(Analisis.id).limit(argumentos.tamano_lote).all()
+
+            if not lote:
+                break
+
+            for analisis in lote:
+                ServicioAnalisis.obtener_resultados_procesados(analisis, guardar=False)
+            db.session.commit()
+
+            ultimo_id = lote[-1].id
+            procesados += len(lote)
+            print(f"   ... {procesados}/{pendientes}")
+
+        print(f"\n✅ Análisis actualizados: {procesados}")
+        print("=" * 60)
+
+
+def reconciliar_contadores(argumentos):
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Recalcula usuarios.total_analisis desde la tabla analisis y
+                 reporta los usuarios cuyo contador estaba desfasado
+    Argumentos entrada:
+        argumentos: Namespace con solo_revisar
+    Returns: None
+    Modificaciones: Ninguna
+    """
+    with app.app_context():
+        print("=" * 60)
+        print("🔢 RECONCILIANDO CONTADORES DE ANÁLISIS")
+        print("=" * 60)
+
+        aplicar_migraciones()
+
+        conteos = db.session.query(
+            Analisis.usuario_id, func.count(Analisis.id).label('total')
+        ).group_by(Analisis.usuario_id).subquery()
+        real = func.coalesce(conteos.c.total, 0)
+
+        desfasados = db.session.query(
+            Usuario.nombre_usuario, Usuario.total_analisis, real
+        ).outerjoin(conteos, conteos.c.usuario_id == Usuario.id).filter(
+            Usuario.total_analisis != real
+        ).all()
+
+        print(f"\n📋 Usuarios con contador desfasado: {len(desfasados)}")
+        for nombre_usuario, guardado, contado in desfasados:
+            print(f"   {nombre_usuario}: {guardado} -> {contado}")
+
+        if argumentos.solo_revisar or not desfasados:
+            print("=" * 60)
+            return
+
+        db.session.execute(text(SENTENCIA_RECONCILIAR_TOTALES))
+        db.session.commit()
+
+        print(f"\n✅ Contadores corregidos: {len(desfasados)}")
+        print("=" * 60)
+
+
+def crear_parser():
+    """Construye el parser de argumentos con todos los comandos"""
+    parser = argparse.ArgumentParser(description="Comandos administrativos del backend")
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    comando = comandos.add_parser(
+        'sembrar-traducciones',
+        help="Pre-carga el diccionario de traducciones desde los análisis existentes"
+    )
+    comando.add_argument('--tamano-lote', type=int, default=50,
+                         help="Etiquetas por llamada al traductor (por defecto 50)")
+    comando.set_defaults(funcion=sembrar_traducciones)
+
+    comando = comandos.add_parser('migrar', help="Aplica las migraciones de esquema pendientes")
+    comando.set_defaults(funcion=migrar)
+
+    comando = comandos.add_parser(
+        'rellenar-interpretaciones',
+        help="Guarda traducción e interpretación en los análisis que no las tienen"
+    )
+    comando.add_argument('--tamano-lote', type=int, default=100,
+                         help="Análisis confirmados por transacción (por defecto 100)")
+    comando.set_defaults(funcion=rellenar_interpretaciones)
+
+    comando = comandos.add_parser(
+        'reconciliar-contadores',
+        help="Recalcula total_analisis de cada usuario desde la tabla de análisis"
+    )
+    comando.add_argument('--solo-revisar', action='store_true',
+                         help="Solo muestra los contadores desfasados, sin corregirlos")
+    comando.set_defaults(funcion=reconciliar_contadores)
+
+    return parser
+
+
+if __name__ == '__main__':
+    argumentos = crear_parser().parse_args()
+    try:
+        argumentos.funcion(argumentos)
+    except Exception as e:
+        print(f"\n❌ ERROR: {str(e)}")
+        sys.exit(1)
@@ -12,12 +12,22 @@ import os
 from flask import Flask, jsonify
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
+from werkzeug.middleware.proxy_fix import ProxyFix
 from dotenv import load_dotenv
 
 from config.configuracion import Configuracion
-from config.seguridad import configurar_headers_seguridad
+from config.seguridad import configurar_headers_seguridad, PeticionLimitePorRuta
+from config.registro_eventos import configurar_registro
 
-from modelos import db, inicializar_base_datos
+from modelos import db, inicializar_base_datos, aplicar_migraciones
+from utilidades.cache_resultados import CacheResultadosIA
+from utilidades.limitador import crear_limitador
+from utilidades.captcha import crear_registro_usos
+from servicios.cola_analisis import ColaAnalisis
+from servicios.diccionario_traducciones import DiccionarioTraducciones
+from servicios.pool_contrasenas import PoolContrasenas
+from servicios.registro_sesiones import RegistroSesiones
+from servicios.cache_usuarios import CacheUsuarios
 
 from rutas.autenticacion import autenticacion_bp
 from rutas.analisis import analisis_bp
@@ -38,8 +48,15 @@ def crear_aplicacion(configuracion_clase=Configuracion):
     """
 
     app = Flask(__name__)
+    app.request_class = PeticionLimitePorRuta
 
     app.config.from_object(configuracion_clase)
+    
+    configurar_registro(app)
+    
+    if app.config.get('PROXIES_CONFIABLES'):
+        proxies = app.config['PROXIES_CONFIABLES']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies)
 
     directorio_base = os.path.abspath(os.path.dirname(__file__))
     os.makedirs(os.path.join(directorio_base, "datos"), exist_ok=True)
@@ -56,6 +73,9 @@ def crear_aplicacion(configuracion_clase=Configuracion):
     with app.app_context():
         try:
             db.create_all()
+            aplicar_migraciones()
+            app.extensions['diccionario_traducciones'].cargar()
+            app.extensions['cola_analisis'].marcar_interrumpidos()
         except Exception as e:
             print(f"⚠️  Error al crear tablas: {e}")
 
@@ -66,15 +86,69 @@ def inicializar_extensiones(app):
     """
     Autor: Steeven Vargas
     Fecha: Noviembre 2024
-    Descripción: Inicializa las extensiones de Flask (CORS, JWT, BD)
+    Descripción: Inicializa las extensiones de Flask (CORS, JWT, BD, caché de IA,
+                 diccionario de traducciones, cola de análisis, limitador,
+                 registro de captchas usados, pool de contraseñas, registro
+                 de sesiones, caché de usuarios)
     Argumentos entrada:
         app: Instancia de Flask
     Returns: None
-    Modificaciones: Ninguna
+    Modificaciones: Registro de caché de IA, diccionario de traducciones, cola de
+                    análisis, almacén del limitador, registro de captchas usados
+                    pool de contraseñas, registro de sesiones por lotes y
+                    caché de usuarios
     """
     
     db.init_app(app)
     
+    if app.config.get('CACHE_IA_HABILITADA'):
+        app.extensions['cache_ia'] = CacheResultadosIA(
+            tamano_memoria=app.config['CACHE_IA_TAMANO_MEMORIA'],
+            ruta_bd=app.config['CACHE_IA_RUTA'],
+            ttl_segundos=app.config['CACHE_IA_TTL_SEGUNDOS'],
+            max_entradas_disco=app.config['CACHE_IA_MAX_ENTRADAS_DISCO']
+        )
+    
+    app.extensions['diccionario_traducciones'] = DiccionarioTraducciones(
+        tamano_memoria=app.config['TAMANO_DICCIONARIO_TRADUCCIONES']
+    )
+    
+    app.extensions['cola_analisis'] = ColaAnalisis(
+        app,
+        max_trabajadores=app.config['TRABAJADORES_ANALISIS'],
+        max_en_cola=app.config['MAX_TRABAJOS_EN_COLA']
+    )
+    
+    app.extensions['limitador_peticiones'] = crear_limitador(
+        backend=app.config['LIMITADOR_BACKEND'],
+        ventana_segundos=60,
+        ruta_bd=app.config['LIMITADOR_RUTA_BD'],
+        url_redis=app.config['LIMITADOR_URL_REDIS']
+    )
+    
+    app.extensions['pool_contrasenas'] = PoolContrasenas(
+        max_hilos=app.config['HILOS_CONTRASENAS'],
+        max_pendientes=app.config['MAX_CONTRASENAS_EN_COLA']
+    )
+    
+    app.extensions['registro_sesiones'] = RegistroSesiones(
+        app,
+        max_pendientes=app.config['SESIONES_LOTE_MAXIMO'],
+        intervalo_segundos=app.config['SESIONES_INTERVALO_SEGUNDOS']
+    )
+    
+    app.extensions['cache_usuarios'] = CacheUsuarios(
+        tamano_maximo=app.config['CACHE_USUARIOS_TAMANO'],
+        ttl_segundos=app.config['CACHE_USUARIOS_TTL_SEGUNDOS']
+    )
+    
+    if app.config.get('CAPTCHA_SIN_ESTADO'):
+        app.extensions['registro_captchas'] = crear_registro_usos(
+            backend=app.config['LIMITADOR_BACKEND'],
+            ruta_bd=app.config['LIMITADOR_RUTA_BD'],
+            url_redis=app.config['LIMITADOR_URL_REDIS']
+        )
+    
     CORS(app, 
          origins=[app.config['URL_FRONTEND']],
          supports_credentials=True,
@@ -174,6 +248,9 @@ def registrar_blueprints(app):
                 },
                 'analisis': {
                     'analizar': '/api/analizar',
+                    'analizar_lote': '/api/analizar/lote',
+                    'cache': '/api/analizar/cache',
+                    'estado': '/api/analisis/<id>/estado',
                     'historial': '/api/historial',
                     'detalle': '/api/historial/<id>',
                     'eliminar': '/api/historial/<id>'
@@ -17,6 +17,27 @@ load_dotenv()
 DIRECTORIO_BASE = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
 
 
+def leer_limites_por_ruta(valor, por_defecto):
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Combina los límites por ruta por defecto con los de la variable
+                 de entorno, en formato 'endpoint=limite,endpoint=limite'
+    Argumentos entrada:
+        valor (str): Contenido de la variable de entorno (puede estar vacío)
+        por_defecto (dict): Límites por defecto {endpoint: peticiones por minuto}
+    Returns:
+        dict: Límites por endpoint
+    Modificaciones: Ninguna
+    """
+    limites = dict(por_defecto)
+    for par in (valor or '').split(','):
+        if '=' in par:
+            endpoint, limite = par.split('=', 1)
+            limites[endpoint.strip()] = int(limite)
+    return limites
+
+
 class Configuracion:
     """
     Autor: Steeven Vargas
@@ -47,6 +68,26 @@ class Configuracion:
     tiempo_expiracion = int(os.getenv('TIEMPO_EXPIRACION_JWT', 24))
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=tiempo_expiracion)
     
+    # Factor de costo de bcrypt (cada punto duplica el tiempo de hash).
+    # Medir con: python -m rendimiento.bench_bcrypt
+    BCRYPT_RONDAS = int(os.getenv('BCRYPT_RONDAS', 12))
+    
+    # Pool de hilos para bcrypt: hashes simultáneos y tope de operaciones
+    # pendientes antes de responder 503 a registros e inicios de sesión
+    HILOS_CONTRASENAS = int(os.getenv('HILOS_CONTRASENAS', 2))
+    MAX_CONTRASENAS_EN_COLA = int(os.getenv('MAX_CONTRASENAS_EN_COLA', 16))
+    
+    # Fechas de última sesión: se escriben por lotes cada intervalo o al
+    # acumular este número de usuarios, en lugar de un commit por login
+    SESIONES_LOTE_MAXIMO = int(os.getenv('SESIONES_LOTE_MAXIMO', 100))
+    SESIONES_INTERVALO_SEGUNDOS = float(os.getenv('SESIONES_INTERVALO_SEGUNDOS', 30))
+    
+    # Caché por proceso de usuarios activos (evita una consulta por petición
+    # autenticada). Un usuario desactivado en otro worker deja de ser válido
+    # a más tardar tras el TTL
+    CACHE_USUARIOS_TAMANO = int(os.getenv('CACHE_USUARIOS_TAMANO', 1024))
+    CACHE_USUARIOS_TTL_SEGUNDOS = int(os.getenv('CACHE_USUARIOS_TTL_SEGUNDOS', 60))
+    
 
     MAX_CONTENT_LENGTH = int(os.getenv('TAMANO_MAXIMO_ARCHIVO', 5 * 1024 * 1024))  # 5MB
     
@@ -69,9 +110,44 @@ class Configuracion:
         os.getenv('CREDENCIALES_GOOGLE', './credenciales/google-vision.json')
     )
     
+    GOOGLE_VISION_CANALES = int(os.getenv('GOOGLE_VISION_CANALES', 1))
+    GOOGLE_VISION_TIMEOUT = int(os.getenv('GOOGLE_VISION_TIMEOUT', 30))
+    
     IMAGGA_API_KEY = os.getenv('IMAGGA_API_KEY', '')
     IMAGGA_API_SECRET = os.getenv('IMAGGA_API_SECRET', '')
     IMAGGA_ENDPOINT = os.getenv('IMAGGA_ENDPOINT', 'https://api.imagga.com/v2/tags')
+    IMAGGA_TIMEOUT = int(os.getenv('IMAGGA_TIMEOUT', 30))
+    IMAGGA_TAMANO_POOL = int(os.getenv('IMAGGA_TAMANO_POOL', 10))
+    IMAGGA_REINTENTOS = int(os.getenv('IMAGGA_REINTENTOS', 3))
+    IMAGGA_FACTOR_BACKOFF = float(os.getenv('IMAGGA_FACTOR_BACKOFF', 0.5))
+    IMAGGA_UMBRAL_FALLOS = int(os.getenv('IMAGGA_UMBRAL_FALLOS', 5))
+    IMAGGA_SEGUNDOS_APERTURA = int(os.getenv('IMAGGA_SEGUNDOS_APERTURA', 30))
+    
+    MAX_RESULTADOS_IA = int(os.getenv('MAX_RESULTADOS_IA', 10))
+    HILOS_POR_PROVEEDOR = int(os.getenv('HILOS_POR_PROVEEDOR', 4))
+    
+    
+    
+    TAMANO_DICCIONARIO_TRADUCCIONES = int(os.getenv('TAMANO_DICCIONARIO_TRADUCCIONES', 5000))
+    
+    ANALISIS_ASINCRONO = os.getenv('ANALISIS_ASINCRONO', 'False') == 'True'
+    TRABAJADORES_ANALISIS = int(os.getenv('TRABAJADORES_ANALISIS', 4))
+    MAX_TRABAJOS_EN_COLA = int(os.getenv('MAX_TRABAJOS_EN_COLA', 100))
+    
+    MAX_ARCHIVOS_LOTE = int(os.getenv('MAX_ARCHIVOS_LOTE', 20))
+    MAX_HILOS_LOTE = int(os.getenv('MAX_HILOS_LOTE', 4))
+    TAMANO_MAXIMO_LOTE = int(os.getenv('TAMANO_MAXIMO_LOTE', 50 * 1024 * 1024))  # 50MB
+    
+    
+    
+    CACHE_IA_HABILITADA = os.getenv('CACHE_IA_HABILITADA', 'True') == 'True'
+    CACHE_IA_TAMANO_MEMORIA = int(os.getenv('CACHE_IA_TAMANO_MEMORIA', 256))
+    CACHE_IA_RUTA = os.getenv(
+        'CACHE_IA_RUTA',
+        os.path.join(DIRECTORIO_BASE, 'datos', 'cache_ia.db')
+    )
+    CACHE_IA_TTL_SEGUNDOS = int(os.getenv('CACHE_IA_TTL_SEGUNDOS', 7 * 24 * 3600))
+    CACHE_IA_MAX_ENTRADAS_DISCO = int(os.getenv('CACHE_IA_MAX_ENTRADAS_DISCO', 10000))
     
     
     
@@ -84,15 +160,38 @@ class Configuracion:
     
     
     LIMITE_PETICIONES_POR_MINUTO = int(os.getenv('LIMITE_PETICIONES_POR_MINUTO', 10))
+    LIMITES_POR_RUTA = leer_limites_por_ruta(os.getenv('LIMITES_POR_RUTA'), {
+        'autenticacion.registrar': 5,
+        'autenticacion.iniciar_sesion': 10,
+        'analisis.analizar_imagen': 10,
+        'analisis.analizar_lote': 5
+    })
+    
+    # Proxies inversos delante de la app (nginx = 1) cuyo X-Forwarded-For es confiable
+    PROXIES_CONFIABLES = int(os.getenv('PROXIES_CONFIABLES', 0))
+    
+    # 'memoria' (por worker), 'sqlite' (compartido en el host) o 'redis' (entre hosts)
+    LIMITADOR_BACKEND = os.getenv('LIMITADOR_BACKEND', 'sqlite')
+    LIMITADOR_RUTA_BD = os.getenv(
+        'LIMITADOR_RUTA_BD',
+        os.path.join(DIRECTORIO_BASE, 'datos', 'limitador.db')
+    )
+    LIMITADOR_URL_REDIS = os.getenv('LIMITADOR_URL_REDIS', '')
     
     
     
-    NIVEL_LOG = os.getenv('NIVEL_LOG', 'DEBUG')
+    # Nivel global y, opcionalmente, por módulo: 'INFO,utilidades.captcha=DEBUG'
+    NIVEL_LOG = os.getenv('NIVEL_LOG', 'INFO')
     DIRECTORIO_LOGS = os.path.join(DIRECTORIO_BASE, 'logs')
     os.makedirs(DIRECTORIO_LOGS, exist_ok=True)
+    ARCHIVO_LOG = os.path.join(DIRECTORIO_LOGS, 'backend.log')
     
     
     
+    # Captcha firmado con HMAC: no requiere memoria compartida entre workers;
+    # los tokens usados se registran en el almacén del limitador
+    CAPTCHA_SIN_ESTADO = os.getenv('CAPTCHA_SIN_ESTADO', 'False') == 'True'
+    
     RECAPTCHA_SITE_KEY = os.getenv('RECAPTCHA_SITE_KEY', '')
     RECAPTCHA_SECRET_KEY = os.getenv('RECAPTCHA_SECRET_KEY', '')
     
@@ -157,6 +256,14 @@ class ConfiguracionPruebas(Configuracion):
     WTF_CSRF_ENABLED = False
     
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=5)
+    
+    BCRYPT_RONDAS = 4
+    
+    CACHE_IA_RUTA = None
+    
+    LIMITADOR_BACKEND = 'memoria'
+    
+    ARCHIVO_LOG = None
 
 
 class ConfiguracionProduccion(Configuracion):
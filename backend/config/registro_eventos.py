@@ -0,0 +1,145 @@
+"""
+Autor: Steeven Vargas
+Fecha: Noviembre 2024
+Descripción: Configuración del registro de eventos (logging) del backend.
+             Los módulos escriben en una cola en memoria (QueueHandler) y un
+             hilo aparte (QueueListener) hace la escritura a consola y archivo,
+             de modo que un log no bloquea la petición. Los niveles se leen de
+             NIVEL_LOG: 'INFO' o 'INFO,utilidades.captcha=DEBUG,sqlalchemy=WARNING'.
+             La raíz nunca baja de INFO, para que el DEBUG de librerías
+             (urllib3, werkzeug, sqlalchemy) no pase por la cola; DEBUG solo se
+             aplica a los módulos indicados.
+Argumentos entrada: Ninguno
+Returns: configurar_registro, interpretar_niveles, detener_registro
+Modificaciones: Ninguna
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+
+FORMATO_LOG = '%(asctime)s %(levelname)s [%(name)s] %(message)s'
+NIVEL_MINIMO_RAIZ = logging.INFO
+
+_oyente = None
+_manejadores = []
+
+
+def interpretar_niveles(valor):
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Interpreta NIVEL_LOG
+    Argumentos entrada:
+        valor (str): Nivel global y niveles por módulo separados por comas
+    Returns:
+        tuple: (int nivel global, dict {modulo: int nivel})
+    Raises:
+        ValueError: Si algún nivel no existe
+    Modificaciones: Ninguna
+    """
+    nivel_global = logging.INFO
+    niveles = {}
+
+    for parte in (valor or '').split(','):
+        parte = parte.strip()
+        if not parte:
+            continue
+
+        modulo, _, nombre_nivel = parte.rpartition('=')
+        nivel = logging.getLevelName(nombre_nivel.strip().upper())
+        if not isinstance(nivel, int):
+            raise ValueError(f"Nivel de log no válido: {nombre_nivel}")
+
+        if modulo:
+            niveles[modulo.strip()] = nivel
+        else:
+            nivel_global = nivel
+
+    return nivel_global, niveles
+
+
+def _iniciar_oyente():
+    """Conecta la raíz a una cola nueva y arranca el hilo que la vacía"""
+    global _oyente
+
+    cola = queue.SimpleQueue()
+    _oyente = logging.handlers.QueueListener(cola, *_manejadores, respect_handler_level=True)
+    _oyente.start()
+
+    raiz = logging.getLogger()
+    for manejador in list(raiz.handlers):
+        if isinstance(manejador, logging.handlers.QueueHandler):
+            raiz.removeHandler(manejador)
+    raiz.addHandler(logging.handlers.QueueHandler(cola))
+
+
+def _reiniciar_tras_fork():
+    """El hilo del oyente no sobrevive a un fork: el hijo arranca el suyo"""
+    if _oyente is not None:
+        _iniciar_oyente()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reiniciar_tras_fork)
+
+
+def configurar_registro(app):
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Configura el logging del proceso. Los manejadores y el hilo se
+                 crean una sola vez; llamadas posteriores solo ajustan niveles.
+                 Un nivel global por debajo de NIVEL_MINIMO_RAIZ se eleva a ese
+                 mínimo; los niveles por módulo se aplican tal cual.
+    Argumentos entrada:
+        app: Instancia de Flask (usa NIVEL_LOG, ARCHIVO_LOG y SQLALCHEMY_ECHO)
+    Returns: None
+    Modificaciones: Ninguna
+    """
+    nivel_global, niveles = interpretar_niveles(app.config.get('NIVEL_LOG'))
+
+    if not _manejadores:
+        formato = logging.Formatter(FORMATO_LOG)
+
+        consola = logging.StreamHandler(sys.stderr)
+        consola.setFormatter(formato)
+        _manejadores.append(consola)
+
+        archivo_log = app.config.get('ARCHIVO_LOG')
+        if archivo_log:
+            os.makedirs(os.path.dirname(archivo_log), exist_ok=True)
+            archivo = logging.handlers.RotatingFileHandler(
+                archivo_log,
+                maxBytes=10 * 1024 * 1024,
+                backupCount=5,
+                encoding='utf-8'
+            )
+            archivo.setFormatter(formato)
+            _manejadores.append(archivo)
+
+        atexit.register(detener_registro)
+
+    if _oyente is None:
+        _iniciar_oyente()
+
+    logging.getLogger().setLevel(max(nivel_global, NIVEL_MINIMO_RAIZ))
+    for modulo, nivel in niveles.items():
+        logging.getLogger(modulo).setLevel(nivel)
+
+    # Con SQLALCHEMY_ECHO SQLAlchemy ya imprime el SQL con su propio manejador;
+    # si además se propaga a la raíz, cada sentencia sale dos veces
+    logging.getLogger('sqlalchemy.engine').propagate = not app.config.get('SQLALCHEMY_ECHO')
+
+
+def detener_registro():
+    """Vacía la cola pendiente y detiene el hilo del oyente"""
+    global _oyente
+
+    if _oyente is not None:
+        _oyente.stop()
+        _oyente = None
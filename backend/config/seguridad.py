@@ -8,10 +8,17 @@ Returns: Funciones de configuración de seguridad
 Modificaciones: Ninguna
 """
 
+import logging
+import math
 import secrets
-from flask import request, jsonify
+from flask import Request, current_app, request, jsonify, make_response
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
 from functools import wraps
-from datetime import datetime, timedelta
+
+from utilidades.limitador import LimitadorMemoria
+
+
+registro = logging.getLogger(__name__)
 
 
 def configurar_headers_seguridad(app):
@@ -62,6 +69,27 @@ def configurar_headers_seguridad(app):
         return response
 
 
+class PeticionLimitePorRuta(Request):
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Petición que permite un tamaño máximo de cuerpo mayor en los
+                 endpoints de carga por lotes (TAMANO_MAXIMO_LOTE). El resto de
+                 endpoints mantiene MAX_CONTENT_LENGTH.
+    """
+
+    ENDPOINTS_LOTE = {'analisis.analizar_lote'}
+
+    @property
+    def max_content_length(self):
+        """Límite del cuerpo según el endpoint que atiende la petición"""
+        if not current_app:
+            return None
+        if self.endpoint in self.ENDPOINTS_LOTE:
+            return current_app.config.get('TAMANO_MAXIMO_LOTE', current_app.config['MAX_CONTENT_LENGTH'])
+        return current_app.config['MAX_CONTENT_LENGTH']
+
+
 def generar_clave_segura(longitud=32):
     """
     Autor: Steeven Vargas
@@ -76,55 +104,93 @@ def generar_clave_segura(longitud=32):
     return secrets.token_hex(longitud)
 
 
-intentos_peticiones = {}
+limitador_peticiones = LimitadorMemoria(ventana_segundos=60)
+
+
+def obtener_limitador():
+    """Limitador registrado en la aplicación; sin aplicación, el limitador del proceso"""
+    if current_app:
+        return current_app.extensions.get('limitador_peticiones', limitador_peticiones)
+    return limitador_peticiones
+
 
+def clave_por_ip():
+    """IP del cliente; detrás de proxies confiables (PROXIES_CONFIABLES) ProxyFix ya la tomó de X-Forwarded-For"""
+    return f'ip:{request.remote_addr}'
 
-def limitar_peticiones(limite_por_minuto=10):
+
+def clave_por_usuario():
+    """Identidad del JWT; sin token válido se usa la IP"""
+    try:
+        verify_jwt_in_request(optional=True)
+        identidad = get_jwt_identity()
+    except Exception:
+        identidad = None
+    return f'usuario:{identidad}' if identidad else clave_por_ip()
+
+
+FUNCIONES_CLAVE = {
+    'ip': clave_por_ip,
+    'usuario': clave_por_usuario
+}
+
+
+def agregar_headers_limite(respuesta, limite, resultado):
+    """Informa al cliente el límite, el cupo restante y, si se rechazó, cuándo reintentar"""
+    respuesta.headers['X-RateLimit-Limit'] = str(limite)
+    respuesta.headers['X-RateLimit-Remaining'] = str(resultado.restantes)
+    if not resultado.permitido:
+        respuesta.headers['Retry-After'] = str(max(1, math.ceil(resultado.reintentar_en)))
+    return respuesta
+
+
+def limitar_peticiones(limite_por_minuto=None, clave='ip'):
     """
     Autor: Steeven Vargas
     Fecha: Noviembre 2024
-    Descripción: Decorador para limitar número de peticiones por usuario
+    Descripción: Decorador para limitar número de peticiones por usuario. Cada
+                 ruta tiene su propio contador; el límite se toma de
+                 LIMITES_POR_RUTA y, si la ruta no está, de limite_por_minuto
+                 o LIMITE_PETICIONES_POR_MINUTO.
     Argumentos entrada:
-        limite_por_minuto (int): Número máximo de peticiones por minuto
+        limite_por_minuto (int): Número máximo de peticiones por minuto por defecto
+        clave (str o callable): 'ip', 'usuario' (identidad JWT) o función que
+                                retorna el identificador del cliente
     Returns:
         Función decoradora
-    Modificaciones: Ninguna
+    Modificaciones: Ventana deslizante de costo constante en el almacén
+                    configurado (LIMITADOR_BACKEND); claves por ruta e
+                    identidad; cabeceras Retry-After y X-RateLimit-*. Si el
+                    almacén falla (p. ej. SQLite bloqueado) la petición pasa
+                    sin limitar y se registra una advertencia.
     """
+    funcion_clave = FUNCIONES_CLAVE[clave] if isinstance(clave, str) else clave
     
     def decorador(funcion):
         @wraps(funcion)
         def funcion_decorada(*args, **kwargs):
-            identificador_cliente = request.remote_addr
-            
-            ahora = datetime.now()
-            
-            intentos_peticiones_limpio = {}
-            for cliente, intentos in intentos_peticiones.items():
-                intentos_recientes = [
-                    tiempo for tiempo in intentos 
-                    if ahora - tiempo < timedelta(minutes=1)
-                ]
-                if intentos_recientes:
-                    intentos_peticiones_limpio[cliente] = intentos_recientes
-            
-            intentos_peticiones.clear()
-            intentos_peticiones.update(intentos_peticiones_limpio)
-            
-            if identificador_cliente not in intentos_peticiones:
-                intentos_peticiones[identificador_cliente] = []
+            ruta = request.endpoint
+            limite = current_app.config.get('LIMITES_POR_RUTA', {}).get(
+                ruta,
+                limite_por_minuto or current_app.config['LIMITE_PETICIONES_POR_MINUTO']
+            )
             
-            intentos_cliente = intentos_peticiones[identificador_cliente]
+            try:
+                resultado = obtener_limitador().registrar(f'{ruta}:{funcion_clave()}', limite)
+            except Exception as e:
+                registro.warning("Limitador no disponible en %s, petición sin limitar: %s", ruta, e)
+                return funcion(*args, **kwargs)
             
-            if len(intentos_cliente) >= limite_por_minuto:
-                return jsonify({
+            if not resultado.permitido:
+                respuesta = make_response(jsonify({
                     'exito': False,
                     'mensaje': 'Demasiadas peticiones. Intenta nuevamente en un minuto.',
                     'error': 'limite_excedido'
-                }), 429
-            
-            intentos_peticiones[identificador_cliente].append(ahora)
+                }), 429)
+                return agregar_headers_limite(respuesta, limite, resultado)
             
-            return funcion(*args, **kwargs)
+            respuesta = make_response(funcion(*args, **kwargs))
+            return agregar_headers_limite(respuesta, limite, resultado)
         
         return funcion_decorada
     return decorador
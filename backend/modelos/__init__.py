@@ -10,9 +10,16 @@ from flask_sqlalchemy import SQLAlchemy
 db = SQLAlchemy()
 
 from .usuario import Usuario
+from .etiqueta import Etiqueta, AnalisisEtiqueta
 from .analisis import Analisis
+from .trabajo_analisis import TrabajoAnalisis
+from .traduccion_etiqueta import TraduccionEtiqueta
+from .migraciones import aplicar_migraciones
 
-__all__ = ['db', 'Usuario', 'Analisis', 'inicializar_base_datos']
+__all__ = [
+    'db', 'Usuario', 'Analisis', 'Etiqueta', 'AnalisisEtiqueta', 'TrabajoAnalisis', 'TraduccionEtiqueta',
+    'inicializar_base_datos', 'aplicar_migraciones'
+]
 
 
 def inicializar_base_datos():
@@ -29,6 +36,7 @@ def inicializar_base_datos():
 
     try:
         db.create_all()
+        aplicar_migraciones()
 
         usuario_admin = Usuario.query.filter_by(
             nombre_usuario=current_app.config['USUARIO_ADMIN']
@@ -5,9 +5,22 @@ Descripción: Modelo de base de datos para Análisis de Imágenes.
              Almacena resultados de análisis de IA.
 """
 
+from collections import Counter
 from datetime import datetime
 import json
+
+from sqlalchemy import bindparam, event
+from sqlalchemy.orm import Session
+
 from . import db
+from .etiqueta import AnalisisEtiqueta
+
+
+def obtener_etiqueta_principal(etiquetas):
+    """Nombre de la etiqueta con mayor confianza o None si no hay etiquetas"""
+    if not etiquetas:
+        return None
+    return max(etiquetas, key=lambda etiqueta: etiqueta.get('confianza', 0))['etiqueta']
 
 
 class Analisis(db.Model):
@@ -20,14 +33,34 @@ class Analisis(db.Model):
     __tablename__ = 'analisis'
     
     id = db.Column(db.String(36), primary_key=True)
-    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False, index=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
     nombre_archivo = db.Column(db.String(255), nullable=False)
     ruta_archivo = db.Column(db.String(500), nullable=False)
     proveedor_ia = db.Column(db.String(50), nullable=False)
-    etiquetas_json = db.Column(db.Text, nullable=False)
+    # Solo en análisis anteriores a la migración 0006; las etiquetas viven en analisis_etiquetas
+    etiquetas_json = db.Column(db.Text)
+    etiquetas_traducidas_json = db.Column(db.Text)
+    interpretacion = db.Column(db.Text)
+    resultados_proveedores_json = db.Column(db.Text)
+    etiqueta_principal = db.Column(db.String(255))
     fecha_analisis = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
     
-    def __init__(self, id, usuario_id, nombre_archivo, ruta_archivo, proveedor_ia, etiquetas):
+    filas_etiquetas = db.relationship(
+        AnalisisEtiqueta,
+        backref='analisis',
+        order_by=AnalisisEtiqueta.posicion,
+        cascade='all, delete-orphan'
+    )
+    
+    # Historial por usuario en orden (fecha desc, id): filtra y ordena con el
+    # mismo índice y permite paginar por cursor sin OFFSET. También cubre las
+    # búsquedas por usuario_id, por eso esa columna no tiene índice propio
+    __table_args__ = (
+        db.Index('ix_analisis_usuario_fecha_id', usuario_id, fecha_analisis.desc(), id),
+    )
+    
+    def __init__(self, id, usuario_id, nombre_archivo, ruta_archivo, proveedor_ia, etiquetas,
+                 resultados_proveedores=None):
         """Constructor del modelo Análisis"""
         self.id = id
         self.usuario_id = usuario_id
@@ -35,14 +68,52 @@ class Analisis(db.Model):
         self.ruta_archivo = ruta_archivo
         self.proveedor_ia = proveedor_ia
         self.establecer_etiquetas(etiquetas)
+        if resultados_proveedores is not None:
+            self.resultados_proveedores_json = json.dumps(resultados_proveedores, ensure_ascii=False)
     
     def establecer_etiquetas(self, etiquetas):
-        """Convierte etiquetas a JSON y las almacena"""
-        self.etiquetas_json = json.dumps(etiquetas, ensure_ascii=False)
+        """Almacena las etiquetas como filas de analisis_etiquetas junto con la de mayor confianza"""
+        self.filas_etiquetas = [
+            AnalisisEtiqueta(
+                posicion,
+                etiqueta['etiqueta'],
+                etiqueta['confianza'],
+                etiqueta.get('proveedores')
+            )
+            for posicion, etiqueta in enumerate(etiquetas)
+        ]
+        self.etiquetas_json = None
+        self.etiqueta_principal = obtener_etiqueta_principal(etiquetas)
     
     def obtener_etiquetas(self):
         """Obtiene las etiquetas como lista de diccionarios"""
-        return json.loads(self.etiquetas_json)
+        if self.etiquetas_json is not None:
+            return json.loads(self.etiquetas_json)
+        return [fila.a_dict() for fila in self.filas_etiquetas]
+    
+    def obtener_resultados_proveedores(self):
+        """Obtiene los resultados crudos por proveedor (solo análisis multi-proveedor)"""
+        if self.resultados_proveedores_json is None:
+            return None
+        return json.loads(self.resultados_proveedores_json)
+    
+    def establecer_resultados_procesados(self, resultados_procesados):
+        """Almacena las etiquetas traducidas y la interpretación"""
+        self.etiquetas_traducidas_json = json.dumps(
+            resultados_procesados['etiquetas'],
+            ensure_ascii=False
+        )
+        self.interpretacion = resultados_procesados['interpretacion']
+    
+    def tiene_resultados_procesados(self):
+        """Indica si la traducción e interpretación ya están almacenadas"""
+        return self.etiquetas_traducidas_json is not None and self.interpretacion is not None
+    
+    def obtener_etiquetas_traducidas(self):
+        """Obtiene las etiquetas traducidas almacenadas o None"""
+        if self.etiquetas_traducidas_json is None:
+            return None
+        return json.loads(self.etiquetas_traducidas_json)
     
     def a_dict(self):
         """Convierte el análisis a diccionario"""
@@ -54,5 +125,90 @@ class Analisis(db.Model):
             'fecha_analisis': self.fecha_analisis.isoformat()
         }
     
+    def a_dict_resumen(self):
+        """Datos del listado del historial; solo usa COLUMNAS_RESUMEN"""
+        return {
+            'id': self.id,
+            'nombre_archivo': self.nombre_archivo,
+            'proveedor_ia': self.proveedor_ia,
+            'etiqueta_principal': self.etiqueta_principal,
+            'fecha_analisis': self.fecha_analisis.isoformat()
+        }
+    
     def __repr__(self):
         return f'<Analisis {self.id} - {self.nombre_archivo}>'
+
+
+
+
+# Columnas que carga el listado del historial (load_only): sin los textos JSON
+COLUMNAS_RESUMEN = (
+    Analisis.id,
+    Analisis.nombre_archivo,
+    Analisis.proveedor_ia,
+    Analisis.etiqueta_principal,
+    Analisis.fecha_analisis,
+)
+
+CLAVE_DELTAS_CONTADOR = 'deltas_total_analisis'
+
+
+@event.listens_for(Session, 'before_flush')
+def calcular_deltas_contador(sesion, contexto_flush, instancias):
+    """Anota cuántos análisis gana o pierde cada usuario en este flush"""
+    deltas = Counter()
+    for instancia in sesion.new:
+        if isinstance(instancia, Analisis):
+            deltas[instancia.usuario_id] += 1
+    for instancia in sesion.deleted:
+        if isinstance(instancia, Analisis):
+            deltas[instancia.usuario_id] -= 1
+
+    if deltas:
+        sesion.info[CLAVE_DELTAS_CONTADOR] = deltas
+
+
+@event.listens_for(Session, 'after_flush')
+def actualizar_contadores_usuario(sesion, contexto_flush):
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Mantiene usuarios.total_analisis en la misma transacción que
+                 crea o elimina análisis: un solo UPDATE (executemany) por
+                 flush, aunque el flush incluya un lote de análisis
+    Argumentos entrada:
+        sesion: Sesión que hizo flush
+        contexto_flush: Contexto del flush (no se usa)
+    Returns: None
+    Modificaciones: Ninguna
+    """
+    deltas = sesion.info.pop(CLAVE_DELTAS_CONTADOR, None)
+    if deltas:
+        ajustar_contadores(sesion.connection(), deltas)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+@event.listens_for(Session, 'after_rollback')
+def descartar_deltas_contador(sesion, *argumentos):
+    """Un flush fallido no deja deltas para el siguiente flush de la sesión"""
+    sesion.info.pop(CLAVE_DELTAS_CONTADOR, None)
+
+
+def ajustar_contadores(conexion, deltas):
+    """Aplica {usuario_id: delta} a usuarios.total_analisis con un executemany"""
+    from .usuario import Usuario
+
+    filas = [
+        {'b_id': usuario_id, 'b_delta': delta}
+        for usuario_id, delta in deltas.items() if delta
+    ]
+    if not filas:
+        return
+
+    tabla = Usuario.__table__
+    conexion.execute(
+        tabla.update()
+        .where(tabla.c.id == bindparam('b_id'))
+        .values(total_analisis=tabla.c.total_analisis + bindparam('b_delta')),
+        filas
+    )
@@ -0,0 +1,161 @@
+"""
+Autor: Steeven Vargas
+Fecha: Noviembre 2024
+Descripción: Modelos de almacenamiento normalizado de etiquetas.
+             Etiqueta es el vocabulario: cada nombre se guarda una sola vez.
+             AnalisisEtiqueta relaciona un análisis con sus etiquetas, con la
+             confianza como porcentaje entero y el usuario desnormalizado para
+             buscar por etiqueta dentro del historial de un usuario con índice.
+"""
+
+from collections import OrderedDict
+
+from sqlalchemy import event, select
+from sqlalchemy.dialects.sqlite import insert as insertar_sqlite
+from sqlalchemy.orm import Session
+
+from . import db
+
+
+# Orden de los bits de AnalisisEtiqueta.proveedores (mismo orden que ServicioIA.PROVEEDORES)
+PROVEEDORES_ETIQUETA = ('google', 'imagga')
+
+# Parámetros por sentencia IN (...) por debajo del límite de SQLite
+TAMANO_BLOQUE_VOCABULARIO = 500
+
+
+class Etiqueta(db.Model):
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Vocabulario de etiquetas
+    """
+
+    __tablename__ = 'etiquetas'
+
+    id = db.Column(db.Integer, primary_key=True)
+    nombre = db.Column(db.String(255), unique=True, nullable=False)
+
+    @staticmethod
+    def internar(conexion, nombres):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Obtiene el id de cada nombre, registrando los que no existan.
+                     Usa INSERT ... ON CONFLICT DO NOTHING, por lo que dos workers
+                     pueden internar el mismo nombre a la vez sin error
+        Argumentos entrada:
+            conexion: Conexión SQLAlchemy (la de la transacción en curso)
+            nombres (iterable): Nombres de etiqueta
+        Returns:
+            dict: {nombre: id}
+        Modificaciones: Ninguna
+        """
+        nombres = list(OrderedDict.fromkeys(nombres))
+        ids = {}
+
+        for inicio in range(0, len(nombres), TAMANO_BLOQUE_VOCABULARIO):
+            bloque = nombres[inicio:inicio + TAMANO_BLOQUE_VOCABULARIO]
+            conexion.execute(
+                insertar_sqlite(Etiqueta.__table__).on_conflict_do_nothing(),
+                [{'nombre': nombre} for nombre in bloque]
+            )
+            ids.update(conexion.execute(
+                select(Etiqueta.nombre, Etiqueta.id).where(Etiqueta.nombre.in_(bloque))
+            ).all())
+
+        return ids
+
+    def __repr__(self):
+        return f'<Etiqueta {self.nombre}>'
+
+
+class AnalisisEtiqueta(db.Model):
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Etiqueta de un análisis en su posición del ranking
+    """
+
+    __tablename__ = 'analisis_etiquetas'
+
+    analisis_id = db.Column(db.String(36), db.ForeignKey('analisis.id', ondelete='CASCADE'), primary_key=True)
+    posicion = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    usuario_id = db.Column(db.Integer, nullable=False)
+    etiqueta_id = db.Column(db.Integer, db.ForeignKey('etiquetas.id'), nullable=False)
+    confianza = db.Column(db.SmallInteger, nullable=False)
+    proveedores = db.Column(db.SmallInteger)
+
+    etiqueta = db.relationship(Etiqueta, lazy='joined')
+    nombre_pendiente = None
+
+    # Índice invertido por usuario: "mis análisis con la etiqueta X sobre N%"
+    __table_args__ = (
+        db.Index('ix_analisis_etiquetas_usuario_etiqueta', usuario_id, etiqueta_id, confianza),
+    )
+
+    def __init__(self, posicion, nombre, confianza, proveedores=None):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Constructor. El id de la etiqueta se resuelve al hacer flush
+        Argumentos entrada:
+            posicion (int): Posición en el ranking del análisis
+            nombre (str): Nombre de la etiqueta
+            confianza (float): Confianza entre 0 y 1
+            proveedores (list): Proveedores que detectaron la etiqueta (modo múltiple)
+        Returns: Instancia de AnalisisEtiqueta
+        Modificaciones: Ninguna
+        """
+        self.posicion = posicion
+        self.nombre_pendiente = nombre
+        self.confianza = AnalisisEtiqueta.a_porcentaje(confianza)
+        self.proveedores = AnalisisEtiqueta.codificar_proveedores(proveedores)
+
+    @staticmethod
+    def a_porcentaje(confianza):
+        """Confianza 0-1 como entero 0-100 (las confianzas ya vienen con 2 decimales)"""
+        return int(round(confianza * 100))
+
+    @staticmethod
+    def codificar_proveedores(proveedores):
+        """Lista de proveedores como máscara de bits, o None"""
+        if proveedores is None:
+            return None
+        return sum(1 << PROVEEDORES_ETIQUETA.index(proveedor) for proveedor in proveedores)
+
+    @property
+    def nombre(self):
+        """Nombre de la etiqueta (antes del flush, el recibido en el constructor)"""
+        if self.etiqueta is not None:
+            return self.etiqueta.nombre
+        return self.nombre_pendiente
+
+    def a_dict(self):
+        """Etiqueta en el formato de los proveedores: {'etiqueta', 'confianza'[, 'proveedores']}"""
+        datos = {'etiqueta': self.nombre, 'confianza': self.confianza / 100}
+        if self.proveedores is not None:
+            datos['proveedores'] = [
+                proveedor for bit, proveedor in enumerate(PROVEEDORES_ETIQUETA)
+                if self.proveedores & (1 << bit)
+            ]
+        return datos
+
+    def __repr__(self):
+        return f'<AnalisisEtiqueta {self.analisis_id}#{self.posicion}>'
+
+
+@event.listens_for(Session, 'before_flush')
+def resolver_vocabulario(sesion, contexto_flush, instancias):
+    """Asigna etiqueta_id y usuario_id a las filas nuevas con un lote por flush"""
+    pendientes = [
+        instancia for instancia in sesion.new
+        if isinstance(instancia, AnalisisEtiqueta) and instancia.etiqueta_id is None
+    ]
+    if not pendientes:
+        return
+
+    ids = Etiqueta.internar(sesion.connection(), (fila.nombre_pendiente for fila in pendientes))
+    for fila in pendientes:
+        fila.etiqueta_id = ids[fila.nombre_pendiente]
+        fila.usuario_id = fila.analisis.usuario_id
@@ -0,0 +1,252 @@
+"""
+Autor: Steeven Vargas
+Fecha: Noviembre 2024
+Descripción: Migraciones de esquema idempotentes. db.create_all() solo crea
+             tablas nuevas; estas funciones agregan columnas e índices a tablas
+             existentes. Cada migración verifica el esquema antes de aplicarse,
+             por lo que se pueden ejecutar en cada arranque.
+"""
+
+import json
+import re
+
+from sqlalchemy import inspect, text
+
+from . import db
+from .analisis import Analisis, obtener_etiqueta_principal
+from .etiqueta import Etiqueta, AnalisisEtiqueta
+
+
+TAMANO_LOTE_MIGRACION = 1000
+
+
+def agregar_columna_si_falta(conexion, tabla, columna, definicion):
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Agrega una columna a una tabla existente si aún no existe
+    Argumentos entrada:
+        conexion: Conexión SQLAlchemy dentro de una transacción
+        tabla (str): Nombre de la tabla
+        columna (str): Nombre de la columna
+        definicion (str): Tipo y restricciones SQL de la columna
+    Returns:
+        bool: True si la columna se agregó
+    Modificaciones: Ninguna
+    """
+    inspector = inspect(conexion)
+    if tabla not in inspector.get_table_names():
+        return False
+
+    columnas = {columna_existente['name'] for columna_existente in inspector.get_columns(tabla)}
+    if columna in columnas:
+        return False
+
+    conexion.execute(text(f'ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}'))
+    return True
+
+
+def crear_indice_si_falta(conexion, tabla, nombre, columnas):
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Crea un índice sobre una tabla existente si aún no existe
+    Argumentos entrada:
+        conexion: Conexión SQLAlchemy dentro de una transacción
+        tabla (str): Nombre de la tabla
+        nombre (str): Nombre del índice
+        columnas (str): Columnas SQL del índice, con su orden (p. ej. 'a, b DESC')
+    Returns:
+        bool: True si el índice se creó
+    Modificaciones: Ninguna
+    """
+    inspector = inspect(conexion)
+    if tabla not in inspector.get_table_names():
+        return False
+
+    if nombre in {indice['name'] for indice in inspector.get_indexes(tabla)}:
+        return False
+
+    conexion.execute(text(f'CREATE INDEX {nombre} ON {tabla} ({columnas})'))
+    return True
+
+
+def eliminar_indice_si_existe(conexion, tabla, nombre):
+    """Elimina un índice de una tabla existente; retorna True si existía"""
+    inspector = inspect(conexion)
+    if tabla not in inspector.get_table_names():
+        return False
+
+    if nombre not in {indice['name'] for indice in inspector.get_indexes(tabla)}:
+        return False
+
+    conexion.execute(text(f'DROP INDEX {nombre}'))
+    return True
+
+
+def migracion_0001_interpretacion_analisis(conexion):
+    """Columnas para guardar la traducción e interpretación junto al análisis"""
+    agregar_columna_si_falta(conexion, 'analisis', 'etiquetas_traducidas_json', 'TEXT')
+    agregar_columna_si_falta(conexion, 'analisis', 'interpretacion', 'TEXT')
+
+
+def migracion_0002_resultados_proveedores(conexion):
+    """Resultados crudos por proveedor de los análisis multi-proveedor"""
+    agregar_columna_si_falta(conexion, 'analisis', 'resultados_proveedores_json', 'TEXT')
+
+
+# Recalcula el contador de todos los usuarios desde la tabla analisis
+SENTENCIA_RECONCILIAR_TOTALES = (
+    'UPDATE usuarios SET total_analisis = '
+    '(SELECT COUNT(*) FROM analisis WHERE analisis.usuario_id = usuarios.id)'
+)
+
+
+def migracion_0003_total_analisis_usuario(conexion):
+    """Contador desnormalizado de análisis por usuario, inicializado con el conteo real"""
+    if agregar_columna_si_falta(conexion, 'usuarios', 'total_analisis', 'INTEGER NOT NULL DEFAULT 0'):
+        conexion.execute(text(SENTENCIA_RECONCILIAR_TOTALES))
+
+
+def migracion_0004_indice_historial(conexion):
+    """Índice compuesto para el historial por usuario y la paginación por cursor"""
+    crear_indice_si_falta(
+        conexion, 'analisis', 'ix_analisis_usuario_fecha_id',
+        'usuario_id, fecha_analisis DESC, id'
+    )
+
+
+def migracion_0005_resumen_historial(conexion):
+    """
+    Etiqueta principal para el listado del historial (rellenada desde
+    etiquetas_json por bloques) y retiro del índice de usuario_id, que ya
+    cubre el índice compuesto ix_analisis_usuario_fecha_id
+    """
+    if agregar_columna_si_falta(conexion, 'analisis', 'etiqueta_principal', 'VARCHAR(255)'):
+        ultimo_id = ''
+        while True:
+            filas = conexion.execute(
+                text('SELECT id, etiquetas_json FROM analisis WHERE id > :ultimo ORDER BY id LIMIT :limite'),
+                {'ultimo': ultimo_id, 'limite': TAMANO_LOTE_MIGRACION}
+            ).fetchall()
+            if not filas:
+                break
+
+            conexion.execute(
+                text('UPDATE analisis SET etiqueta_principal = :etiqueta WHERE id = :id'),
+                [
+                    {'id': fila.id, 'etiqueta': obtener_etiqueta_principal(json.loads(fila.etiquetas_json))}
+                    for fila in filas
+                ]
+            )
+            ultimo_id = filas[-1].id
+
+    eliminar_indice_si_existe(conexion, 'analisis', 'ix_analisis_usuario_id')
+
+
+def permitir_nulos_etiquetas_json(conexion):
+    """
+    Reconstruye la tabla analisis con etiquetas_json sin NOT NULL (SQLite no
+    permite cambiar la restricción con ALTER TABLE): crea la tabla nueva desde
+    la definición guardada, copia las filas, elimina la anterior y renombra.
+    Los índices del modelo se vuelven a crear sobre la tabla nueva.
+    """
+    columnas = {columna['name']: columna for columna in inspect(conexion).get_columns('analisis')}
+    if columnas['etiquetas_json']['nullable']:
+        return
+
+    definicion = conexion.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'analisis'")
+    ).scalar()
+    definicion_nueva, reemplazos = re.subn(
+        r'(etiquetas_json\s+TEXT)\s+NOT\s+NULL', r'\1', definicion, flags=re.IGNORECASE
+    )
+    if reemplazos != 1:
+        raise RuntimeError("No se pudo quitar NOT NULL de analisis.etiquetas_json")
+    definicion_nueva = re.sub(
+        r'^CREATE TABLE\s+"?analisis"?', 'CREATE TABLE analisis_nueva', definicion_nueva
+    )
+
+    lista_columnas = ', '.join(columnas)
+    conexion.execute(text(definicion_nueva))
+    conexion.execute(text(f'INSERT INTO analisis_nueva ({lista_columnas}) SELECT {lista_columnas} FROM analisis'))
+    conexion.execute(text('DROP TABLE analisis'))
+    conexion.execute(text('ALTER TABLE analisis_nueva RENAME TO analisis'))
+
+    for indice in Analisis.__table__.indexes:
+        indice.create(conexion, checkfirst=True)
+
+
+def migracion_0006_etiquetas_normalizadas(conexion):
+    """
+    Vocabulario de etiquetas y tabla analisis_etiquetas. Las etiquetas de cada
+    análisis se pasan del texto JSON a filas por bloques y el JSON se vacía
+    """
+    if 'analisis' not in inspect(conexion).get_table_names():
+        return
+
+    Etiqueta.__table__.create(conexion, checkfirst=True)
+    AnalisisEtiqueta.__table__.create(conexion, checkfirst=True)
+    permitir_nulos_etiquetas_json(conexion)
+
+    ultimo_id = ''
+    while True:
+        analisis_lote = conexion.execute(
+            text(
+                'SELECT id, usuario_id, etiquetas_json FROM analisis '
+                'WHERE id > :ultimo AND etiquetas_json IS NOT NULL ORDER BY id LIMIT :limite'
+            ),
+            {'ultimo': ultimo_id, 'limite': TAMANO_LOTE_MIGRACION}
+        ).fetchall()
+        if not analisis_lote:
+            break
+
+        etiquetas_por_analisis = [
+            (fila, json.loads(fila.etiquetas_json)) for fila in analisis_lote
+        ]
+        ids = Etiqueta.internar(conexion, (
+            etiqueta['etiqueta']
+            for _, etiquetas in etiquetas_por_analisis
+            for etiqueta in etiquetas
+        ))
+
+        filas_etiquetas = [{
+            'analisis_id': fila.id,
+            'posicion': posicion,
+            'usuario_id': fila.usuario_id,
+            'etiqueta_id': ids[etiqueta['etiqueta']],
+            'confianza': AnalisisEtiqueta.a_porcentaje(etiqueta['confianza']),
+            'proveedores': AnalisisEtiqueta.codificar_proveedores(etiqueta.get('proveedores'))
+        } for fila, etiquetas in etiquetas_por_analisis for posicion, etiqueta in enumerate(etiquetas)]
+
+        if filas_etiquetas:
+            conexion.execute(AnalisisEtiqueta.__table__.insert(), filas_etiquetas)
+        conexion.execute(
+            text('UPDATE analisis SET etiquetas_json = NULL WHERE id = :id'),
+            [{'id': fila.id} for fila in analisis_lote]
+        )
+        ultimo_id = analisis_lote[-1].id
+
+
+MIGRACIONES = [
+    migracion_0001_interpretacion_analisis,
+    migracion_0002_resultados_proveedores,
+    migracion_0003_total_analisis_usuario,
+    migracion_0004_indice_historial,
+    migracion_0005_resumen_historial,
+    migracion_0006_etiquetas_normalizadas,
+]
+
+
+def aplicar_migraciones():
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Aplica en orden todas las migraciones de esquema pendientes
+    Argumentos entrada: Ninguno
+    Returns: None
+    Modificaciones: Ninguna
+    """
+    with db.engine.begin() as conexion:
+        for migracion in MIGRACIONES:
+            migracion(conexion)
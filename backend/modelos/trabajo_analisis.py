@@ -0,0 +1,85 @@
+"""
+Autor: Steeven Vargas
+Fecha: Noviembre 2024
+Descripción: Modelo de base de datos para trabajos de análisis asíncronos.
+             Registra el estado y progreso de cada análisis encolado.
+"""
+
+from datetime import datetime
+import json
+from . import db
+
+
+class TrabajoAnalisis(db.Model):
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Modelo de Trabajo de Análisis asíncrono
+    """
+
+    __tablename__ = 'trabajos_analisis'
+
+    EN_COLA = 'en_cola'
+    ANALIZANDO = 'analizando'
+    INTERPRETANDO = 'interpretando'
+    GUARDANDO = 'guardando'
+    COMPLETADO = 'completado'
+    ERROR = 'error'
+    EN_CURSO = (EN_COLA, ANALIZANDO, INTERPRETANDO, GUARDANDO)
+
+    id = db.Column(db.String(36), primary_key=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False, index=True)
+    nombre_archivo = db.Column(db.String(255), nullable=False)
+    proveedor_ia = db.Column(db.String(50), nullable=False)
+    estado = db.Column(db.String(20), default=EN_COLA, nullable=False)
+    progreso = db.Column(db.Integer, default=0, nullable=False)
+    mensaje = db.Column(db.String(500))
+    analisis_id = db.Column(db.String(36))
+    resultado_json = db.Column(db.Text)
+    fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    fecha_actualizacion = db.Column(db.DateTime, default=datetime.utcnow,
+                                    onupdate=datetime.utcnow, nullable=False)
+
+    def __init__(self, id, usuario_id, nombre_archivo, proveedor_ia):
+        """Constructor del modelo TrabajoAnalisis"""
+        self.id = id
+        self.usuario_id = usuario_id
+        self.nombre_archivo = nombre_archivo
+        self.proveedor_ia = proveedor_ia
+        self.estado = self.EN_COLA
+        self.progreso = 0
+
+    def establecer_resultado(self, resultado):
+        """Almacena el resultado del análisis como JSON"""
+        self.resultado_json = json.dumps(resultado, ensure_ascii=False)
+
+    def obtener_resultado(self):
+        """Obtiene el resultado del análisis o None si aún no termina"""
+        return json.loads(self.resultado_json) if self.resultado_json else None
+
+    @property
+    def finalizado(self):
+        """True si el trabajo terminó, con éxito o con error"""
+        return self.estado in (self.COMPLETADO, self.ERROR)
+
+    def a_dict(self):
+        """Convierte el trabajo a diccionario"""
+        datos = {
+            'id': self.id,
+            'estado': self.estado,
+            'progreso': self.progreso,
+            'mensaje': self.mensaje,
+            'nombre_archivo': self.nombre_archivo,
+            'proveedor_ia': self.proveedor_ia,
+            'analisis_id': self.analisis_id,
+            'fecha_creacion': self.fecha_creacion.isoformat() if self.fecha_creacion else None,
+            'fecha_actualizacion': self.fecha_actualizacion.isoformat() if self.fecha_actualizacion else None
+        }
+
+        if self.estado == self.COMPLETADO:
+            datos['resultado'] = self.obtener_resultado()
+
+        return datos
+
+    def __repr__(self):
+        return f'<TrabajoAnalisis {self.id} - {self.estado}>'
@@ -0,0 +1,36 @@
+"""
+Autor: Steeven Vargas
+Fecha: Noviembre 2024
+Descripción: Modelo de base de datos para el diccionario persistente de
+             traducciones de etiquetas (inglés → español).
+"""
+
+from datetime import datetime
+from . import db
+
+
+class TraduccionEtiqueta(db.Model):
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Modelo de Traducción de Etiqueta
+    """
+
+    __tablename__ = 'traducciones_etiquetas'
+
+    termino_en = db.Column(db.String(255), primary_key=True)
+    termino_es = db.Column(db.String(255), nullable=False)
+    fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __init__(self, termino_en, termino_es):
+        """Constructor del modelo TraduccionEtiqueta"""
+        self.termino_en = TraduccionEtiqueta.normalizar(termino_en)
+        self.termino_es = termino_es
+
+    @staticmethod
+    def normalizar(termino):
+        """Clave normalizada de un término: sin espacios extremos y en minúsculas"""
+        return termino.strip().lower()
+
+    def __repr__(self):
+        return f'<TraduccionEtiqueta {self.termino_en} → {self.termino_es}>'
@@ -10,9 +10,14 @@ Modificaciones: Ninguna
 
 from datetime import datetime
 import bcrypt
+from flask import current_app, has_app_context
+from sqlalchemy.orm.attributes import set_committed_value
 from . import db
 
 
+RONDAS_BCRYPT_POR_DEFECTO = 12
+
+
 class Usuario(db.Model):
     """
     Autor: Steeven Vargas
@@ -28,10 +33,13 @@ class Usuario(db.Model):
     fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     fecha_ultima_sesion = db.Column(db.DateTime)
     activo = db.Column(db.Boolean, default=True, nullable=False)
+    # Contador desnormalizado; lo mantienen los eventos de flush de Analisis
+    # y se corrige con: python administrar.py reconciliar-contadores
+    total_analisis = db.Column(db.Integer, default=0, server_default='0', nullable=False)
 
     analisis = db.relationship('Analisis', backref='usuario', lazy='dynamic', cascade='all, delete-orphan')
     
-    def __init__(self, nombre_usuario, contrasena):
+    def __init__(self, nombre_usuario, contrasena=None, contrasena_hash=None):
         """
         Autor: Steeven Vargas
         Fecha: Noviembre 2024
@@ -39,28 +47,64 @@ class Usuario(db.Model):
         Argumentos entrada:
             nombre_usuario (str): Nombre de usuario único
             contrasena (str): Contraseña en texto plano (se hasheará)
+            contrasena_hash (str): Hash ya calculado (p. ej. en el pool de contraseñas)
         Returns: Instancia de Usuario
-        Modificaciones: Ninguna
+        Modificaciones: Acepta un hash calculado fuera del modelo
         """
         self.nombre_usuario = nombre_usuario
-        self.establecer_contrasena(contrasena)
+        self.total_analisis = 0
+        if contrasena_hash is not None:
+            self.contrasena_hash = contrasena_hash
+        else:
+            self.establecer_contrasena(contrasena)
     
-    def establecer_contrasena(self, contrasena):
+    @staticmethod
+    def rondas_configuradas():
+        """Factor de costo de bcrypt de la configuración (BCRYPT_RONDAS)"""
+        if has_app_context():
+            return current_app.config.get('BCRYPT_RONDAS', RONDAS_BCRYPT_POR_DEFECTO)
+        return RONDAS_BCRYPT_POR_DEFECTO
+    
+    @staticmethod
+    def generar_hash(contrasena, rondas=RONDAS_BCRYPT_POR_DEFECTO):
         """
         Autor: Steeven Vargas
         Fecha: Noviembre 2024
-        Descripción: Hashea y almacena la contraseña de forma segura
+        Descripción: Calcula el hash bcrypt de una contraseña. No usa la sesión
+                     ni la app, por lo que puede ejecutarse en otro hilo
         Argumentos entrada:
             contrasena (str): Contraseña en texto plano
-        Returns: None
+            rondas (int): Factor de costo de bcrypt
+        Returns:
+            str: Hash bcrypt
         Modificaciones: Ninguna
         """
-        sal = bcrypt.gensalt(rounds=12)
-        self.contrasena_hash = bcrypt.hashpw(
+        sal = bcrypt.gensalt(rounds=rondas)
+        return bcrypt.hashpw(
             contrasena.encode('utf-8'), 
             sal
         ).decode('utf-8')
     
+    @staticmethod
+    def comparar_hash(contrasena, contrasena_hash):
+        """Verifica una contraseña contra un hash bcrypt (seguro fuera del hilo de la petición)"""
+        return bcrypt.checkpw(
+            contrasena.encode('utf-8'),
+            contrasena_hash.encode('utf-8')
+        )
+    
+    def establecer_contrasena(self, contrasena):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Hashea y almacena la contraseña de forma segura
+        Argumentos entrada:
+            contrasena (str): Contraseña en texto plano
+        Returns: None
+        Modificaciones: Costo tomado de BCRYPT_RONDAS
+        """
+        self.contrasena_hash = Usuario.generar_hash(contrasena, Usuario.rondas_configuradas())
+    
     def verificar_contrasena(self, contrasena):
         """
         Autor: Steeven Vargas
@@ -72,10 +116,24 @@ class Usuario(db.Model):
             bool: True si la contraseña es correcta, False si no
         Modificaciones: Ninguna
         """
-        return bcrypt.checkpw(
-            contrasena.encode('utf-8'),
-            self.contrasena_hash.encode('utf-8')
-        )
+        return Usuario.comparar_hash(contrasena, self.contrasena_hash)
+    
+    def necesita_rehash(self):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Indica si el hash almacenado usa un costo distinto al
+                     configurado (formato $2b$<rondas>$...)
+        Argumentos entrada: Ninguno
+        Returns:
+            bool: True si se debe volver a hashear la contraseña
+        Modificaciones: Ninguna
+        """
+        try:
+            rondas = int(self.contrasena_hash.split('$')[2])
+        except (AttributeError, IndexError, ValueError):
+            return True
+        return rondas != Usuario.rondas_configuradas()
     
     def actualizar_ultima_sesion(self):
         """
@@ -84,10 +142,21 @@ class Usuario(db.Model):
         Descripción: Actualiza la fecha de última sesión del usuario
         Argumentos entrada: Ninguno
         Returns: None
-        Modificaciones: Ninguna
+        Modificaciones: Si la app tiene registro de sesiones, la fecha se anota
+                        en memoria y se escribe por lotes en lugar de hacer
+                        un commit por inicio de sesión
         """
-        self.fecha_ultima_sesion = datetime.utcnow()
-        db.session.commit()
+        instante = datetime.utcnow()
+        registro_sesiones = current_app.extensions.get('registro_sesiones') if has_app_context() else None
+
+        if registro_sesiones is None:
+            self.fecha_ultima_sesion = instante
+            db.session.commit()
+            return
+
+        # Visible en la respuesta sin marcar la instancia como modificada
+        set_committed_value(self, 'fecha_ultima_sesion', instante)
+        registro_sesiones.registrar(self.id, instante)
     
     def obtener_analisis_recientes(self, limite=10):
         """
@@ -108,7 +177,8 @@ class Usuario(db.Model):
         """
         Autor: Steeven Vargas
         Fecha: Noviembre 2024
-        Descripción: Cuenta el total de análisis del usuario
+        Descripción: Cuenta el total de análisis del usuario con una consulta
+                     (a_dict usa el contador total_analisis)
         Argumentos entrada: Ninguno
         Returns:
             int: Número total de análisis
@@ -125,7 +195,7 @@ class Usuario(db.Model):
             incluir_analisis (bool): Si True, incluye lista de análisis
         Returns:
             dict: Representación del usuario en diccionario
-        Modificaciones: Ninguna
+        Modificaciones: total_analisis sale del contador, sin consulta extra
         """
         datos = {
             'id': self.id,
@@ -133,7 +203,7 @@ class Usuario(db.Model):
             'fecha_creacion': self.fecha_creacion.isoformat() if self.fecha_creacion else None,
             'fecha_ultima_sesion': self.fecha_ultima_sesion.isoformat() if self.fecha_ultima_sesion else None,
             'activo': self.activo,
-            'total_analisis': self.contar_analisis()
+            'total_analisis': self.total_analisis or 0
         }
         
         if incluir_analisis:
@@ -27,6 +27,7 @@ def app():
     with app.app_context():
         db.create_all()
         yield app
+        app.extensions['registro_sesiones'].detener()
         db.session.remove()
         db.drop_all()
 
@@ -0,0 +1,693 @@
+"""
+Autor: Steeven Vargas
+Fecha: Noviembre 2024
+Descripción: Tests unitarios para el módulo de análisis de imágenes
+             (los proveedores de IA y la traducción se reemplazan por dobles)
+"""
+
+import io
+import json
+import os
+import zipfile
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from modelos import db, Analisis, AnalisisEtiqueta, Etiqueta, TrabajoAnalisis, Usuario
+from modelos.migraciones import SENTENCIA_RECONCILIAR_TOTALES, migracion_0006_etiquetas_normalizadas
+from servicios.servicio_ia import ServicioIA
+from servicios.cola_analisis import ColaAnalisis
+from servicios.servicio_analisis import ServicioAnalisis
+from servicios.servicio_interpretacion import ServicioInterpretacion
+from utilidades.cliente_http import CircuitoAbiertoError
+
+
+TRADUCIR_ETIQUETAS = ServicioInterpretacion.traducir_etiquetas
+TRADUCIR_TERMINOS = ServicioInterpretacion.traducir_terminos
+
+ETIQUETAS_FALSAS = [
+    {'etiqueta': 'Dog', 'confianza': 0.98},
+    {'etiqueta': 'Pet', 'confianza': 0.91}
+]
+
+
+@pytest.fixture(autouse=True)
+def servicios_falsos(app, tmp_path, monkeypatch):
+    """Evita llamadas externas y guarda las cargas en un directorio temporal"""
+    app.config['DIRECTORIO_CARGAS'] = str(tmp_path)
+
+    monkeypatch.setattr(
+        ServicioIA, 'analizar_imagen',
+        staticmethod(lambda ruta, proveedor='google', max_resultados=None: list(ETIQUETAS_FALSAS))
+    )
+    monkeypatch.setattr(
+        ServicioInterpretacion, 'traducir_etiquetas',
+        staticmethod(lambda etiquetas, traducciones=None: [{
+            'nombre': etiqueta['etiqueta'].capitalize(),
+            'nombre_original': etiqueta['etiqueta'],
+            'confianza': int(etiqueta['confianza'] * 100)
+        } for etiqueta in etiquetas])
+    )
+    monkeypatch.setattr(
+        ServicioInterpretacion, 'traducir_terminos',
+        staticmethod(lambda terminos: {})
+    )
+
+
+@pytest.fixture
+def headers_token(token_autenticacion):
+    """Headers con token JWT para peticiones multipart"""
+    return {'Authorization': f'Bearer {token_autenticacion}'}
+
+
+def datos_imagen(**campos):
+    """Construye el formulario multipart con una imagen de prueba"""
+    datos = {'imagen': (io.BytesIO(b'\xff\xd8\xff' + b'0' * 64), 'foto.jpg')}
+    datos.update(campos)
+    return datos
+
+
+class TestAnalizar:
+    """Tests para el endpoint de análisis"""
+
+    def test_analisis_sincrono(self, cliente, headers_token):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Sin modo asíncrono el análisis se devuelve en la respuesta
+        """
+        respuesta = cliente.post('/api/analizar', data=datos_imagen(), headers=headers_token,
+                                 content_type='multipart/form-data')
+
+        assert respuesta.status_code == 201
+        datos = respuesta.get_json()['datos']
+        assert datos['etiquetas'] == ETIQUETAS_FALSAS
+        assert datos['etiquetas_traducidas'][0]['nombre'] == 'Dog'
+        assert 'Google Cloud Vision' in datos['interpretacion']
+
+    def test_analisis_ambos_proveedores(self, cliente, headers_token):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Con proveedor 'ambos' se guardan los resultados de cada proveedor
+        """
+        respuesta = cliente.post('/api/analizar', data=datos_imagen(proveedor_ia='ambos'),
+                                 headers=headers_token, content_type='multipart/form-data')
+
+        assert respuesta.status_code == 201
+        datos = respuesta.get_json()['datos']
+        assert datos['proveedor_ia'] == 'ambos'
+        assert set(datos['resultados_proveedores']) == {'google', 'imagga'}
+        assert datos['etiquetas'][0]['proveedores'] == ['google', 'imagga']
+
+    def test_analisis_asincrono(self, app, cliente, headers_token):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: En modo asíncrono se responde 202 y el estado se consulta por id
+        """
+        respuesta = cliente.post('/api/analizar', data=datos_imagen(asincrono='true'),
+                                 headers=headers_token, content_type='multipart/form-data')
+
+        assert respuesta.status_code == 202
+        trabajo = respuesta.get_json()['datos']
+        assert trabajo['url_estado'] == f"/api/analisis/{trabajo['id']}/estado"
+
+        app.extensions['cola_analisis'].apagar(esperar=True)
+
+        respuesta = cliente.get(trabajo['url_estado'], headers=headers_token)
+        estado = respuesta.get_json()['datos']
+
+        assert respuesta.status_code == 200
+        assert estado['estado'] == 'completado'
+        assert estado['progreso'] == 100
+        assert estado['resultado']['etiquetas_traducidas'][0]['nombre'] == 'Dog'
+        assert Analisis.query.get(estado['analisis_id']) is not None
+
+    def test_proveedores_no_disponibles_devuelve_503(self, app, cliente, headers_token, monkeypatch):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Con el circuito de los proveedores abierto se responde 503
+                     con Retry-After y no queda el archivo guardado
+        """
+        def circuito_abierto(ruta, proveedor='google', max_resultados=None):
+            raise CircuitoAbiertoError("Proveedor no disponible temporalmente", reintentar_en=12.5)
+
+        monkeypatch.setattr(ServicioIA, 'analizar_imagen', staticmethod(circuito_abierto))
+
+        respuesta = cliente.post('/api/analizar', data=datos_imagen(proveedor_ia='ambos'),
+                                 headers=headers_token, content_type='multipart/form-data')
+
+        assert respuesta.status_code == 503
+        assert respuesta.headers['Retry-After'] == '13'
+        assert respuesta.get_json()['error'] == 'proveedor_no_disponible'
+        assert Analisis.query.count() == 0
+        assert not [nombre for _, _, nombres in os.walk(app.config['DIRECTORIO_CARGAS']) for nombre in nombres]
+
+    def test_trabajo_con_fallo_al_completar_queda_en_error(self, app, cliente, headers_token, monkeypatch):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Si falla el guardado del resultado el trabajo pasa a error
+                     en lugar de quedar en 'guardando'
+        """
+        def fallar(trabajo, resultado):
+            raise Exception("disco lleno")
+
+        monkeypatch.setattr(TrabajoAnalisis, 'establecer_resultado', fallar)
+
+        respuesta = cliente.post('/api/analizar', data=datos_imagen(asincrono='true'),
+                                 headers=headers_token, content_type='multipart/form-data')
+        trabajo = respuesta.get_json()['datos']
+        app.extensions['cola_analisis'].apagar(esperar=True)
+
+        estado = cliente.get(trabajo['url_estado'], headers=headers_token).get_json()['datos']
+
+        assert estado['estado'] == TrabajoAnalisis.ERROR
+        assert 'disco lleno' in estado['mensaje']
+
+    def test_trabajos_interrumpidos_por_reinicio(self, app, usuario_prueba):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Al iniciar la cola, los trabajos sin terminar de un proceso
+                     anterior pasan a error; los completados y los nuevos no
+        """
+        antes = datetime.utcnow() - timedelta(minutes=5)
+        for indice, estado in enumerate([TrabajoAnalisis.ANALIZANDO, TrabajoAnalisis.COMPLETADO]):
+            trabajo = TrabajoAnalisis(f'anterior-{indice}', usuario_prueba.id, 'foto.jpg', 'google')
+            trabajo.estado = estado
+            trabajo.fecha_actualizacion = antes
+            db.session.add(trabajo)
+        db.session.commit()
+
+        cola = ColaAnalisis(app)
+        db.session.add(TrabajoAnalisis('nuevo', usuario_prueba.id, 'foto.jpg', 'google'))
+        db.session.commit()
+
+        assert cola.marcar_interrumpidos() == 1
+        db.session.expire_all()
+        interrumpido = db.session.get(TrabajoAnalisis, 'anterior-0')
+        assert interrumpido.estado == TrabajoAnalisis.ERROR
+        assert 'reinicio' in interrumpido.mensaje
+        assert db.session.get(TrabajoAnalisis, 'anterior-1').estado == TrabajoAnalisis.COMPLETADO
+        assert db.session.get(TrabajoAnalisis, 'nuevo').estado == TrabajoAnalisis.EN_COLA
+
+    def test_estado_trabajo_inexistente(self, cliente, headers_token):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Un id de trabajo desconocido devuelve 404
+        """
+        respuesta = cliente.get('/api/analisis/no-existe/estado', headers=headers_token)
+
+        assert respuesta.status_code == 404
+
+
+class TestAnalizarLote:
+    """Tests para el endpoint de análisis por lotes"""
+
+    def test_lote_reporta_fallos_por_archivo(self, cliente, headers_token, monkeypatch):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Un archivo inválido o un fallo del proveedor no detienen el lote
+        """
+        def analizar_falso(ruta, proveedor='google', max_resultados=None):
+            with open(ruta, 'rb') as archivo:
+                if b'falla' in archivo.read():
+                    raise Exception("proveedor caído")
+            return list(ETIQUETAS_FALSAS)
+
+        monkeypatch.setattr(ServicioIA, 'analizar_imagen', staticmethod(analizar_falso))
+
+        datos = {'imagenes': [
+            (io.BytesIO(b'\xff\xd8\xff1'), 'uno.jpg'),
+            (io.BytesIO(b'texto'), 'notas.txt'),
+            (io.BytesIO(b'\x89PNG\r\n\x1a\nfalla'), 'dos.png'),
+            (io.BytesIO(b'\xff\xd8\xff3'), 'tres.jpg')
+        ]}
+        respuesta = cliente.post('/api/analizar/lote', data=datos, headers=headers_token,
+                                 content_type='multipart/form-data')
+
+        assert respuesta.status_code == 201
+        datos = respuesta.get_json()['datos']
+        assert [r['archivo'] for r in datos['resultados']] == ['uno.jpg', 'notas.txt', 'dos.png', 'tres.jpg']
+        assert [r['exito'] for r in datos['resultados']] == [True, False, False, True]
+        assert 'proveedor caído' in datos['resultados'][2]['error']
+        assert datos['exitosos'] == 2
+        assert Analisis.query.count() == 2
+
+    def test_lote_con_traduccion_fallida_en_una_transaccion(self, cliente, headers_token, monkeypatch):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Si el traductor falla en la llamada previa del lote, los
+                     registros no vuelven a traducir y se confirman en un solo commit
+        """
+        llamadas = []
+
+        def traducir_lote(textos):
+            llamadas.append(list(textos))
+            if len(llamadas) == 1:
+                return [None] * len(textos)
+            return [texto.lower() for texto in textos]
+
+        monkeypatch.setattr(ServicioInterpretacion, 'traducir_etiquetas', staticmethod(TRADUCIR_ETIQUETAS))
+        monkeypatch.setattr(ServicioInterpretacion, 'traducir_terminos', staticmethod(TRADUCIR_TERMINOS))
+        monkeypatch.setattr(ServicioInterpretacion, 'traducir_lote', staticmethod(traducir_lote))
+
+        commits = []
+        registrar_commit = lambda sesion: commits.append(sesion)
+        event.listen(Session, 'after_commit', registrar_commit)
+        try:
+            datos = {'imagenes': [
+                (io.BytesIO(b'\xff\xd8\xff' + nombre.encode()), nombre)
+                for nombre in ('uno.jpg', 'dos.jpg', 'tres.jpg')
+            ]}
+            respuesta = cliente.post('/api/analizar/lote', data=datos, headers=headers_token,
+                                     content_type='multipart/form-data')
+        finally:
+            event.remove(Session, 'after_commit', registrar_commit)
+
+        assert respuesta.status_code == 201
+        assert llamadas == [['Dog', 'Pet']]
+        assert len(commits) == 1
+        assert Analisis.query.count() == 3
+        resultados = respuesta.get_json()['datos']['resultados']
+        assert all(resultado['exito'] for resultado in resultados)
+        assert resultados[0]['analisis']['etiquetas_traducidas'][0]['nombre'] == 'Dog'
+
+    def test_lote_desde_zip(self, app, cliente, headers_token):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Las imágenes de un zip se analizan respetando el máximo por lote
+        """
+        app.config['MAX_ARCHIVOS_LOTE'] = 2
+
+        contenido = io.BytesIO()
+        with zipfile.ZipFile(contenido, 'w') as comprimido:
+            comprimido.writestr('fotos/', '')
+            for nombre in ('a.jpg', 'b.jpg', 'c.jpg'):
+                comprimido.writestr(f'fotos/{nombre}', b'\xff\xd8\xff' + nombre.encode())
+        contenido.seek(0)
+
+        respuesta = cliente.post('/api/analizar/lote',
+                                 data={'imagenes': (contenido, 'catalogo.zip')},
+                                 headers=headers_token, content_type='multipart/form-data')
+
+        assert respuesta.status_code == 201
+        resultados = respuesta.get_json()['datos']['resultados']
+        assert [r['exito'] for r in resultados] == [True, True, False]
+        assert resultados[0]['analisis']['nombre_archivo'] == 'a.jpg'
+        assert 'máximo de 2' in resultados[2]['error']
+
+    def test_lote_valida_contenido_y_corta_en_el_maximo(self, app, cliente, headers_token):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Un archivo con extensión de imagen pero otro contenido se
+                     rechaza, y un zip con muchas entradas se corta en el máximo
+                     con un único error
+        """
+        app.config['MAX_ARCHIVOS_LOTE'] = 3
+
+        contenido = io.BytesIO()
+        with zipfile.ZipFile(contenido, 'w') as comprimido:
+            comprimido.writestr('falsa.jpg', b'no soy una imagen')
+            for indice in range(500):
+                comprimido.writestr(f'foto{indice}.jpg', b'\xff\xd8\xff' + str(indice).encode())
+        contenido.seek(0)
+
+        respuesta = cliente.post('/api/analizar/lote',
+                                 data={'imagenes': (contenido, 'catalogo.zip')},
+                                 headers=headers_token, content_type='multipart/form-data')
+
+        assert respuesta.status_code == 201
+        resultados = respuesta.get_json()['datos']['resultados']
+        assert [r['exito'] for r in resultados] == [False, True, True, False]
+        assert 'no es una imagen válida' in resultados[0]['error']
+        assert 'máximo de 3' in resultados[3]['error']
+        assert Analisis.query.count() == 2
+
+    def test_lote_con_entrada_zip_danada(self, app, cliente, headers_token):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Una entrada del zip con CRC incorrecto falla sola, sin
+                     abortar el lote ni dejar su archivo parcial en disco
+        """
+        contenido = io.BytesIO()
+        with zipfile.ZipFile(contenido, 'w', zipfile.ZIP_STORED) as comprimido:
+            comprimido.writestr('rota.jpg', b'\xff\xd8\xff' + b'A' * 100)
+            comprimido.writestr('buena.jpg', b'\xff\xd8\xff' + b'B' * 100)
+        datos = contenido.getvalue().replace(b'A' * 100, b'C' * 100, 1)
+        directorio = app.config['DIRECTORIO_CARGAS']
+        previos = {nombre for _, _, nombres in os.walk(directorio) for nombre in nombres}
+
+        respuesta = cliente.post('/api/analizar/lote',
+                                 data={'imagenes': (io.BytesIO(datos), 'catalogo.zip')},
+                                 headers=headers_token, content_type='multipart/form-data')
+
+        assert respuesta.status_code == 201
+        resultados = respuesta.get_json()['datos']['resultados']
+        assert [r['exito'] for r in resultados] == [False, True]
+        assert 'No se pudo leer el archivo' in resultados[0]['error']
+        assert Analisis.query.count() == 1
+        nuevos = {nombre for _, _, nombres in os.walk(directorio) for nombre in nombres} - previos
+        assert nuevos == {os.path.basename(Analisis.query.one().ruta_archivo)}
+
+    def test_lote_sin_imagenes(self, cliente, headers_token):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Sin el campo 'imagenes' se rechaza la petición
+        """
+        respuesta = cliente.post('/api/analizar/lote', data={}, headers=headers_token,
+                                 content_type='multipart/form-data')
+
+        assert respuesta.status_code == 400
+
+
+class TestDetalleAnalisis:
+    """Tests para el detalle de un análisis"""
+
+    def test_detalle_usa_interpretacion_guardada(self, cliente, headers_token, monkeypatch):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: El detalle no vuelve a traducir un análisis ya procesado
+        """
+        respuesta = cliente.post('/api/analizar', data=datos_imagen(), headers=headers_token,
+                                 content_type='multipart/form-data')
+        creado = respuesta.get_json()['datos']
+
+        def traducir_no_permitido(etiquetas):
+            raise AssertionError("No se debe traducir al leer un análisis guardado")
+
+        monkeypatch.setattr(ServicioInterpretacion, 'traducir_etiquetas', staticmethod(traducir_no_permitido))
+
+        respuesta = cliente.get(f"/api/historial/{creado['id']}", headers=headers_token)
+        datos = respuesta.get_json()['datos']
+
+        assert respuesta.status_code == 200
+        assert datos['etiquetas_traducidas'] == creado['etiquetas_traducidas']
+        assert datos['interpretacion'] == creado['interpretacion']
+
+    def test_detalle_calcula_y_guarda_si_falta(self, cliente, headers_token, usuario_prueba):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Un análisis antiguo sin interpretación se calcula una vez y se guarda
+        """
+        antiguo = Analisis('antiguo', usuario_prueba.id, 'foto.jpg', '/no/existe.jpg',
+                           'imagga', ETIQUETAS_FALSAS)
+        db.session.add(antiguo)
+        db.session.commit()
+
+        respuesta = cliente.get('/api/historial/antiguo', headers=headers_token)
+
+        assert respuesta.status_code == 200
+        assert 'Imagga' in respuesta.get_json()['datos']['interpretacion']
+        assert db.session.get(Analisis, 'antiguo').tiene_resultados_procesados()
+
+
+class TestContadorAnalisis:
+    """Tests del contador desnormalizado usuarios.total_analisis"""
+
+    def total_guardado(self, usuario_id):
+        """Lee el contador directamente de la BD"""
+        db.session.expire_all()
+        return db.session.get(Usuario, usuario_id).total_analisis
+
+    def test_contador_sigue_altas_y_bajas(self, cliente, headers_token, usuario_prueba):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Crear (individual y en lote) y eliminar (individual y en lote)
+                     mantiene el contador igual al conteo real
+        """
+        cliente.post('/api/analizar', data=datos_imagen(), headers=headers_token,
+                     content_type='multipart/form-data')
+        imagenes = [(io.BytesIO(b'\xff\xd8\xff' + nombre.encode()), nombre)
+                    for nombre in ('a.jpg', 'b.jpg', 'c.jpg')]
+        cliente.post('/api/analizar/lote', data={'imagenes': imagenes}, headers=headers_token,
+                     content_type='multipart/form-data')
+        assert self.total_guardado(usuario_prueba.id) == 4
+
+        ids = [analisis.id for analisis in Analisis.query.order_by(Analisis.id)]
+        respuesta = cliente.delete(f'/api/historial/{ids[0]}', headers=headers_token)
+        assert respuesta.status_code == 200
+        assert self.total_guardado(usuario_prueba.id) == 3
+
+        respuesta = cliente.delete('/api/historial', json={'ids': ids[1:3] + ['ajeno']},
+                                   headers=headers_token)
+        assert respuesta.status_code == 200
+        assert sorted(respuesta.get_json()['datos']['eliminados']) == sorted(ids[1:3])
+        assert self.total_guardado(usuario_prueba.id) == 1
+        assert Analisis.query.count() == 1
+
+        respuesta = cliente.get('/api/auth/verificar', headers=headers_token)
+        assert respuesta.get_json()['datos']['total_analisis'] == 1
+
+    def test_flush_fallido_no_deja_deltas(self, usuario_prueba):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Los deltas de un flush que falla se descartan y no se
+                     aplican en el siguiente flush de la sesión
+        """
+        db.session.add(Analisis('roto', usuario_prueba.id, None, '/no/existe.jpg',
+                                'google', ETIQUETAS_FALSAS))
+        with pytest.raises(IntegrityError):
+            db.session.flush()
+        db.session.rollback()
+
+        db.session.add(Etiqueta(nombre='Gato'))
+        db.session.commit()
+
+        assert self.total_guardado(usuario_prueba.id) == 0
+        assert Analisis.query.count() == 0
+
+    def test_reconciliar_contadores(self, usuario_prueba):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: La sentencia de reconciliación corrige un contador desfasado
+        """
+        db.session.add(Analisis('a1', usuario_prueba.id, 'foto.jpg', '/no/existe.jpg',
+                                'google', ETIQUETAS_FALSAS))
+        db.session.commit()
+        db.session.execute(db.update(Usuario).values(total_analisis=7))
+        db.session.commit()
+
+        db.session.execute(db.text(SENTENCIA_RECONCILIAR_TOTALES))
+        db.session.commit()
+
+        assert self.total_guardado(usuario_prueba.id) == 1
+
+
+class TestHistorial:
+    """Tests de la paginación del historial"""
+
+    def crear_analisis(self, usuario_id, cantidad):
+        """Crea análisis con fechas repetidas para forzar el desempate por id"""
+        base = datetime(2024, 11, 1)
+        for indice in range(cantidad):
+            analisis = Analisis(f'a{indice:03d}', usuario_id, f'foto{indice}.jpg', '/no/existe.jpg',
+                                'google', ETIQUETAS_FALSAS)
+            analisis.fecha_analisis = base + timedelta(minutes=indice // 3)
+            db.session.add(analisis)
+        db.session.commit()
+
+    def test_cursor_recorre_todo_en_orden(self, cliente, headers_token, usuario_prueba):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Recorrer por cursor devuelve lo mismo que las páginas numeradas
+        """
+        self.crear_analisis(usuario_prueba.id, 11)
+
+        ids_cursor = []
+        cursor = ''
+        while cursor is not None:
+            respuesta = cliente.get(f'/api/historial?cursor={cursor}&por_pagina=4', headers=headers_token)
+            datos = respuesta.get_json()['datos']
+            assert 'total' not in datos
+            ids_cursor.extend(analisis['id'] for analisis in datos['analisis'])
+            cursor = datos['siguiente_cursor']
+
+        ids_paginas = []
+        for pagina in (1, 2, 3):
+            respuesta = cliente.get(f'/api/historial?pagina={pagina}&por_pagina=4', headers=headers_token)
+            datos = respuesta.get_json()['datos']
+            ids_paginas.extend(analisis['id'] for analisis in datos['analisis'])
+
+        assert datos['total'] == 11
+        assert datos['total_paginas'] == 3
+        assert ids_cursor == ids_paginas
+        assert len(set(ids_cursor)) == 11
+        assert ids_cursor[:4] == ['a009', 'a010', 'a006', 'a007']
+
+    def test_cursor_con_total_y_cursor_invalido(self, cliente, headers_token, usuario_prueba):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: El total es opcional en modo cursor y un cursor malformado se rechaza
+        """
+        self.crear_analisis(usuario_prueba.id, 2)
+
+        respuesta = cliente.get('/api/historial?cursor=&incluir_total=true', headers=headers_token)
+        datos = respuesta.get_json()['datos']
+        assert datos['total'] == 2
+        assert datos['siguiente_cursor'] is None
+
+        respuesta = cliente.get('/api/historial?cursor=no-es-un-cursor', headers=headers_token)
+        assert respuesta.status_code == 400
+
+    def test_listado_sin_cargar_json(self, cliente, headers_token, usuario_prueba):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: El listado solo carga las columnas del resumen e incluye la etiqueta principal
+        """
+        self.crear_analisis(usuario_prueba.id, 1)
+
+        analisis = ServicioAnalisis.consulta_historial(usuario_prueba.id).first()
+        assert {'etiquetas_json', 'interpretacion', 'ruta_archivo'} <= inspect(analisis).unloaded
+
+        respuesta = cliente.get('/api/historial', headers=headers_token)
+        elemento = respuesta.get_json()['datos']['analisis'][0]
+        assert elemento['etiqueta_principal'] == 'Dog'
+        assert 'etiquetas' not in elemento
+
+
+class TestEtiquetasNormalizadas:
+    """Tests del almacenamiento de etiquetas en analisis_etiquetas"""
+
+    def test_etiquetas_como_filas_con_vocabulario(self, usuario_prueba):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Las etiquetas se guardan como filas y cada nombre una sola vez
+        """
+        combinadas = [{'etiqueta': 'Dog', 'confianza': 0.95, 'proveedores': ['google', 'imagga']}]
+        db.session.add(Analisis('a1', usuario_prueba.id, 'a.jpg', '/no/existe.jpg', 'google', ETIQUETAS_FALSAS))
+        db.session.add(Analisis('a2', usuario_prueba.id, 'b.jpg', '/no/existe.jpg', 'ambos', combinadas))
+        db.session.commit()
+
+        assert sorted(nombre for (nombre,) in db.session.query(Etiqueta.nombre)) == ['Dog', 'Pet']
+        assert AnalisisEtiqueta.query.count() == 3
+
+        db.session.expire_all()
+        assert db.session.get(Analisis, 'a1').obtener_etiquetas() == ETIQUETAS_FALSAS
+        assert db.session.get(Analisis, 'a2').obtener_etiquetas() == combinadas
+        assert db.session.get(Analisis, 'a1').etiquetas_json is None
+
+        db.session.delete(db.session.get(Analisis, 'a1'))
+        db.session.commit()
+        assert AnalisisEtiqueta.query.count() == 1
+
+        ServicioAnalisis.eliminar_lote(usuario_prueba.id, ['a2'])
+        assert AnalisisEtiqueta.query.count() == 0
+
+    def test_migracion_desde_json(self, usuario_prueba):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: La migración 0006 pasa las etiquetas del texto JSON a filas
+        """
+        db.session.execute(Analisis.__table__.insert().values(
+            id='antiguo', usuario_id=usuario_prueba.id, nombre_archivo='a.jpg',
+            ruta_archivo='/no/existe.jpg', proveedor_ia='google',
+            etiquetas_json=json.dumps(ETIQUETAS_FALSAS), fecha_analisis=datetime(2024, 11, 1)
+        ))
+        db.session.commit()
+
+        with db.engine.begin() as conexion:
+            migracion_0006_etiquetas_normalizadas(conexion)
+
+        db.session.expire_all()
+        analisis = db.session.get(Analisis, 'antiguo')
+        assert analisis.etiquetas_json is None
+        assert analisis.obtener_etiquetas() == ETIQUETAS_FALSAS
+        assert {fila.usuario_id for fila in analisis.filas_etiquetas} == {usuario_prueba.id}
+
+
+class TestBusquedaHistorial:
+    """Tests de la búsqueda en el historial por etiqueta, proveedor y fecha"""
+
+    def crear_analisis(self, usuario_id):
+        """Crea tres análisis con etiquetas, proveedores y fechas distintas"""
+        gatos = [{'etiqueta': 'Cat', 'confianza': 0.60}, {'etiqueta': 'Pet', 'confianza': 0.55}]
+        for id_analisis, proveedor, etiquetas, dia in (
+            ('perro', 'google', ETIQUETAS_FALSAS, 1),
+            ('gato', 'imagga', gatos, 2),
+            ('perro2', 'imagga', ETIQUETAS_FALSAS, 3)
+        ):
+            analisis = Analisis(id_analisis, usuario_id, f'{id_analisis}.jpg', '/no/existe.jpg',
+                                proveedor, etiquetas)
+            analisis.fecha_analisis = datetime(2024, 11, dia)
+            db.session.add(analisis)
+        db.session.commit()
+
+    def buscar(self, cliente, headers_token, consulta):
+        """Ids encontrados para la consulta"""
+        respuesta = cliente.get(f'/api/historial/buscar?{consulta}', headers=headers_token)
+        assert respuesta.status_code == 200
+        return [analisis['id'] for analisis in respuesta.get_json()['datos']['analisis']]
+
+    def test_filtros(self, cliente, headers_token, usuario_prueba):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Cada filtro acota el resultado y se pueden combinar
+        """
+        self.crear_analisis(usuario_prueba.id)
+
+        assert self.buscar(cliente, headers_token, 'etiqueta=pet') == ['perro2', 'gato', 'perro']
+        assert self.buscar(cliente, headers_token, 'etiqueta=Pet&min_confianza=0.9') == ['perro2', 'perro']
+        assert self.buscar(cliente, headers_token, 'etiqueta=Pet&proveedor=imagga') == ['perro2', 'gato']
+        assert self.buscar(cliente, headers_token, 'etiqueta=Dog&desde=2024-11-02') == ['perro2']
+        assert self.buscar(cliente, headers_token, 'proveedor=google') == ['perro']
+        assert self.buscar(cliente, headers_token, 'etiqueta=Horse') == []
+
+    def test_cursor_y_eliminacion(self, cliente, headers_token, usuario_prueba):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: La búsqueda pagina por cursor y deja de encontrar lo eliminado
+        """
+        self.crear_analisis(usuario_prueba.id)
+
+        respuesta = cliente.get('/api/historial/buscar?etiqueta=Pet&por_pagina=2', headers=headers_token)
+        datos = respuesta.get_json()['datos']
+        assert [analisis['id'] for analisis in datos['analisis']] == ['perro2', 'gato']
+        consulta = f"etiqueta=Pet&por_pagina=2&cursor={datos['siguiente_cursor']}"
+        assert self.buscar(cliente, headers_token, consulta) == ['perro']
+
+        ServicioAnalisis.eliminar_lote(usuario_prueba.id, ['perro2'])
+        assert self.buscar(cliente, headers_token, 'etiqueta=Dog') == ['perro']
+
+    @pytest.mark.parametrize('consulta', [
+        '',
+        'min_confianza=0.5',
+        'etiqueta=Dog&min_confianza=2',
+        'etiqueta=Dog&min_confianza=mucha',
+        'proveedor=otro',
+        'desde=ayer',
+        'etiqueta=Dog&cursor=no-es-un-cursor'
+    ])
+    def test_parametros_invalidos(self, cliente, headers_token, consulta):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Los parámetros inválidos o la ausencia de filtros responden 400
+        """
+        respuesta = cliente.get(f'/api/historial/buscar?{consulta}', headers=headers_token)
+        assert respuesta.status_code == 400
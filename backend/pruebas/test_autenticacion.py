@@ -4,8 +4,11 @@ Fecha: Noviembre 2024
 Descripción: Tests unitarios para el módulo de autenticación
 """
 
+import threading
+import time
 import pytest
-from modelos import Usuario
+from modelos import db, Usuario
+from servicios.pool_contrasenas import PoolContrasenas
 
 
 class TestRegistro:
@@ -109,6 +112,87 @@ class TestInicioSesion:
         assert respuesta.status_code == 401
         datos = respuesta.get_json()
         assert datos['exito'] is False
+    
+    def test_inicio_sesion_rehash_con_costo_nuevo(self, app, cliente, usuario_prueba):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Al cambiar BCRYPT_RONDAS el hash se actualiza en el siguiente inicio de sesión
+        """
+        assert Usuario.query.get(usuario_prueba.id).contrasena_hash.startswith('$2b$04$')
+        app.config['BCRYPT_RONDAS'] = 5
+        
+        respuesta = cliente.post('/api/auth/iniciar-sesion', json={
+            'nombre_usuario': 'usuario_test',
+            'contrasena': 'TestPass123!'
+        })
+        
+        assert respuesta.status_code == 200
+        usuario = Usuario.query.get(usuario_prueba.id)
+        assert usuario.contrasena_hash.startswith('$2b$05$')
+        assert not usuario.necesita_rehash()
+        assert usuario.verificar_contrasena('TestPass123!')
+    
+    def test_inicio_sesion_fecha_por_lotes(self, app, cliente, usuario_prueba):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: La fecha de última sesión se responde al instante pero se
+                     escribe en la base de datos al vaciar el registro
+        """
+        registro_sesiones = app.extensions['registro_sesiones']
+        
+        respuesta = cliente.post('/api/auth/iniciar-sesion', json={
+            'nombre_usuario': 'usuario_test',
+            'contrasena': 'TestPass123!'
+        })
+        
+        assert respuesta.status_code == 200
+        assert respuesta.get_json()['datos']['usuario']['fecha_ultima_sesion'] is not None
+        assert len(registro_sesiones) == 1
+        
+        db.session.expire_all()
+        assert Usuario.query.get(usuario_prueba.id).fecha_ultima_sesion is None
+        
+        assert registro_sesiones.vaciar() == 1
+        db.session.expire_all()
+        assert Usuario.query.get(usuario_prueba.id).fecha_ultima_sesion is not None
+        assert len(registro_sesiones) == 0
+    
+    def test_inicio_sesion_pool_saturado(self, app, cliente, usuario_prueba):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Con el pool de contraseñas lleno el login responde 503 con Retry-After
+        """
+        pool = PoolContrasenas(max_hilos=1, max_pendientes=1)
+        app.extensions['pool_contrasenas'] = pool
+        liberar = threading.Event()
+        ocupado = threading.Thread(target=pool.ejecutar, args=(liberar.wait,))
+        ocupado.start()
+        
+        try:
+            while pool._cupos._value != 0:
+                time.sleep(0.001)
+            
+            respuesta = cliente.post('/api/auth/iniciar-sesion', json={
+                'nombre_usuario': 'usuario_test',
+                'contrasena': 'TestPass123!'
+            })
+        finally:
+            liberar.set()
+            ocupado.join()
+            pool.apagar()
+        
+        assert respuesta.status_code == 503
+        assert respuesta.headers['Retry-After'] == '1'
+        assert respuesta.get_json()['error'] == 'servicio_saturado'
+        
+        respuesta = cliente.post('/api/auth/iniciar-sesion', json={
+            'nombre_usuario': 'usuario_test',
+            'contrasena': 'TestPass123!'
+        })
+        assert respuesta.status_code == 200
 
 
 class TestVerificacionToken:
@@ -126,6 +210,43 @@ class TestVerificacionToken:
         datos = respuesta.get_json()
         assert datos['exito'] is True
     
+    def test_verificar_usuario_desactivado(self, app, cliente, usuario_prueba, headers_autenticados):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Desactivar un usuario invalida su entrada en la caché de usuarios
+        """
+        assert cliente.get('/api/auth/verificar', headers=headers_autenticados).status_code == 200
+        assert app.extensions['cache_usuarios'].usuario_activo(usuario_prueba.id) is True
+        assert len(app.extensions['cache_usuarios']) == 1
+        
+        usuario = db.session.get(Usuario, usuario_prueba.id)
+        usuario.activo = False
+        db.session.commit()
+        
+        assert len(app.extensions['cache_usuarios']) == 0
+        assert cliente.get('/api/auth/verificar', headers=headers_autenticados).status_code == 401
+    
+    def test_cache_usuarios_evita_consulta(self, app, usuario_prueba):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Una entrada vigente se responde sin leer la BD hasta que se invalida
+        """
+        cache = app.extensions['cache_usuarios']
+        assert cache.usuario_activo(usuario_prueba.id) is True
+        
+        # Cambio fuera del ORM: no dispara la invalidación
+        db.session.execute(
+            db.update(Usuario).where(Usuario.id == usuario_prueba.id).values(activo=False)
+        )
+        db.session.commit()
+        
+        assert cache.usuario_activo(usuario_prueba.id) is True
+        cache.invalidar(usuario_prueba.id)
+        assert cache.usuario_activo(usuario_prueba.id) is False
+        assert cache.usuario_activo(999999) is False
+    
     def test_verificar_token_sin_token(self, cliente):
         """
         Autor: Steeven Vargas
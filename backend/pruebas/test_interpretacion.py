@@ -0,0 +1,153 @@
+"""
+Autor: Steeven Vargas
+Fecha: Noviembre 2024
+Descripción: Tests unitarios para el servicio de interpretación (traductor stub)
+"""
+
+import pytest
+from modelos import db, TraduccionEtiqueta, Usuario
+from servicios.servicio_interpretacion import ServicioInterpretacion
+
+
+ETIQUETAS = [
+    {'etiqueta': 'Dog', 'confianza': 0.98},
+    {'etiqueta': 'Sky', 'confianza': 0.75},
+    {'etiqueta': 'Food', 'confianza': 0.5}
+]
+
+DICCIONARIO = {'Dog': 'perro', 'Sky': 'cielo', 'Food': 'comida'}
+
+
+class TraductorFalso:
+    """Traduce con un diccionario y registra cada llamada"""
+
+    llamadas = []
+    falla_con = set()
+    conserva_lineas = True
+
+    def translate(self, texto):
+        TraductorFalso.llamadas.append(texto)
+        lineas = texto.split('\n')
+        if any(linea in TraductorFalso.falla_con for linea in lineas):
+            raise Exception("Error de red simulado")
+        traduccion = [DICCIONARIO.get(linea, linea) for linea in lineas]
+        separador = '\n' if TraductorFalso.conserva_lineas else ' '
+        return separador.join(traduccion)
+
+
+@pytest.fixture(autouse=True)
+def traductor_falso(monkeypatch):
+    """Reemplaza GoogleTranslator por el traductor falso"""
+    TraductorFalso.llamadas = []
+    TraductorFalso.falla_con = set()
+    TraductorFalso.conserva_lineas = True
+    monkeypatch.setattr(ServicioInterpretacion, 'crear_traductor', staticmethod(TraductorFalso))
+
+
+class TestTraduccion:
+    """Tests para la traducción de etiquetas"""
+
+    def test_traduce_en_una_sola_llamada(self):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Todas las etiquetas se traducen en un único lote
+        """
+        traducidas = ServicioInterpretacion.traducir_etiquetas(ETIQUETAS)
+
+        assert [et['nombre'] for et in traducidas] == ['Perro', 'Cielo', 'Comida']
+        assert [et['confianza'] for et in traducidas] == [98, 75, 50]
+        assert len(TraductorFalso.llamadas) == 1
+
+    def test_lote_desalineado_traduce_por_etiqueta(self):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Si el lote pierde los saltos de línea se traduce cada etiqueta
+        """
+        TraductorFalso.conserva_lineas = False
+
+        traducidas = ServicioInterpretacion.traducir_etiquetas(ETIQUETAS)
+
+        assert [et['nombre'] for et in traducidas] == ['Perro', 'Cielo', 'Comida']
+        assert len(TraductorFalso.llamadas) == 1 + len(ETIQUETAS)
+
+    def test_fallo_individual_conserva_original(self):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Una etiqueta que no se puede traducir mantiene su nombre
+        """
+        TraductorFalso.falla_con = {'Sky'}
+
+        traducidas = ServicioInterpretacion.traducir_etiquetas(ETIQUETAS)
+
+        assert [et['nombre'] for et in traducidas] == ['Perro', 'Sky', 'Comida']
+        assert traducidas[1]['nombre_original'] == 'Sky'
+
+
+class TestDiccionarioTraducciones:
+    """Tests para el diccionario persistente de traducciones"""
+
+    def test_terminos_conocidos_no_llaman_al_traductor(self, app):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Tras la primera traducción las etiquetas salen del diccionario
+        """
+        ServicioInterpretacion.traducir_etiquetas(ETIQUETAS)
+        TraductorFalso.llamadas = []
+        app.extensions['diccionario_traducciones'].memoria.limpiar()
+
+        traducidas = ServicioInterpretacion.traducir_etiquetas(ETIQUETAS)
+
+        assert [et['nombre'] for et in traducidas] == ['Perro', 'Cielo', 'Comida']
+        assert TraductorFalso.llamadas == []
+        assert TraduccionEtiqueta.query.count() == 3
+
+    def test_solo_terminos_nuevos_llegan_al_traductor(self, app):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Con un término nuevo solo ese se envía al traductor
+        """
+        ServicioInterpretacion.traducir_etiquetas(ETIQUETAS[:2])
+        TraductorFalso.llamadas = []
+
+        ServicioInterpretacion.traducir_etiquetas(ETIQUETAS)
+
+        assert TraductorFalso.llamadas == ['Food']
+
+    def test_traducciones_fallidas_no_se_guardan(self, app):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Una etiqueta sin traducción no se registra en el diccionario
+        """
+        TraductorFalso.falla_con = {'Sky'}
+
+        ServicioInterpretacion.traducir_etiquetas(ETIQUETAS)
+
+        assert db_terminos() == {'dog', 'food'}
+
+    def test_guardar_no_toca_la_sesion(self, app):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Registrar traducciones no confirma ni envía el trabajo
+                     pendiente de la sesión de quien traduce
+        """
+        db.session.add(Usuario(nombre_usuario='pendiente', contrasena_hash='x'))
+
+        insertados = app.extensions['diccionario_traducciones'].guardar({'Dog': 'perro'})
+        repetidos = app.extensions['diccionario_traducciones'].guardar({'Dog': 'can'})
+        db.session.rollback()
+
+        assert (insertados, repetidos) == (1, 0)
+        assert db_terminos() == {'dog'}
+        assert Usuario.query.filter_by(nombre_usuario='pendiente').count() == 0
+
+
+def db_terminos():
+    """Términos registrados en el diccionario"""
+    return {fila.termino_en for fila in TraduccionEtiqueta.query.all()}
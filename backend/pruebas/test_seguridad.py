@@ -0,0 +1,551 @@
+"""
+Autor: Steeven Vargas
+Fecha: Noviembre 2024
+Descripción: Tests unitarios para el limitador de peticiones y el captcha
+"""
+
+import logging
+import multiprocessing
+import sqlite3
+import threading
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, text
+from app import crear_aplicacion
+from config.configuracion import ConfiguracionPruebas
+from config.registro_eventos import configurar_registro, interpretar_niveles
+from modelos import db
+from utilidades import captcha
+from utilidades.captcha import (
+    AlmacenCaptchas, RegistroUsosMemoria, RegistroUsosSQLite,
+    firmar_captcha, generar_captcha, validar_captcha
+)
+from utilidades.limitador import LimitadorMemoria, LimitadorSQLite, LimitadorRedis, crear_limitador
+
+
+class RelojFalso:
+    """Reloj controlado manualmente"""
+
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def __call__(self):
+        return self.ahora
+
+
+class RedisFalso:
+    """Implementación en memoria de los comandos de sorted set que usa LimitadorRedis"""
+
+    def __init__(self):
+        self.conjuntos = {}
+
+    def pipeline(self, transaction=True):
+        return PipelineFalso(self)
+
+    def zremrangebyscore(self, clave, minimo, maximo):
+        conjunto = self.conjuntos.get(clave, {})
+        eliminar = [m for m, puntaje in conjunto.items() if puntaje <= float(maximo)]
+        for miembro in eliminar:
+            del conjunto[miembro]
+        return len(eliminar)
+
+    def zadd(self, clave, miembros):
+        self.conjuntos.setdefault(clave, {}).update(miembros)
+        return len(miembros)
+
+    def zcard(self, clave):
+        return len(self.conjuntos.get(clave, {}))
+
+    def zrem(self, clave, miembro):
+        return int(self.conjuntos.get(clave, {}).pop(miembro, None) is not None)
+
+    def zrange(self, clave, inicio, fin, withscores=False):
+        ordenados = sorted(self.conjuntos.get(clave, {}).items(), key=lambda item: item[1])
+        return ordenados[inicio:fin + 1]
+
+    def pexpire(self, clave, milisegundos):
+        return True
+
+    def scan_iter(self, match='*'):
+        prefijo = match.rstrip('*')
+        return [clave for clave in self.conjuntos if clave.startswith(prefijo)]
+
+    def delete(self, *claves):
+        for clave in claves:
+            self.conjuntos.pop(clave, None)
+
+
+class PipelineFalso:
+    """Acumula comandos y los ejecuta en orden"""
+
+    def __init__(self, cliente):
+        self.cliente = cliente
+        self.comandos = []
+
+    def __getattr__(self, nombre):
+        def encolar(*args, **kwargs):
+            self.comandos.append((getattr(self.cliente, nombre), args, kwargs))
+            return self
+        return encolar
+
+    def execute(self):
+        return [comando(*args, **kwargs) for comando, args, kwargs in self.comandos]
+
+
+def registrar_en_proceso(ruta_bd, cola):
+    """Registra 10 peticiones desde otro proceso (otro worker)"""
+    limitador = LimitadorSQLite(ruta_bd, ventana_segundos=60)
+    cola.put(sum(limitador.registrar('1.1.1.1', 15).permitido for _ in range(10)))
+
+
+class TestLimitadorMemoria:
+    """Tests para la ventana deslizante en memoria"""
+
+    def test_ventana_deslizante(self):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Al llenar la ventana se rechaza y el cupo vuelve al vencer la marca más antigua
+        """
+        reloj = RelojFalso()
+        limitador = LimitadorMemoria(ventana_segundos=60, reloj=reloj)
+
+        assert limitador.registrar('1.1.1.1', 2) == (True, 1, 0)
+        reloj.ahora += 30
+        assert limitador.registrar('1.1.1.1', 2) == (True, 0, 0)
+
+        reloj.ahora += 10
+        resultado = limitador.registrar('1.1.1.1', 2)
+        assert not resultado.permitido
+        assert resultado.reintentar_en == 20
+
+        assert limitador.registrar('2.2.2.2', 2).permitido
+
+        reloj.ahora += 20
+        assert limitador.registrar('1.1.1.1', 2).permitido
+
+    def test_claves_inactivas_se_purgan(self):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Las claves vencidas se eliminan sin recorrer todas en cada petición
+        """
+        reloj = RelojFalso()
+        limitador = LimitadorMemoria(ventana_segundos=60, reloj=reloj)
+
+        for i in range(10):
+            limitador.registrar(f'cliente{i}', 5)
+        assert len(limitador) == 10
+
+        reloj.ahora += 61
+        limitador.registrar('nuevo', 5)
+        assert len(limitador) == 10 - LimitadorMemoria.PURGAS_POR_PETICION + 1
+
+        for _ in range(10):
+            limitador.registrar('nuevo', 100)
+        assert len(limitador) == 1
+
+
+class TestLimitadoresCompartidos:
+    """Tests para los almacenes compartidos entre workers"""
+
+    @pytest.mark.parametrize('crear', [
+        lambda tmp_path, reloj: LimitadorSQLite(str(tmp_path / 'limitador.db'), 60, reloj=reloj),
+        lambda tmp_path, reloj: LimitadorRedis(RedisFalso(), 60, reloj=reloj)
+    ], ids=['sqlite', 'redis'])
+    def test_ventana_deslizante(self, tmp_path, crear):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Los almacenes compartidos respetan la misma ventana que el de memoria
+        """
+        reloj = RelojFalso()
+        limitador = crear(tmp_path, reloj)
+
+        assert limitador.registrar('1.1.1.1', 2) == (True, 1, 0)
+        reloj.ahora += 30
+        assert limitador.registrar('1.1.1.1', 2) == (True, 0, 0)
+
+        reloj.ahora += 10
+        resultado = limitador.registrar('1.1.1.1', 2)
+        assert not resultado.permitido
+        assert resultado.reintentar_en == pytest.approx(20)
+
+        reloj.ahora += 20
+        assert limitador.registrar('1.1.1.1', 2).permitido
+
+        limitador.limpiar()
+        assert limitador.registrar('1.1.1.1', 1).permitido
+
+    def test_sqlite_compartido_entre_procesos(self, tmp_path):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Cuatro procesos con el mismo archivo aprueban en total solo el límite
+        """
+        ruta_bd = str(tmp_path / 'limitador.db')
+        LimitadorSQLite(ruta_bd)
+
+        contexto = multiprocessing.get_context('fork')
+        cola = contexto.Queue()
+        procesos = [contexto.Process(target=registrar_en_proceso, args=(ruta_bd, cola)) for _ in range(4)]
+        for proceso in procesos:
+            proceso.start()
+        permitidas = sum(cola.get(timeout=30) for _ in procesos)
+        for proceso in procesos:
+            proceso.join()
+
+        assert permitidas == 15
+
+    def test_sqlite_reutiliza_conexion_por_hilo(self, tmp_path):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Cada hilo reutiliza su conexión, con synchronous=NORMAL
+        """
+        limitador = LimitadorSQLite(str(tmp_path / 'limitador.db'))
+        conexion = limitador._conexion()
+        assert limitador._conexion() is conexion
+        assert conexion.execute('PRAGMA synchronous').fetchone()[0] == 1
+
+        otras = []
+        hilo = threading.Thread(target=lambda: otras.append(limitador._conexion()))
+        hilo.start()
+        hilo.join()
+        assert otras[0] is not conexion
+
+    @pytest.mark.parametrize('crear', [
+        lambda tmp_path: LimitadorMemoria(60),
+        lambda tmp_path: LimitadorSQLite(str(tmp_path / 'limitador.db'), 60),
+        lambda tmp_path: LimitadorRedis(RedisFalso(), 60)
+    ], ids=['memoria', 'sqlite', 'redis'])
+    def test_limite_cero_rechaza(self, tmp_path, crear):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Un límite de 0 (o negativo) rechaza todas las peticiones
+                     en lugar de fallar
+        """
+        limitador = crear(tmp_path)
+
+        assert limitador.registrar('1.1.1.1', 0) == (False, 0, 60)
+        assert limitador.registrar('1.1.1.1', -1) == (False, 0, 60)
+        assert limitador.registrar('1.1.1.1', 1).permitido
+
+    def test_crear_limitador(self, tmp_path):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: La fábrica valida el backend y su configuración
+        """
+        assert isinstance(crear_limitador('memoria'), LimitadorMemoria)
+        assert isinstance(crear_limitador('sqlite', ruta_bd=str(tmp_path / 'l.db')), LimitadorSQLite)
+        with pytest.raises(ValueError):
+            crear_limitador('sqlite')
+        with pytest.raises(ValueError):
+            crear_limitador('memcached')
+
+
+class ConfiguracionDetrasDeProxy(ConfiguracionPruebas):
+    """Configuración de pruebas con nginx delante"""
+    PROXIES_CONFIABLES = 1
+
+
+def iniciar_sesion(cliente, **kwargs):
+    """Intento de inicio de sesión fallido (la ruta está limitada)"""
+    return cliente.post('/api/auth/iniciar-sesion', json={
+        'nombre_usuario': 'nadie',
+        'contrasena': 'Incorrecta1.'
+    }, **kwargs)
+
+
+class TestLimitarPeticiones:
+    """Tests para el decorador limitar_peticiones"""
+
+    def test_headers_de_limite(self, app, cliente):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: El límite sale de LIMITES_POR_RUTA y el 429 indica cuándo reintentar
+        """
+        app.config['LIMITES_POR_RUTA'] = {'autenticacion.iniciar_sesion': 2}
+
+        respuesta = iniciar_sesion(cliente)
+        assert respuesta.headers['X-RateLimit-Limit'] == '2'
+        assert respuesta.headers['X-RateLimit-Remaining'] == '1'
+        assert iniciar_sesion(cliente).headers['X-RateLimit-Remaining'] == '0'
+
+        respuesta = iniciar_sesion(cliente)
+        assert respuesta.status_code == 429
+        assert respuesta.headers['X-RateLimit-Remaining'] == '0'
+        assert 1 <= int(respuesta.headers['Retry-After']) <= 60
+
+    def test_contador_por_ruta(self, app, cliente):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Agotar una ruta no consume el cupo de otra
+        """
+        app.config['LIMITES_POR_RUTA'] = {'autenticacion.iniciar_sesion': 1}
+
+        iniciar_sesion(cliente)
+        assert iniciar_sesion(cliente).status_code == 429
+
+        respuesta = cliente.post('/api/auth/registrar', json={'nombre_usuario': 'x'})
+        assert respuesta.status_code == 400
+
+    def test_limitador_no_disponible_deja_pasar(self, app, cliente, caplog):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Si el almacén falla (SQLite bloqueado) la petición se
+                     atiende sin limitar y se registra una advertencia
+        """
+        class LimitadorBloqueado:
+            def registrar(self, clave, limite):
+                raise sqlite3.OperationalError('database is locked')
+
+        app.extensions['limitador_peticiones'] = LimitadorBloqueado()
+
+        respuesta = iniciar_sesion(cliente)
+
+        assert respuesta.status_code == 401
+        assert 'X-RateLimit-Limit' not in respuesta.headers
+        assert 'database is locked' in caplog.text
+
+    def test_x_forwarded_for_confiable(self):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Detrás del proxy cada IP real tiene su propio contador
+        """
+        app = crear_aplicacion(ConfiguracionDetrasDeProxy)
+        app.config['LIMITES_POR_RUTA'] = {'autenticacion.iniciar_sesion': 1}
+        cliente = app.test_client()
+
+        with app.app_context():
+            db.create_all()
+            try:
+                assert iniciar_sesion(cliente, headers={'X-Forwarded-For': '203.0.113.1'}).status_code == 401
+                assert iniciar_sesion(cliente, headers={'X-Forwarded-For': '203.0.113.1'}).status_code == 429
+                assert iniciar_sesion(cliente, headers={'X-Forwarded-For': '203.0.113.2'}).status_code == 401
+            finally:
+                db.session.remove()
+                db.drop_all()
+
+
+class TestCaptcha:
+    """Tests para el almacén y la validación de captchas"""
+
+    def test_almacen_acotado_y_expiracion(self):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: El almacén no supera su máximo y descarta los expirados
+        """
+        reloj = RelojFalso()
+        almacen = AlmacenCaptchas(max_entradas=3, ttl_segundos=300, reloj=reloj)
+
+        for i in range(5):
+            almacen.agregar(f'token{i}', i)
+        assert len(almacen) == 3
+        assert 'token0' not in almacen
+        assert almacen.obtener('token4').respuesta == 4
+
+        reloj.ahora += 301
+        assert almacen.obtener('token4') is None
+        almacen.agregar('nuevo', 7)
+        assert len(almacen) == 1
+
+    def test_validar_captcha(self, monkeypatch):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: La respuesta correcta se acepta una sola vez
+        """
+        monkeypatch.setattr(captcha, 'captchas_activos', AlmacenCaptchas())
+
+        datos = generar_captcha()
+        respuesta = captcha.captchas_activos.obtener(datos['token']).respuesta
+
+        assert validar_captcha(datos['token'], 'abc') == (False, "Respuesta inválida")
+        assert validar_captcha(datos['token'], str(respuesta))[0]
+        assert validar_captcha(datos['token'], str(respuesta)) == (False, "Captcha inválido o expirado")
+
+
+class TestCaptchaSinEstado:
+    """Tests para los captchas firmados"""
+
+    @pytest.fixture(autouse=True)
+    def modo_sin_estado(self, app, monkeypatch):
+        """Activa el modo sin estado con un registro de usos propio"""
+        app.config['CAPTCHA_SIN_ESTADO'] = True
+        app.extensions['registro_captchas'] = RegistroUsosMemoria()
+        monkeypatch.setattr(captcha, 'captchas_activos', AlmacenCaptchas())
+
+    def test_token_valida_sin_almacenar(self):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: El token no ocupa memoria en el worker y se acepta una sola vez
+        """
+        datos = generar_captcha()
+        assert datos['token'].startswith('v1.')
+        assert len(captcha.captchas_activos) == 0
+
+        token = firmar_captcha(12)
+        assert validar_captcha(token, '12')[0]
+        assert validar_captcha(token, '12') == (False, "Captcha inválido o expirado")
+
+    def test_respuesta_incorrecta_consume_el_token(self):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: No se puede recorrer el rango de respuestas con un mismo token
+        """
+        token = firmar_captcha(12)
+
+        assert not validar_captcha(token, '11')[0]
+        assert not validar_captcha(token, '12')[0]
+
+    def test_token_alterado_o_expirado(self):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Cambiar el vencimiento invalida la firma y un token vencido se rechaza
+        """
+        token = firmar_captcha(12)
+        partes = token.split('.')
+        partes[1] = str(int(partes[1]) + 3600)
+        assert validar_captcha('.'.join(partes), '12') == (False, "Captcha inválido o expirado")
+
+        vencido = firmar_captcha(12, ahora=0)
+        assert validar_captcha(vencido, '12') == (False, "Captcha inválido o expirado")
+
+    def test_registro_sqlite_compartido(self, tmp_path):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Un token usado en un worker queda usado para los demás
+        """
+        ruta_bd = str(tmp_path / 'limitador.db')
+        worker_a, worker_b = RegistroUsosSQLite(ruta_bd), RegistroUsosSQLite(ruta_bd)
+        expira = 4102444800
+
+        assert worker_a.registrar('nonce', expira)
+        assert not worker_b.registrar('nonce', expira)
+        assert worker_b.registrar('otro', expira)
+
+    def test_vencidos_se_descartan(self):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: El registro en memoria olvida los tokens al vencer
+        """
+        reloj = RelojFalso()
+        registro = RegistroUsosMemoria(reloj=reloj)
+
+        for i in range(5):
+            assert registro.registrar(f'nonce{i}', reloj.ahora + 60 * i)
+        assert len(registro) == 5
+
+        reloj.ahora += 150
+        assert registro.registrar('nuevo', reloj.ahora + 300)
+        assert len(registro) == 3
+
+    def test_registro_lleno_no_olvida_vigentes(self):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Con el registro lleno se rechazan tokens nuevos y los ya
+                     usados siguen sin poder reutilizarse
+        """
+        reloj = RelojFalso()
+        registro = RegistroUsosMemoria(max_entradas=3, reloj=reloj)
+
+        for i in range(3):
+            assert registro.registrar(f'nonce{i}', reloj.ahora + 300)
+
+        assert not registro.registrar('inundacion', reloj.ahora + 300)
+        assert not registro.registrar('nonce0', reloj.ahora + 300)
+        assert len(registro) == 3
+
+        reloj.ahora += 301
+        assert registro.registrar('despues', reloj.ahora + 300)
+
+
+class TestRegistroEventos:
+    """Tests para el registro de eventos del captcha"""
+
+    def test_interpretar_niveles(self):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: NIVEL_LOG admite nivel global y niveles por módulo
+        """
+        assert interpretar_niveles('WARNING') == (logging.WARNING, {})
+        assert interpretar_niveles('info, utilidades.captcha=DEBUG') == (
+            logging.INFO, {'utilidades.captcha': logging.DEBUG}
+        )
+        with pytest.raises(ValueError):
+            interpretar_niveles('RUIDOSO')
+
+    def test_debug_solo_en_modulos_indicados(self):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Un DEBUG global no baja la raíz de INFO; los módulos
+                     indicados sí quedan en DEBUG
+        """
+        nombres = ('', 'utilidades.captcha')
+        anteriores = {nombre: logging.getLogger(nombre).level for nombre in nombres}
+        try:
+            configurar_registro(SimpleNamespace(config={
+                'NIVEL_LOG': 'DEBUG,utilidades.captcha=DEBUG',
+                'ARCHIVO_LOG': None
+            }))
+
+            assert logging.getLogger().level == logging.INFO
+            assert not logging.getLogger('urllib3').isEnabledFor(logging.DEBUG)
+            assert logging.getLogger('utilidades.captcha').isEnabledFor(logging.DEBUG)
+        finally:
+            for nombre, nivel in anteriores.items():
+                logging.getLogger(nombre).setLevel(nivel)
+
+    def test_sql_con_echo_no_se_duplica(self, caplog):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Con SQLALCHEMY_ECHO el SQL no se propaga también a la raíz
+        """
+        try:
+            configurar_registro(SimpleNamespace(config={
+                'NIVEL_LOG': 'INFO',
+                'ARCHIVO_LOG': None,
+                'SQLALCHEMY_ECHO': True
+            }))
+            with create_engine('sqlite://', echo=True).connect() as conexion:
+                conexion.execute(text('SELECT 1'))
+
+            assert not [r for r in caplog.records if r.name.startswith('sqlalchemy.engine')]
+        finally:
+            logging.getLogger('sqlalchemy.engine').propagate = True
+
+    def test_log_de_captcha_sin_respuesta(self, caplog, monkeypatch):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Los eventos del captcha no exponen la respuesta ni el token
+        """
+        monkeypatch.setattr(captcha, 'captchas_activos', AlmacenCaptchas())
+
+        with caplog.at_level(logging.DEBUG, logger='utilidades.captcha'):
+            datos = generar_captcha()
+            respuesta = captcha.captchas_activos.obtener(datos['token']).respuesta
+            validar_captcha(datos['token'], str(respuesta + 1))
+
+        mensajes = [registro.getMessage() for registro in caplog.records]
+        assert mensajes
+        assert all(datos['token'][:10] not in mensaje for mensaje in mensajes)
+        assert all(datos['pregunta'] not in mensaje for mensaje in mensajes)
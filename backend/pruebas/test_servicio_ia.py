@@ -0,0 +1,505 @@
+"""
+Autor: Steeven Vargas
+Fecha: Noviembre 2024
+Descripción: Tests unitarios para el servicio de IA (sin llamadas a proveedores reales)
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+import requests
+from rendimiento.servidor_stub import ServidorStubImagga
+from servicios import servicio_ia
+from servicios.servicio_ia import ServicioIA, ClienteImagga
+from utilidades.cliente_http import InterruptorCircuito, CircuitoAbiertoError, CuerpoMultipart
+from utilidades.cache_resultados import CacheResultadosIA, CacheLRU
+from utilidades.pool_clientes import PoolClientes
+
+
+ETIQUETAS_FALSAS = [
+    {'etiqueta': 'Dog', 'confianza': 0.98},
+    {'etiqueta': 'Pet', 'confianza': 0.91}
+]
+
+
+@pytest.fixture
+def ruta_imagen(tmp_path):
+    """Crea un archivo de imagen falso"""
+    ruta = tmp_path / 'foto.jpg'
+    ruta.write_bytes(b'\xff\xd8\xff' + b'contenido-de-prueba' * 100)
+    return str(ruta)
+
+
+@pytest.fixture
+def llamadas_google(monkeypatch):
+    """Reemplaza la llamada a Google Vision y registra cada invocación"""
+    llamadas = []
+
+    def analizar_falso(ruta_imagen, max_resultados=10):
+        llamadas.append((ruta_imagen, max_resultados))
+        return list(ETIQUETAS_FALSAS)
+
+    monkeypatch.setattr(ServicioIA, 'analizar_con_google', staticmethod(analizar_falso))
+    return llamadas
+
+
+class TestCacheResultados:
+    """Tests para la caché de resultados de IA"""
+
+    def test_imagen_repetida_no_llama_al_proveedor(self, app, ruta_imagen, llamadas_google):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Una segunda subida del mismo contenido se sirve desde la caché
+        """
+        primera = ServicioIA.analizar_imagen(ruta_imagen, 'google')
+        segunda = ServicioIA.analizar_imagen(ruta_imagen, 'google')
+
+        assert primera == segunda == ETIQUETAS_FALSAS
+        assert len(llamadas_google) == 1
+
+        estadisticas = ServicioIA.obtener_cache().estadisticas()
+        assert estadisticas['aciertos_memoria'] == 1
+        assert estadisticas['fallos'] == 1
+
+    def test_modificar_resultado_no_altera_la_cache(self, app, ruta_imagen, llamadas_google):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Las etiquetas retornadas son una copia; modificarlas no
+                     cambia lo que devuelve el siguiente acierto
+        """
+        ServicioIA.analizar_imagen(ruta_imagen, 'google')
+
+        acierto = ServicioIA.analizar_imagen(ruta_imagen, 'google')
+        acierto[0]['etiqueta'] = 'Gato'
+        acierto.append({'etiqueta': 'Extra', 'confianza': 0.1})
+
+        assert ServicioIA.analizar_imagen(ruta_imagen, 'google') == ETIQUETAS_FALSAS
+        assert len(llamadas_google) == 1
+
+    def test_clave_incluye_max_resultados(self, app, ruta_imagen, llamadas_google):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Cambiar max_resultados produce una clave distinta
+        """
+        ServicioIA.analizar_imagen(ruta_imagen, 'google', max_resultados=5)
+        ServicioIA.analizar_imagen(ruta_imagen, 'google', max_resultados=10)
+
+        assert len(llamadas_google) == 2
+
+    def test_nivel_disco_persiste_entre_instancias(self, tmp_path):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Una instancia nueva recupera resultados desde SQLite
+        """
+        ruta_bd = str(tmp_path / 'cache.db')
+        clave = CacheResultadosIA.calcular_clave('abc', 'google', 10)
+
+        CacheResultadosIA(ruta_bd=ruta_bd).guardar(clave, ETIQUETAS_FALSAS)
+        cache = CacheResultadosIA(ruta_bd=ruta_bd)
+
+        assert cache.obtener(clave) == ETIQUETAS_FALSAS
+        assert cache.estadisticas()['aciertos_disco'] == 1
+
+    def test_nivel_disco_desaloja_por_tamano(self, tmp_path):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: El nivel en disco no supera max_entradas_disco
+        """
+        cache = CacheResultadosIA(
+            tamano_memoria=0,
+            ruta_bd=str(tmp_path / 'cache.db'),
+            max_entradas_disco=2
+        )
+
+        for indice in range(3):
+            cache.guardar(f'clave-{indice}', ETIQUETAS_FALSAS)
+
+        assert cache.obtener('clave-0') is None
+        assert cache.obtener('clave-2') == ETIQUETAS_FALSAS
+
+    def test_lru_desaloja_menos_usada(self):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: El nivel en memoria desaloja la entrada menos usada
+        """
+        lru = CacheLRU(tamano_maximo=2)
+        lru.guardar('a', 1)
+        lru.guardar('b', 2)
+        lru.obtener('a')
+        lru.guardar('c', 3)
+
+        assert lru.obtener('b') is None
+        assert lru.obtener('a') == 1
+        assert lru.obtener('c') == 3
+
+
+class ClienteVisionFalso:
+    """Cliente de Google Vision falso que responde etiquetas fijas"""
+
+    def __init__(self, ruta_credenciales):
+        self.ruta_credenciales = ruta_credenciales
+        self.llamadas = 0
+
+    def label_detection(self, image, max_results, timeout=None):
+        self.llamadas += 1
+        return SimpleNamespace(label_annotations=[
+            SimpleNamespace(description='Dog', score=0.981),
+            SimpleNamespace(description='Pet', score=0.912)
+        ][:max_results])
+
+
+@pytest.fixture
+def clientes_creados(monkeypatch):
+    """Reemplaza el pool de Google Vision por uno con clientes falsos"""
+    creados = []
+
+    def fabrica_falsa(ruta_credenciales):
+        cliente = ClienteVisionFalso(ruta_credenciales)
+        creados.append(cliente)
+        return cliente
+
+    monkeypatch.setattr(servicio_ia, 'pool_clientes_google', PoolClientes(fabrica_falsa))
+    return creados
+
+
+class TestPoolClientes:
+    """Tests para el pool de clientes de Google Vision"""
+
+    def test_cliente_reutilizado_entre_peticiones(self, app, ruta_imagen, clientes_creados):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Varias llamadas a Google Vision comparten un único cliente
+        """
+        for _ in range(3):
+            etiquetas = ServicioIA.analizar_con_google(ruta_imagen)
+
+        assert etiquetas == [
+            {'etiqueta': 'Dog', 'confianza': 0.98},
+            {'etiqueta': 'Pet', 'confianza': 0.91}
+        ]
+        assert len(clientes_creados) == 1
+        assert clientes_creados[0].llamadas == 3
+        assert clientes_creados[0].ruta_credenciales == app.config['CREDENCIALES_GOOGLE']
+
+    def test_round_robin_entre_canales(self, app, clientes_creados):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Con N canales se crean N clientes que se usan en rotación
+        """
+        app.config['GOOGLE_VISION_CANALES'] = 2
+
+        obtenidos = [ServicioIA.obtener_cliente_google() for _ in range(4)]
+
+        assert len(clientes_creados) == 2
+        assert obtenidos == clientes_creados * 2
+
+    def test_recrea_clientes_tras_fork(self, monkeypatch):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Un cambio de PID descarta los clientes heredados
+        """
+        pool = PoolClientes(ClienteVisionFalso)
+        cliente_padre = pool.obtener('credenciales.json')
+
+        monkeypatch.setattr(servicio_ia.os, 'getpid', lambda: -1)
+        cliente_hijo = pool.obtener('credenciales.json')
+
+        assert cliente_hijo is not cliente_padre
+
+    def test_reconstruir_apaga_ejecutores(self):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Al cambiar el tamaño se apagan los pools de hilos anteriores
+        """
+        pool = PoolClientes(lambda hilos: ThreadPoolExecutor(max_workers=hilos))
+        anterior = pool.obtener(2)
+        anterior.submit(time.sleep, 0).result()
+
+        assert pool.obtener(3) is not anterior
+        with pytest.raises(RuntimeError):
+            anterior.submit(time.sleep, 0)
+        pool.reiniciar()
+
+    def test_seguro_entre_hilos(self):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Muchos hilos concurrentes no crean más clientes que canales
+        """
+        creados = []
+        pool = PoolClientes(lambda ruta: creados.append(ruta) or object())
+
+        hilos = [
+            threading.Thread(target=pool.obtener, args=('credenciales.json',), kwargs={'tamano': 3})
+            for _ in range(50)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        assert len(creados) == 3
+
+
+class TestClienteImagga:
+    """Tests para la sesión HTTP de Imagga contra un servidor stub local"""
+
+    def test_reutiliza_conexion_y_reintenta_5xx(self):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Los 503 se reintentan sobre la misma conexión keep-alive
+        """
+        with ServidorStubImagga(estados=[503, 503]) as stub:
+            cliente = ClienteImagga(stub.endpoint, 'clave', 'secreto', factor_backoff=0)
+            resultado = cliente.etiquetar(data={'image_base64': 'abc'})
+            cliente.etiquetar(data={'image_base64': 'abc'})
+            cliente.close()
+
+        assert resultado['result']['tags'][0]['tag']['en'] == 'dog'
+        assert stub.peticiones == 4
+        assert stub.conexiones == 1
+        assert cliente.interruptor.estado == InterruptorCircuito.CERRADO
+
+    def test_multipart_se_rebobina_al_reintentar(self, ruta_imagen):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: El cuerpo multipart se envía completo también en el reintento
+        """
+        with ServidorStubImagga(estados=[503]) as stub:
+            cliente = ClienteImagga(stub.endpoint, 'clave', 'secreto', factor_backoff=0)
+            with CuerpoMultipart('image', ruta_imagen) as cuerpo:
+                cliente.etiquetar(data=cuerpo, headers={'Content-Type': cuerpo.content_type})
+                longitud = len(cuerpo)
+            cliente.close()
+
+        assert stub.peticiones == 2
+        assert stub.bytes_recibidos == 2 * longitud
+
+    def test_multipart_contiene_archivo_sin_codificar(self, ruta_imagen):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: El cuerpo incluye los bytes originales de la imagen en el campo image
+        """
+        with open(ruta_imagen, 'rb') as archivo:
+            contenido = archivo.read()
+
+        with CuerpoMultipart('image', ruta_imagen) as cuerpo:
+            bloques = b''.join(cuerpo)
+            cuerpo.seek(0)
+            assert cuerpo.read() == bloques
+
+        assert len(bloques) == len(cuerpo)
+        assert b'name="image"; filename="foto.jpg"' in bloques
+        assert contenido in bloques
+
+    def test_circuito_abierto_falla_rapido(self):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Tras el umbral de fallos no se realizan más peticiones
+        """
+        with ServidorStubImagga(estados=[500] * 10) as stub:
+            cliente = ClienteImagga(
+                stub.endpoint, 'clave', 'secreto',
+                reintentos=0, umbral_fallos=2, segundos_apertura=60
+            )
+            for _ in range(2):
+                with pytest.raises(requests.HTTPError):
+                    cliente.etiquetar(data={})
+
+            with pytest.raises(CircuitoAbiertoError):
+                cliente.etiquetar(data={})
+
+        assert stub.peticiones == 2
+
+    def test_circuito_abierto_conserva_su_tipo(self, app, ruta_imagen, monkeypatch):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: analizar_con_imagga no envuelve el rechazo del circuito en
+                     una excepción genérica
+        """
+        cliente = ClienteImagga('http://127.0.0.1:9/', 'clave', 'secreto',
+                                umbral_fallos=1, segundos_apertura=60)
+        cliente.interruptor.registrar_fallo()
+        monkeypatch.setattr(ServicioIA, 'obtener_cliente_imagga', staticmethod(lambda: cliente))
+
+        with pytest.raises(CircuitoAbiertoError) as error:
+            ServicioIA.analizar_con_imagga(ruta_imagen)
+
+        assert 50 < error.value.reintentar_en <= 60
+        cliente.close()
+
+    def test_reintentos_respetan_el_plazo_total(self):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Con reintentos y un Retry-After largo la llamada completa no
+                     supera el timeout configurado
+        """
+        with ServidorStubImagga(estados=[503] * 10, retry_after=30) as stub:
+            cliente = ClienteImagga(stub.endpoint, 'clave', 'secreto', reintentos=3, timeout=1)
+            inicio = time.perf_counter()
+            with pytest.raises(requests.HTTPError):
+                cliente.etiquetar(data={})
+            duracion = time.perf_counter() - inicio
+            cliente.close()
+
+        assert stub.peticiones == 4
+        assert duracion < 1
+
+    def test_circuito_semiabierto_se_cierra_con_exito(self):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Pasado el tiempo de apertura una llamada exitosa cierra el circuito
+        """
+        interruptor = InterruptorCircuito(umbral_fallos=1, segundos_apertura=0)
+        interruptor.registrar_fallo()
+
+        interruptor.permitir()
+        assert interruptor.estado == InterruptorCircuito.SEMIABIERTO
+
+        interruptor.registrar_exito()
+        assert interruptor.estado == InterruptorCircuito.CERRADO
+
+
+@pytest.fixture
+def proveedores_lentos(monkeypatch):
+    """Proveedores falsos con latencia configurable"""
+    latencias = {'google': 0.3, 'imagga': 0.3}
+
+    def crear(proveedor, etiquetas):
+        def analizar_falso(ruta_imagen, max_resultados=10):
+            time.sleep(latencias[proveedor])
+            return etiquetas
+        return staticmethod(analizar_falso)
+
+    monkeypatch.setattr(ServicioIA, 'analizar_con_google', crear('google', [
+        {'etiqueta': 'Dog', 'confianza': 0.9},
+        {'etiqueta': 'Grass', 'confianza': 0.8}
+    ]))
+    monkeypatch.setattr(ServicioIA, 'analizar_con_imagga', crear('imagga', [
+        {'etiqueta': 'dog', 'confianza': 0.7},
+        {'etiqueta': 'Puppy', 'confianza': 0.95}
+    ]))
+    return latencias
+
+
+class TestAnalisisMultiproveedor:
+    """Tests para el análisis con varios proveedores en paralelo"""
+
+    def test_normalizar_proveedores(self):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: 'ambos', listas y valores separados por comas se normalizan
+        """
+        assert ServicioIA.normalizar_proveedores('ambos') == ['google', 'imagga']
+        assert ServicioIA.normalizar_proveedores('imagga, google') == ['google', 'imagga']
+        assert ServicioIA.normalizar_proveedores(['Imagga']) == ['imagga']
+        with pytest.raises(ValueError):
+            ServicioIA.normalizar_proveedores('azure')
+
+    def test_latencia_es_la_del_mas_lento(self, app, ruta_imagen, proveedores_lentos):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Los proveedores se consultan en paralelo, no uno tras otro
+        """
+        inicio = time.perf_counter()
+        resultados = ServicioIA.analizar_en_paralelo(ruta_imagen, ['google', 'imagga'])
+        duracion = time.perf_counter() - inicio
+
+        assert duracion < 0.5
+        assert resultados['google']['error'] is None
+        assert resultados['imagga']['error'] is None
+
+    def test_timeout_por_proveedor(self, app, ruta_imagen, proveedores_lentos):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Un proveedor lento se descarta sin bloquear al otro
+        """
+        proveedores_lentos['imagga'] = 1.0
+        app.config['IMAGGA_TIMEOUT'] = 0.1
+
+        inicio = time.perf_counter()
+        resultados = ServicioIA.analizar_en_paralelo(ruta_imagen, ['google', 'imagga'])
+
+        assert time.perf_counter() - inicio < 0.8
+        assert 'Tiempo de espera agotado' in resultados['imagga']['error']
+        assert resultados['google']['etiquetas'][0]['etiqueta'] == 'Dog'
+
+    def test_proveedor_lento_no_ocupa_hilos_del_otro(self, app, ruta_imagen, proveedores_lentos):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Las llamadas de un proveedor que siguen en curso tras su
+                     timeout no retrasan al otro proveedor
+        """
+        app.config['HILOS_POR_PROVEEDOR'] = 1
+        proveedores_lentos.update(google=0.05, imagga=1.0)
+        app.config['IMAGGA_TIMEOUT'] = 0.1
+
+        ServicioIA.analizar_en_paralelo(ruta_imagen, ['google', 'imagga'])
+        inicio = time.perf_counter()
+        resultados = ServicioIA.analizar_en_paralelo(ruta_imagen, ['google'])
+
+        assert time.perf_counter() - inicio < 0.5
+        assert resultados['google']['error'] is None
+
+    def test_todos_los_circuitos_abiertos(self, app, ruta_imagen, monkeypatch):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Si todos los proveedores tienen el circuito abierto se lanza
+                     CircuitoAbiertoError con la menor espera; si alguno responde,
+                     no
+        """
+        def abierto(reintentar_en):
+            def analizar_falso(ruta_imagen, max_resultados=10):
+                raise CircuitoAbiertoError("Proveedor no disponible", reintentar_en=reintentar_en)
+            return staticmethod(analizar_falso)
+
+        monkeypatch.setattr(ServicioIA, 'analizar_con_google', abierto(20))
+        monkeypatch.setattr(ServicioIA, 'analizar_con_imagga', abierto(5))
+        with pytest.raises(CircuitoAbiertoError) as error:
+            ServicioIA.analizar_en_paralelo(ruta_imagen, ['google', 'imagga'])
+        assert error.value.reintentar_en == 5
+
+        monkeypatch.setattr(ServicioIA, 'analizar_con_google',
+                            staticmethod(lambda ruta_imagen, max_resultados=10: list(ETIQUETAS_FALSAS)))
+        resultados = ServicioIA.analizar_en_paralelo(ruta_imagen, ['google', 'imagga'])
+        assert resultados['google']['error'] is None
+        assert 'no disponible' in resultados['imagga']['error']
+
+    def test_combinar_etiquetas_prioriza_coincidencias(self, app, ruta_imagen, proveedores_lentos):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Una etiqueta detectada por ambos proveedores queda primera
+        """
+        proveedores_lentos.update(google=0, imagga=0)
+        resultados = ServicioIA.analizar_en_paralelo(ruta_imagen, ['google', 'imagga'])
+
+        combinadas = ServicioIA.combinar_etiquetas(resultados)
+
+        assert combinadas[0] == {'etiqueta': 'Dog', 'confianza': 0.8, 'proveedores': ['google', 'imagga']}
+        assert [et['etiqueta'] for et in combinadas[1:]] == ['Puppy', 'Grass']
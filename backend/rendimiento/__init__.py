@@ -0,0 +1,6 @@
+"""
+Autor: Steeven Vargas
+Fecha: Noviembre 2024
+Descripción: Scripts de medición de rendimiento del backend.
+             Se ejecutan desde el directorio backend: python -m rendimiento.<script>
+"""
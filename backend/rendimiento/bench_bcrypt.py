@@ -0,0 +1,46 @@
+"""
+Autor: Steeven Vargas
+Fecha: Noviembre 2024
+Descripción: Mide cuántos inicios de sesión por segundo y por núcleo admite
+             cada factor de costo de bcrypt (la verificación de la contraseña
+             domina el costo de /api/auth/iniciar-sesion). Sirve para elegir
+             BCRYPT_RONDAS en cada entorno.
+             Uso: python -m rendimiento.bench_bcrypt [rondas ...]
+Argumentos entrada: Factores de costo a medir (por defecto 4 8 10 11 12 13)
+Returns: None (imprime resultados)
+Modificaciones: Ninguna
+"""
+
+import sys
+import time
+
+import bcrypt
+
+
+CONTRASENA = b'TestPass123!'
+
+
+def medir(rondas, duracion_minima=1.0):
+    contrasena_hash = bcrypt.hashpw(CONTRASENA, bcrypt.gensalt(rounds=rondas))
+
+    verificaciones = 0
+    inicio = time.perf_counter()
+    while True:
+        bcrypt.checkpw(CONTRASENA, contrasena_hash)
+        verificaciones += 1
+        transcurrido = time.perf_counter() - inicio
+        if transcurrido >= duracion_minima and verificaciones >= 3:
+            break
+
+    milisegundos = transcurrido * 1000 / verificaciones
+    print(f"rondas={rondas:<3} {milisegundos:9.1f} ms/login {1000 / milisegundos:9.1f} logins/s por núcleo")
+
+
+def main():
+    rondas = [int(valor) for valor in sys.argv[1:]] or [4, 8, 10, 11, 12, 13]
+    for valor in rondas:
+        medir(valor)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Autor: Steeven Vargas
+Fecha: Noviembre 2024
+Descripción: Mide la búsqueda por etiqueta en el historial de un usuario con
+             muchos análisis (índice de analisis_etiquetas) frente a recorrer
+             todo el historial y filtrar las etiquetas en Python, como haría
+             un cliente que pagina /historial completo.
+             Uso: python -m rendimiento.bench_busqueda [analisis] [por_pagina]
+Argumentos entrada: Análisis del usuario (200000) y tamaño de página (20)
+Returns: None (imprime resultados)
+Modificaciones: Ninguna
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+
+from modelos import db, Analisis, AnalisisEtiqueta, Etiqueta, Usuario
+from servicios.servicio_analisis import ServicioAnalisis
+
+
+TAMANO_INSERCION = 20000
+ETIQUETAS_POR_ANALISIS = 8
+VOCABULARIO = 2000
+
+
+def poblar(usuario_id, total):
+    """Inserta 'total' análisis con etiquetas aleatorias del vocabulario"""
+    aleatorio = random.Random(7)
+    db.session.execute(Etiqueta.__table__.insert(), [
+        {'id': indice + 1, 'nombre': f'etiqueta{indice}'} for indice in range(VOCABULARIO)
+    ])
+    base = datetime(2020, 1, 1)
+    for inicio in range(0, total, TAMANO_INSERCION):
+        indices = range(inicio, min(inicio + TAMANO_INSERCION, total))
+        db.session.execute(Analisis.__table__.insert(), [{
+            'id': f'{indice:012d}',
+            'usuario_id': usuario_id,
+            'nombre_archivo': f'foto{indice}.jpg',
+            'ruta_archivo': f'/cargas/{indice}.jpg',
+            'proveedor_ia': 'google',
+            'fecha_analisis': base + timedelta(seconds=indice)
+        } for indice in indices])
+        db.session.execute(AnalisisEtiqueta.__table__.insert(), [{
+            'analisis_id': f'{indice:012d}',
+            'posicion': posicion,
+            'usuario_id': usuario_id,
+            'etiqueta_id': id_etiqueta,
+            'confianza': aleatorio.randint(50, 99)
+        } for indice in indices
+            for posicion, id_etiqueta in enumerate(aleatorio.sample(range(1, VOCABULARIO + 1),
+                                                                     ETIQUETAS_POR_ANALISIS))])
+        db.session.commit()
+
+
+def recorrido_completo(usuario_id, etiqueta, min_confianza, por_pagina):
+    """Lee todas las etiquetas del usuario y filtra en Python"""
+    porcentaje = AnalisisEtiqueta.a_porcentaje(min_confianza)
+    encontrados = []
+    filas = db.session.query(AnalisisEtiqueta.analisis_id, Etiqueta.nombre, AnalisisEtiqueta.confianza)\
+        .join(Etiqueta, Etiqueta.id == AnalisisEtiqueta.etiqueta_id)\
+        .filter(AnalisisEtiqueta.usuario_id == usuario_id)
+    for analisis_id, nombre, confianza in filas:
+        if nombre == etiqueta and confianza >= porcentaje:
+            encontrados.append(analisis_id)
+    return encontrados[:por_pagina]
+
+
+def medir(funcion, repeticiones=5):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return (time.perf_counter() - inicio) * 1000 / repeticiones
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    por_pagina = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    directorio = tempfile.mkdtemp()
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(directorio, 'busqueda.db')}"
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        usuario = Usuario(nombre_usuario='bench', contrasena_hash='x')
+        db.session.add(usuario)
+        db.session.commit()
+
+        print(f"Poblando {total} análisis con {ETIQUETAS_POR_ANALISIS} etiquetas cada uno...")
+        inicio = time.perf_counter()
+        poblar(usuario.id, total)
+        print(f"   listo en {time.perf_counter() - inicio:.1f} s\n")
+
+        print(f"{'consulta':>28} {'índice':>10} {'recorrido':>12}")
+        for min_confianza in (0.5, 0.9, 0.99):
+            ms_indice = medir(lambda: ServicioAnalisis.buscar_historial(
+                usuario.id, por_pagina, etiqueta='etiqueta42', min_confianza=min_confianza
+            ))
+            ms_recorrido = medir(lambda: recorrido_completo(
+                usuario.id, 'etiqueta42', min_confianza, por_pagina
+            ), repeticiones=1)
+            consulta = f"etiqueta42 >= {min_confianza}"
+            print(f"{consulta:>28} {ms_indice:>7.2f} ms {ms_recorrido:>9.1f} ms")
+
+    os.remove(os.path.join(directorio, 'busqueda.db'))
+    os.rmdir(directorio)
+
+
+if __name__ == '__main__':
+    main()
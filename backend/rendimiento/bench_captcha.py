@@ -0,0 +1,74 @@
+"""
+Autor: Steeven Vargas
+Fecha: Noviembre 2024
+Descripción: Carga de generación de captchas. Compara el almacén anterior
+             (dict sin límite que se recorría completo en cada generación)
+             contra AlmacenCaptchas, y la memoria por entrada dict vs __slots__.
+             Uso: python -m rendimiento.bench_captcha [generaciones] [generaciones_anterior]
+Argumentos entrada: Generaciones con el almacén nuevo (1000000) y con el anterior (5000)
+Returns: None (imprime resultados)
+Modificaciones: Ninguna
+"""
+
+import secrets
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from utilidades.captcha import AlmacenCaptchas, EntradaCaptcha, MAX_CAPTCHAS_ACTIVOS
+
+
+def generar_anterior(captchas_activos, token):
+    """Reproduce generar_captcha anterior: recorre todas las entradas y agrega un dict"""
+    ahora = datetime.now()
+    expirados = [t for t, datos in captchas_activos.items()
+                 if ahora - datos['creado'] > timedelta(minutes=5)]
+    for t in expirados:
+        del captchas_activos[t]
+    captchas_activos[token] = {'respuesta': 42, 'creado': datetime.now(), 'intentos': 0}
+
+
+def medir(nombre, funcion, total):
+    tokens = [secrets.token_urlsafe(32) for _ in range(total)]
+    inicio = time.perf_counter()
+    for token in tokens:
+        funcion(token)
+    duracion = time.perf_counter() - inicio
+    print(f"{nombre:<26} {total:>9} generaciones {duracion:8.2f} s "
+          f"{duracion * 1e6 / total:9.2f} µs/generación")
+    return duracion / total
+
+
+def memoria_por_entrada(crear, total=100000):
+    tracemalloc.start()
+    entradas = [crear() for _ in range(total)]
+    actual, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del entradas
+    return actual / total
+
+
+def main():
+    generaciones = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    generaciones_anterior = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+
+    captchas_anteriores = {}
+    anterior = medir('anterior (dict + barrido)', lambda t: generar_anterior(captchas_anteriores, t),
+                     generaciones_anterior)
+
+    almacen = AlmacenCaptchas()
+    nuevo = medir('AlmacenCaptchas', lambda t: almacen.agregar(t, 42), generaciones)
+
+    print(f"Entradas retenidas: anterior {len(captchas_anteriores)} (sin límite), "
+          f"nuevo {len(almacen)} (máximo {MAX_CAPTCHAS_ACTIVOS})")
+    print(f"Aceleración por generación: {anterior / nuevo:.0f}x "
+          f"(el anterior crece con los captchas activos)")
+
+    bytes_dict = memoria_por_entrada(lambda: {'respuesta': 42, 'creado': datetime.now(), 'intentos': 0})
+    bytes_slots = memoria_por_entrada(lambda: EntradaCaptcha(42, time.monotonic()))
+    print(f"Memoria por entrada: dict {bytes_dict:.0f} B, __slots__ {bytes_slots:.0f} B")
+
+
+if __name__ == '__main__':
+    main()
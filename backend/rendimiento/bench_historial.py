@@ -0,0 +1,103 @@
+"""
+Autor: Steeven Vargas
+Fecha: Noviembre 2024
+Descripción: Compara la latencia de una página del historial con OFFSET +
+             COUNT(*) (paginate, método anterior) contra la paginación por
+             cursor, a distintas profundidades, para un usuario con muchos
+             análisis en una base SQLite temporal.
+             Uso: python -m rendimiento.bench_historial [analisis] [por_pagina]
+Argumentos entrada: Análisis del usuario (1000000) y tamaño de página (20)
+Returns: None (imprime resultados)
+Modificaciones: Ninguna
+"""
+
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+
+from modelos import db, Analisis, Usuario
+from servicios.servicio_analisis import ServicioAnalisis, codificar_cursor
+
+
+TAMANO_INSERCION = 50000
+
+
+def poblar(usuario_id, total):
+    """Inserta 'total' análisis del usuario con executemany por bloques"""
+    base = datetime(2020, 1, 1)
+    tabla = Analisis.__table__
+    for inicio in range(0, total, TAMANO_INSERCION):
+        filas = [{
+            'id': f'{indice:012d}',
+            'usuario_id': usuario_id,
+            'nombre_archivo': f'foto{indice}.jpg',
+            'ruta_archivo': f'/cargas/{indice}.jpg',
+            'proveedor_ia': 'google',
+            'etiqueta_principal': 'Dog',
+            'fecha_analisis': base + timedelta(seconds=indice)
+        } for indice in range(inicio, min(inicio + TAMANO_INSERCION, total))]
+        db.session.execute(tabla.insert(), filas)
+        db.session.commit()
+
+
+def pagina_offset(usuario_id, pagina, por_pagina):
+    """Reproduce el método anterior: paginate con COUNT(*) y OFFSET"""
+    return Analisis.query.filter_by(usuario_id=usuario_id)\
+        .order_by(Analisis.fecha_analisis.desc())\
+        .paginate(page=pagina, per_page=por_pagina, error_out=False).items
+
+
+def medir(funcion, repeticiones=5):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return (time.perf_counter() - inicio) * 1000 / repeticiones
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    por_pagina = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    directorio = tempfile.mkdtemp()
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(directorio, 'historial.db')}"
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        usuario = Usuario(nombre_usuario='bench', contrasena_hash='x')
+        db.session.add(usuario)
+        db.session.commit()
+
+        print(f"Poblando {total} análisis...")
+        inicio = time.perf_counter()
+        poblar(usuario.id, total)
+        print(f"   listo en {time.perf_counter() - inicio:.1f} s\n")
+
+        paginas_totales = (total + por_pagina - 1) // por_pagina
+        print(f"{'página':>10} {'offset+count':>14} {'cursor':>10}")
+        for pagina in sorted({1, 10, paginas_totales // 100, paginas_totales // 10,
+                              paginas_totales // 2, paginas_totales}):
+            if pagina < 1:
+                continue
+
+            cursor = None
+            if pagina > 1:
+                anterior = ServicioAnalisis.consulta_historial(usuario.id)\
+                    .offset((pagina - 1) * por_pagina - 1).first()
+                cursor = codificar_cursor(anterior)
+
+            ms_offset = medir(lambda: pagina_offset(usuario.id, pagina, por_pagina))
+            ms_cursor = medir(lambda: ServicioAnalisis.listar_historial_cursor(usuario.id, por_pagina, cursor))
+            print(f"{pagina:>10} {ms_offset:>11.2f} ms {ms_cursor:>7.2f} ms")
+
+    os.remove(os.path.join(directorio, 'historial.db'))
+    os.rmdir(directorio)
+
+
+if __name__ == '__main__':
+    main()
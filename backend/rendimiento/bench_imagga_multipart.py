@@ -0,0 +1,98 @@
+"""
+Autor: Steeven Vargas
+Fecha: Noviembre 2024
+Descripción: Compara el envío antiguo a Imagga (base64 en formulario) contra el
+             cuerpo multipart leído por bloques. Cada modo corre en un proceso
+             hijo para medir su pico de RSS de forma aislada.
+             Uso: python -m rendimiento.bench_imagga_multipart [tamano_mb]
+Argumentos entrada: Tamaño de la imagen de prueba en MB (opcional, 5 por defecto)
+Returns: None (imprime resultados)
+Modificaciones: Ninguna
+"""
+
+import base64
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+
+from rendimiento.servidor_stub import ServidorStubImagga
+from servicios.servicio_ia import ClienteImagga
+from utilidades.cliente_http import CuerpoMultipart
+
+
+def enviar_base64(cliente, ruta_imagen):
+    """Reproduce el envío anterior: archivo completo codificado en base64"""
+    with open(ruta_imagen, 'rb') as archivo_imagen:
+        contenido_imagen = base64.b64encode(archivo_imagen.read()).decode('utf-8')
+    return cliente.etiquetar(data={'image_base64': contenido_imagen})
+
+
+def enviar_multipart(cliente, ruta_imagen):
+    """Envío actual: multipart leído del disco por bloques"""
+    with CuerpoMultipart('image', ruta_imagen) as cuerpo:
+        return cliente.etiquetar(data=cuerpo, headers={'Content-Type': cuerpo.content_type})
+
+
+MODOS = {
+    'base64': enviar_base64,
+    'multipart': enviar_multipart
+}
+
+
+def ejecutar_modo(modo, ruta_imagen):
+    """Ejecuta un envío en el proceso actual e imprime las métricas en JSON"""
+    with ServidorStubImagga() as stub:
+        cliente = ClienteImagga(stub.endpoint, 'clave', 'secreto')
+        rss_inicial = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        tracemalloc.start()
+        MODOS[modo](cliente, ruta_imagen)
+        _, pico_python = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        rss_final = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        cliente.close()
+
+    print(json.dumps({
+        'bytes_enviados': stub.bytes_recibidos,
+        'pico_python': pico_python,
+        'incremento_rss_kb': rss_final - rss_inicial
+    }))
+
+
+def main():
+    tamano_mb = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as temporal:
+        temporal.write(os.urandom(int(tamano_mb * 1024 * 1024)))
+        ruta_imagen = temporal.name
+
+    try:
+        tamano = os.path.getsize(ruta_imagen)
+        print(f"Imagen de prueba: {tamano / 1024 / 1024:.2f} MB")
+        print(f"{'Modo':<10} {'Bytes enviados':>16} {'Pico heap Python':>18} {'Δ RSS máx':>12}")
+
+        for modo in MODOS:
+            salida = subprocess.run(
+                [sys.executable, '-m', 'rendimiento.bench_imagga_multipart', '--modo', modo, ruta_imagen],
+                capture_output=True, text=True, check=True
+            ).stdout
+            metricas = json.loads(salida.strip().splitlines()[-1])
+            print(
+                f"{modo:<10} {metricas['bytes_enviados']:>16,} "
+                f"{metricas['pico_python'] / 1024 / 1024:>15.2f} MB "
+                f"{metricas['incremento_rss_kb'] / 1024:>9.2f} MB"
+            )
+    finally:
+        os.remove(ruta_imagen)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == '--modo':
+        ejecutar_modo(sys.argv[2], sys.argv[3])
+    else:
+        main()
@@ -0,0 +1,56 @@
+"""
+Autor: Steeven Vargas
+Fecha: Noviembre 2024
+Descripción: Compara requests.post por petición contra la sesión reutilizada de
+             ClienteImagga, usando un servidor stub local.
+             Uso: python -m rendimiento.bench_imagga_sesion [peticiones]
+Argumentos entrada: Número de peticiones (opcional, 500 por defecto)
+Returns: None (imprime resultados)
+Modificaciones: Ninguna
+"""
+
+import sys
+import time
+
+import requests
+
+from rendimiento.servidor_stub import ServidorStubImagga
+from servicios.servicio_ia import ClienteImagga
+
+
+def medir(funcion, peticiones):
+    """Ejecuta la función N veces y retorna el tiempo total en segundos"""
+    inicio = time.perf_counter()
+    for _ in range(peticiones):
+        funcion()
+    return time.perf_counter() - inicio
+
+
+def main():
+    peticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    datos = {'image_base64': 'x' * 1024}
+
+    with ServidorStubImagga() as stub:
+        def sin_sesion():
+            respuesta = requests.post(stub.endpoint, data=datos, timeout=30)
+            respuesta.raise_for_status()
+            respuesta.json()
+
+        tiempo_sin_sesion = medir(sin_sesion, peticiones)
+        conexiones_sin_sesion = stub.conexiones
+
+        cliente = ClienteImagga(stub.endpoint, 'clave', 'secreto')
+        tiempo_con_sesion = medir(lambda: cliente.etiquetar(data=datos), peticiones)
+        conexiones_con_sesion = stub.conexiones - conexiones_sin_sesion
+        cliente.close()
+
+    print(f"Peticiones: {peticiones}")
+    print(f"requests.post     : {tiempo_sin_sesion * 1000 / peticiones:8.3f} ms/petición, "
+          f"{conexiones_sin_sesion} conexiones")
+    print(f"ClienteImagga     : {tiempo_con_sesion * 1000 / peticiones:8.3f} ms/petición, "
+          f"{conexiones_con_sesion} conexiones")
+    print(f"Aceleración       : {tiempo_sin_sesion / tiempo_con_sesion:8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Autor: Steeven Vargas
+Fecha: Noviembre 2024
+Descripción: Compara el costo por petición del limitador anterior (reconstruía
+             el diccionario de todos los clientes en cada petición) contra la
+             ventana deslizante de LimitadorMemoria, con muchos clientes distintos.
+             Uso: python -m rendimiento.bench_limitador [clientes] [peticiones]
+Argumentos entrada: Clientes distintos (100000) y peticiones medidas (2000)
+Returns: None (imprime resultados)
+Modificaciones: Ninguna
+"""
+
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from utilidades.limitador import LimitadorMemoria
+
+
+def limitador_anterior(intentos_peticiones, identificador_cliente, limite_por_minuto):
+    """Reproduce el algoritmo anterior de limitar_peticiones"""
+    ahora = datetime.now()
+
+    intentos_peticiones_limpio = {}
+    for cliente, intentos in intentos_peticiones.items():
+        intentos_recientes = [
+            tiempo for tiempo in intentos
+            if ahora - tiempo < timedelta(minutes=1)
+        ]
+        if intentos_recientes:
+            intentos_peticiones_limpio[cliente] = intentos_recientes
+
+    intentos_peticiones.clear()
+    intentos_peticiones.update(intentos_peticiones_limpio)
+
+    intentos_cliente = intentos_peticiones.setdefault(identificador_cliente, [])
+    if len(intentos_cliente) >= limite_por_minuto:
+        return False
+
+    intentos_cliente.append(ahora)
+    return True
+
+
+def medir(nombre, funcion, claves):
+    inicio = time.perf_counter()
+    for clave in claves:
+        funcion(clave)
+    microsegundos = (time.perf_counter() - inicio) * 1e6 / len(claves)
+    print(f"{nombre:<28} {microsegundos:12.2f} µs/petición")
+    return microsegundos
+
+
+def main():
+    clientes = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    peticiones = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    direcciones = [f'10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}' for i in range(clientes)]
+    muestra = [random.choice(direcciones) for _ in range(peticiones)]
+
+    ahora = datetime.now()
+    intentos_peticiones = {direccion: [ahora] for direccion in direcciones}
+
+    limitador = LimitadorMemoria(ventana_segundos=60)
+    for direccion in direcciones:
+        limitador.registrar(direccion, 10)
+
+    print(f"Clientes activos: {clientes}, peticiones medidas: {peticiones}")
+    anterior = medir(
+        'anterior (recorre todos)',
+        lambda clave: limitador_anterior(intentos_peticiones, clave, 10),
+        muestra[:max(1, peticiones // 100)]
+    )
+    nuevo = medir(
+        'ventana deslizante',
+        lambda clave: limitador.registrar(clave, 10),
+        muestra
+    )
+    print(f"Aceleración: {anterior / nuevo:.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Autor: Steeven Vargas
+Fecha: Noviembre 2024
+Descripción: Compara la latencia de traducir etiquetas una por una (método
+             anterior) contra el lote único y el respaldo concurrente, usando
+             un traductor stub con latencia de red simulada.
+             Uso: python -m rendimiento.bench_traduccion [latencia_ms] [etiquetas]
+Argumentos entrada: Latencia por llamada en ms (50) y número de etiquetas (10)
+Returns: None (imprime resultados)
+Modificaciones: Ninguna
+"""
+
+import sys
+import time
+
+from servicios.servicio_interpretacion import ServicioInterpretacion
+
+
+class TraductorStub:
+    """Traductor falso: una llamada cuesta 'latencia' segundos"""
+
+    latencia = 0.05
+    conserva_lineas = True
+    llamadas = 0
+
+    def translate(self, texto):
+        TraductorStub.llamadas += 1
+        time.sleep(TraductorStub.latencia)
+        if not TraductorStub.conserva_lineas and '\n' in texto:
+            return texto.replace('\n', ' ')
+        return '\n'.join(f'es_{linea}' for linea in texto.split('\n'))
+
+
+def traducir_secuencial(etiquetas):
+    """Reproduce el método anterior: una llamada de red por etiqueta"""
+    traductor = TraductorStub()
+    return [traductor.translate(etiqueta['etiqueta']) for etiqueta in etiquetas]
+
+
+def medir(nombre, funcion, etiquetas, repeticiones=5):
+    TraductorStub.llamadas = 0
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion(etiquetas)
+    promedio = (time.perf_counter() - inicio) * 1000 / repeticiones
+    print(f"{nombre:<28} {promedio:9.1f} ms  {TraductorStub.llamadas // repeticiones:3d} llamadas")
+    return promedio
+
+
+def main():
+    TraductorStub.latencia = (float(sys.argv[1]) if len(sys.argv) > 1 else 50) / 1000
+    total = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    etiquetas = [{'etiqueta': f'label{i}', 'confianza': 0.9} for i in range(total)]
+
+    ServicioInterpretacion.crear_traductor = staticmethod(TraductorStub)
+
+    print(f"Etiquetas: {total}, latencia por llamada: {TraductorStub.latencia * 1000:.0f} ms")
+    secuencial = medir('secuencial (anterior)', traducir_secuencial, etiquetas)
+
+    TraductorStub.conserva_lineas = True
+    lote = medir('lote único', ServicioInterpretacion.traducir_etiquetas, etiquetas)
+
+    TraductorStub.conserva_lineas = False
+    concurrente = medir('lote fallido + concurrente', ServicioInterpretacion.traducir_etiquetas, etiquetas)
+
+    print(f"Aceleración lote: {secuencial / lote:.1f}x, concurrente: {secuencial / concurrente:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Autor: Steeven Vargas
+Fecha: Noviembre 2024
+Descripción: Servidor HTTP local que imita el endpoint de etiquetado de Imagga.
+             Permite medir el cliente sin red ni credenciales reales.
+Argumentos entrada: Ninguno
+Returns: Clase ServidorStubImagga
+Modificaciones: Ninguna
+"""
+
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+RESPUESTA_TAGS = json.dumps({
+    'result': {
+        'tags': [
+            {'confidence': 98.1, 'tag': {'en': 'dog'}},
+            {'confidence': 91.2, 'tag': {'en': 'pet'}},
+            {'confidence': 80.5, 'tag': {'en': 'animal'}}
+        ]
+    },
+    'status': {'type': 'success', 'text': ''}
+}).encode()
+
+
+class ManejadorStub(BaseHTTPRequestHandler):
+    """Responde a POST con etiquetas fijas; cuenta bytes y conexiones recibidas"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server.candado:
+            self.server.conexiones += 1
+
+    def do_POST(self):
+        longitud = int(self.headers.get('Content-Length', 0))
+        restante = longitud
+        while restante > 0:
+            bloque = self.rfile.read(min(restante, 64 * 1024))
+            if not bloque:
+                break
+            restante -= len(bloque)
+
+        with self.server.candado:
+            self.server.peticiones += 1
+            self.server.bytes_recibidos += longitud
+            estado = self.server.estados.pop(0) if self.server.estados else 200
+
+        cuerpo = RESPUESTA_TAGS if estado == 200 else b'{}'
+        self.send_response(estado)
+        if estado != 200 and self.server.retry_after is not None:
+            self.send_header('Retry-After', str(self.server.retry_after))
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *args):
+        pass
+
+
+class ServidorStubImagga:
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Servidor stub en un hilo de fondo, utilizable como context manager
+    """
+
+    def __init__(self, estados=None, retry_after=None):
+        """
+        Argumentos entrada:
+            estados (list): Códigos HTTP a devolver en las primeras peticiones
+            retry_after (int): Cabecera Retry-After de las respuestas con error
+        """
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', 0), ManejadorStub)
+        self.servidor.daemon_threads = True
+        self.servidor.candado = threading.Lock()
+        self.servidor.estados = list(estados or [])
+        self.servidor.retry_after = retry_after
+        self.servidor.peticiones = 0
+        self.servidor.conexiones = 0
+        self.servidor.bytes_recibidos = 0
+        self.hilo = threading.Thread(target=self.servidor.serve_forever, daemon=True)
+
+    @property
+    def endpoint(self):
+        host, puerto = self.servidor.server_address
+        return f'http://{host}:{puerto}/v2/tags'
+
+    def __getattr__(self, nombre):
+        return getattr(self.servidor, nombre)
+
+    def __enter__(self):
+        self.hilo.start()
+        return self
+
+    def __exit__(self, *excepcion):
+        self.servidor.shutdown()
+        self.servidor.server_close()
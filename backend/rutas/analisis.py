@@ -4,26 +4,182 @@ Fecha: Noviembre 2024
 Descripción: Rutas para análisis de imágenes con IA
 """
 
+import math
 import os
 import uuid
+import zipfile
 from flask import Blueprint, request, current_app, send_file
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from werkzeug.datastructures import FileStorage
 from werkzeug.utils import secure_filename
 from datetime import datetime
 
-from modelos import db, Usuario, Analisis
+from modelos import db, Usuario, Analisis, TrabajoAnalisis
 from servicios.servicio_ia import ServicioIA
-from servicios.servicio_interpretacion import ServicioInterpretacion
+from servicios.servicio_auth import ServicioAuth
+from servicios.servicio_analisis import ServicioAnalisis
+from servicios.cola_analisis import ColaLlenaError
+from utilidades.cliente_http import CircuitoAbiertoError
 from utilidades.respuestas import respuesta_exitosa, respuesta_error, respuesta_no_encontrado
-from utilidades.validadores import es_imagen_valida
+from utilidades.validadores import es_imagen_valida, validar_extension
+from utilidades.decoradores import requiere_json
 from config.seguridad import limitar_peticiones
 
 analisis_bp = Blueprint('analisis', __name__)
 
+MAX_IDS_ELIMINACION = 100
+
+
+def respuesta_proveedor_no_disponible(error):
+    """Respuesta 503 cuando el circuito de todos los proveedores pedidos está abierto"""
+    respuesta, codigo = respuesta_error(str(error), error='proveedor_no_disponible', codigo=503)
+    respuesta.headers['Retry-After'] = str(max(1, math.ceil(error.reintentar_en)))
+    return respuesta, codigo
+
+
+def obtener_proveedor_solicitado():
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Lee el proveedor de IA del formulario ('proveedor_ia' repetido,
+                 'tipo_ia' o 'proveedor_ia') y lo normaliza
+    Argumentos entrada: Ninguno
+    Returns:
+        str: 'google', 'imagga' o 'ambos'
+    Raises:
+        ValueError: Si el proveedor no es válido
+    Modificaciones: Ninguna
+    """
+    proveedores_solicitados = request.form.getlist('proveedor_ia')
+    if len(proveedores_solicitados) > 1:
+        proveedor = ','.join(proveedores_solicitados)
+    else:
+        proveedor = request.form.get('tipo_ia') or request.form.get('proveedor_ia', 'google')
+    return ServicioIA.nombre_proveedor(ServicioIA.normalizar_proveedores(proveedor))
+
+
+def iterar_imagenes_lote():
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Recorre los archivos del lote ('imagenes', repetido) sin
+                 leerlos. Los .zip se abren desde el stream de la carga y cada
+                 entrada se entrega por separado, sin descomprimir el zip completo.
+    Argumentos entrada: Ninguno
+    Returns:
+        generator: Tuplas (nombre, abrir, tamano_declarado, error), donde abrir()
+                   retorna un stream binario y tamano_declarado puede ser None
+    Modificaciones: Ninguna
+    """
+    for archivo in request.files.getlist('imagenes'):
+        if not archivo.filename:
+            continue
+
+        if not archivo.filename.lower().endswith('.zip'):
+            yield archivo.filename, lambda archivo=archivo: archivo.stream, None, None
+            continue
+
+        try:
+            with zipfile.ZipFile(archivo.stream) as comprimido:
+                for info in comprimido.infolist():
+                    if info.is_dir() or info.filename.startswith('__MACOSX/'):
+                        continue
+                    yield (
+                        os.path.basename(info.filename),
+                        lambda info=info: comprimido.open(info),
+                        info.file_size,
+                        None
+                    )
+        except zipfile.BadZipFile:
+            yield archivo.filename, None, None, "El archivo zip está dañado"
+
+
+def guardar_imagen_acotada(origen, ruta_destino, tamano_maximo):
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Copia un stream al disco por bloques y se detiene en cuanto
+                 supera tamano_maximo, sin confiar en el tamaño declarado
+    Argumentos entrada:
+        origen: Stream binario de lectura
+        ruta_destino (str): Archivo a crear
+        tamano_maximo (int): Bytes máximos permitidos
+    Returns:
+        bool: True si se guardó; False si excedía el tamaño (no queda archivo)
+    Modificaciones: Ninguna
+    """
+    escritos = 0
+    with open(ruta_destino, 'wb') as destino:
+        while True:
+            bloque = origen.read(64 * 1024)
+            if not bloque:
+                return True
+            escritos += len(bloque)
+            if escritos > tamano_maximo:
+                break
+            destino.write(bloque)
+
+    os.remove(ruta_destino)
+    return False
+
+
+def guardar_elemento_lote(abrir, tamano_declarado, ruta_archivo, nombre_archivo, tamano_maximo):
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Guarda un archivo del lote con tamaño acotado y valida su
+                 contenido; si no es válido borra lo guardado
+    Argumentos entrada:
+        abrir (callable): Devuelve el stream de origen
+        tamano_declarado (int | None): Tamaño declarado (None si es una subida
+                                       directa, cuyo stream no se cierra aquí)
+        ruta_archivo (str): Archivo a crear
+        nombre_archivo (str): Nombre seguro, para validar la extensión
+        tamano_maximo (int): Bytes máximos permitidos
+    Returns:
+        str | None: Mensaje de error, o None si el archivo quedó guardado
+    Raises:
+        Exception: Errores de lectura del origen (zip dañado o cifrado) o de
+                   disco; el archivo parcial puede quedar y lo borra quien llama
+    Modificaciones: Ninguna
+    """
+    origen = abrir()
+    try:
+        if not guardar_imagen_acotada(origen, ruta_archivo, tamano_maximo):
+            return "El archivo es demasiado grande. Máximo 5MB"
+    finally:
+        if tamano_declarado is not None:
+            origen.close()
+
+    with open(ruta_archivo, 'rb') as guardado:
+        valida, mensaje = es_imagen_valida(FileStorage(guardado, filename=nombre_archivo))
+    if not valida:
+        os.remove(ruta_archivo)
+        return mensaje
+    return None
+
+
+def solicita_modo_asincrono():
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Determina si la petición de análisis debe encolarse. El modo
+                 asíncrono se activa por petición (campo o parámetro 'asincrono')
+                 o para todas las peticiones con ANALISIS_ASINCRONO.
+    Argumentos entrada: Ninguno
+    Returns:
+        bool: True si el análisis se debe procesar en segundo plano
+    Modificaciones: Ninguna
+    """
+    valor = request.form.get('asincrono', request.args.get('asincrono'))
+    if valor is None:
+        return current_app.config.get('ANALISIS_ASINCRONO', False)
+    return valor.lower() in ('1', 'true', 'si', 'sí')
+
 
 @analisis_bp.route('/analizar', methods=['POST'])
 @jwt_required()
-@limitar_peticiones(limite_por_minuto=10)
+@limitar_peticiones(limite_por_minuto=10, clave='usuario')
 def analizar_imagen():
     """
     Autor: Steeven Vargas
@@ -31,10 +187,9 @@ def analizar_imagen():
     Descripción: Endpoint para analizar una imagen con IA
     """
     try:
-        usuario_id = get_jwt_identity()
-        usuario = Usuario.query.get(int(usuario_id))
+        usuario_id = int(get_jwt_identity())
 
-        if not usuario:
+        if not ServicioAuth.usuario_activo(usuario_id):
             return respuesta_error("Usuario no encontrado", codigo=404)
         
         if 'imagen' not in request.files:
@@ -49,10 +204,10 @@ def analizar_imagen():
         if not valida:
             return respuesta_error(mensaje)
         
-        proveedor = request.form.get('tipo_ia') or request.form.get('proveedor_ia', 'google')
-        proveedor = proveedor.lower()
-        if proveedor not in ['google', 'imagga']:
-            return respuesta_error("Proveedor no válido. Use 'google' o 'imagga'")
+        try:
+            proveedor = obtener_proveedor_solicitado()
+        except ValueError:
+            return respuesta_error("Proveedor no válido. Use 'google', 'imagga' o 'ambos'")
         
         nombre_archivo = secure_filename(archivo.filename)
         extension = nombre_archivo.rsplit('.', 1)[1].lower()
@@ -67,51 +222,229 @@ def analizar_imagen():
         ruta_archivo = os.path.join(directorio_usuario, nombre_unico)
         archivo.save(ruta_archivo)
         
+        if solicita_modo_asincrono():
+            try:
+                trabajo = current_app.extensions['cola_analisis'].encolar(
+                    usuario_id,
+                    nombre_archivo,
+                    ruta_archivo,
+                    proveedor
+                )
+            except ColaLlenaError as e:
+                if os.path.exists(ruta_archivo):
+                    os.remove(ruta_archivo)
+                return respuesta_error(str(e), error='cola_llena', codigo=503)
+            
+            datos_trabajo = trabajo.a_dict()
+            datos_trabajo['url_estado'] = f"/api/analisis/{trabajo.id}/estado"
+            
+            return respuesta_exitosa(
+                datos=datos_trabajo,
+                mensaje="Imagen recibida. El análisis se está procesando",
+                codigo=202
+            )
+        
         try:
-            etiquetas = ServicioIA.analizar_imagen(ruta_archivo, proveedor)
+            nuevo_analisis, resultados_procesados = ServicioAnalisis.ejecutar_analisis(
+                usuario_id,
+                nombre_archivo,
+                ruta_archivo,
+                proveedor
+            )
+        except CircuitoAbiertoError as e:
+            db.session.rollback()
+            return respuesta_proveedor_no_disponible(e)
         except Exception as e:
-            if os.path.exists(ruta_archivo):
-                os.remove(ruta_archivo)
-            return respuesta_error(f"Error al analizar imagen: {str(e)}", codigo=500)
+            db.session.rollback()
+            return respuesta_error(str(e), codigo=500)
+
+        return respuesta_exitosa(
+            datos=ServicioAnalisis.a_dict_con_resultados(nuevo_analisis, resultados_procesados),
+            mensaje="Imagen analizada exitosamente",
+            codigo=201
+        )
+        
+    except Exception as e:
+        db.session.rollback()
+        return respuesta_error(f"Error al procesar imagen: {str(e)}", codigo=500)
+
+
+@analisis_bp.route('/analizar/lote', methods=['POST'])
+@jwt_required()
+@limitar_peticiones(limite_por_minuto=5, clave='usuario')
+def analizar_lote():
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Endpoint para analizar varias imágenes (o un .zip) en una sola
+                 petición. Cada archivo se valida mientras se guarda (con la
+                 misma validación de contenido que /analizar); los que fallan
+                 se reportan individualmente sin detener el lote. Al superar
+                 MAX_ARCHIVOS_LOTE se deja de leer y se reporta un único error.
+    """
+    try:
+        usuario_id = int(get_jwt_identity())
+
+        if not ServicioAuth.usuario_activo(usuario_id):
+            return respuesta_error("Usuario no encontrado", codigo=404)
+
+        if 'imagenes' not in request.files:
+            return respuesta_error("No se proporcionaron imágenes")
 
         try:
-            resultados_procesados = ServicioInterpretacion.procesar_resultados(
-                proveedor,
-                etiquetas
-            )
-        except Exception as e:
-            resultados_procesados = {
-                'etiquetas': etiquetas,
-                'interpretacion': None,
-                'total_etiquetas': len(etiquetas)
-            }
+            proveedor = obtener_proveedor_solicitado()
+        except ValueError:
+            return respuesta_error("Proveedor no válido. Use 'google', 'imagga' o 'ambos'")
 
-        id_analisis = str(uuid.uuid4())
-        nuevo_analisis = Analisis(
-            id=id_analisis,
-            usuario_id=usuario_id,
-            nombre_archivo=nombre_archivo,
-            ruta_archivo=ruta_archivo,
-            proveedor_ia=proveedor,
-            etiquetas=etiquetas
+        max_archivos = current_app.config['MAX_ARCHIVOS_LOTE']
+        tamano_maximo = current_app.config['MAX_CONTENT_LENGTH']
+
+        directorio_usuario = os.path.join(
+            current_app.config['DIRECTORIO_CARGAS'],
+            str(usuario_id)
         )
+        os.makedirs(directorio_usuario, exist_ok=True)
 
-        db.session.add(nuevo_analisis)
-        db.session.commit()
+        elementos = []
+        guardados = []
+        archivos_lote = iterar_imagenes_lote()
+        for nombre, abrir, tamano_declarado, error in archivos_lote:
+            nombre_archivo = secure_filename(nombre)
+
+            if len(elementos) >= max_archivos:
+                elementos.append({
+                    'archivo': nombre_archivo or nombre,
+                    'exito': False,
+                    'error': f"Se excedió el máximo de {max_archivos} imágenes por lote; "
+                             "no se procesaron los archivos restantes"
+                })
+                break
+
+            if error is None and not validar_extension(nombre_archivo):
+                error = "Tipo de archivo no permitido. Solo se permiten: jpg, jpeg, png, gif, webp"
+            if error is None and tamano_declarado is not None and tamano_declarado > tamano_maximo:
+                error = "El archivo es demasiado grande. Máximo 5MB"
 
-        respuesta_datos = nuevo_analisis.a_dict()
-        respuesta_datos['etiquetas_traducidas'] = resultados_procesados['etiquetas']
-        respuesta_datos['interpretacion'] = resultados_procesados['interpretacion']
+            if error is None:
+                extension = nombre_archivo.rsplit('.', 1)[1].lower()
+                ruta_archivo = os.path.join(directorio_usuario, f"{uuid.uuid4().hex}.{extension}")
+                try:
+                    error = guardar_elemento_lote(
+                        abrir, tamano_declarado, ruta_archivo, nombre_archivo, tamano_maximo
+                    )
+                except Exception as e:
+                    # Entrada dañada o cifrada del zip (CRC, zlib, contraseña) o
+                    # fallo de disco: solo falla este archivo
+                    if os.path.exists(ruta_archivo):
+                        os.remove(ruta_archivo)
+                    error = f"No se pudo leer el archivo: {str(e)}"
+
+            if error is None:
+                elementos.append({'archivo': nombre_archivo, 'indice_lote': len(guardados)})
+                guardados.append((nombre_archivo, ruta_archivo))
+            else:
+                elementos.append({'archivo': nombre_archivo or nombre, 'exito': False, 'error': error})
+        archivos_lote.close()
+
+        if not elementos:
+            return respuesta_error("No se seleccionó ningún archivo")
+
+        try:
+            resultados_lote = ServicioAnalisis.ejecutar_lote(usuario_id, guardados, proveedor)
+        except Exception as e:
+            db.session.rollback()
+            for _, ruta_archivo in guardados:
+                if os.path.exists(ruta_archivo):
+                    os.remove(ruta_archivo)
+            return respuesta_error(f"Error al guardar el lote: {str(e)}", codigo=500)
+
+        for elemento in elementos:
+            indice = elemento.pop('indice_lote', None)
+            if indice is None:
+                continue
+            _, analisis, resultados_procesados, error = resultados_lote[indice]
+            if error:
+                elemento.update(exito=False, error=error)
+            else:
+                elemento.update(
+                    exito=True,
+                    analisis=ServicioAnalisis.a_dict_con_resultados(analisis, resultados_procesados)
+                )
+
+        exitosos = sum(1 for elemento in elementos if elemento['exito'])
 
         return respuesta_exitosa(
-            datos=respuesta_datos,
-            mensaje="Imagen analizada exitosamente",
-            codigo=201
+            datos={
+                'resultados': elementos,
+                'total': len(elementos),
+                'exitosos': exitosos,
+                'fallidos': len(elementos) - exitosos
+            },
+            mensaje=f"Lote procesado: {exitosos} de {len(elementos)} imágenes analizadas",
+            codigo=201 if exitosos else 200
         )
-        
+
     except Exception as e:
         db.session.rollback()
-        return respuesta_error(f"Error al procesar imagen: {str(e)}", codigo=500)
+        return respuesta_error(f"Error al procesar lote: {str(e)}", codigo=500)
+
+
+@analisis_bp.route('/analizar/cache', methods=['GET'])
+@jwt_required()
+def obtener_estadisticas_cache():
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Endpoint para consultar los contadores de la caché de resultados de IA
+    """
+    cache = ServicioIA.obtener_cache()
+
+    if cache is None:
+        return respuesta_exitosa(
+            datos={'habilitada': False},
+            mensaje="La caché de resultados está deshabilitada"
+        )
+
+    datos = cache.estadisticas()
+    datos['habilitada'] = True
+
+    return respuesta_exitosa(
+        datos=datos,
+        mensaje="Estadísticas de caché obtenidas"
+    )
+
+
+@analisis_bp.route('/analisis/<string:id_trabajo>/estado', methods=['GET'])
+@jwt_required()
+def obtener_estado_trabajo(id_trabajo):
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Endpoint para consultar el progreso de un análisis asíncrono
+    """
+    try:
+        usuario_id = get_jwt_identity()
+
+        trabajo = TrabajoAnalisis.query.filter_by(
+            id=id_trabajo,
+            usuario_id=usuario_id
+        ).first()
+
+        if not trabajo:
+            return respuesta_no_encontrado("Trabajo no encontrado")
+
+        return respuesta_exitosa(
+            datos=trabajo.a_dict(),
+            mensaje=f"Estado del análisis: {trabajo.estado}"
+        )
+
+    except Exception as e:
+        return respuesta_error(f"Error al obtener estado: {str(e)}", codigo=500)
+
+
+def obtener_total_analisis(usuario_id):
+    """Total de análisis del usuario desde el contador desnormalizado (sin COUNT(*))"""
+    return db.session.query(Usuario.total_analisis).filter(Usuario.id == usuario_id).scalar() or 0
 
 
 @analisis_bp.route('/historial', methods=['GET'])
@@ -120,41 +453,141 @@ def obtener_historial():
     """
     Autor: Steeven Vargas
     Fecha: Noviembre 2024
-    Descripción: Endpoint para obtener historial de análisis del usuario
+    Descripción: Endpoint para obtener historial de análisis del usuario.
+                 Con el parámetro 'cursor' (vacío para la primera página) pagina
+                 por cursor y responde 'siguiente_cursor'; el total solo se
+                 incluye con incluir_total=true. Sin 'cursor' usa páginas numeradas.
+                 En ambos modos el total sale del contador usuarios.total_analisis
+                 y cada elemento es el resumen (sin etiquetas; ver el detalle).
     """
     try:
-        usuario_id = get_jwt_identity()
-        usuario = Usuario.query.get(int(usuario_id))
+        usuario_id = int(get_jwt_identity())
 
-        if not usuario:
+        if not ServicioAuth.usuario_activo(usuario_id):
             return respuesta_error("Usuario no encontrado", codigo=404)
         
-        pagina = request.args.get('pagina', 1, type=int)
         por_pagina = request.args.get('por_pagina', 20, type=int)
         
-        por_pagina = min(por_pagina, 100)
+        por_pagina = max(1, min(por_pagina, 100))
         
-        paginacion = Analisis.query.filter_by(usuario_id=usuario_id)\
-            .order_by(Analisis.fecha_analisis.desc())\
-            .paginate(page=pagina, per_page=por_pagina, error_out=False)
+        if 'cursor' in request.args:
+            try:
+                analisis_lista, siguiente_cursor = ServicioAnalisis.listar_historial_cursor(
+                    usuario_id,
+                    por_pagina,
+                    request.args.get('cursor') or None
+                )
+            except ValueError as e:
+                return respuesta_error(str(e))
+            
+            datos = {
+                'analisis': [analisis.a_dict_resumen() for analisis in analisis_lista],
+                'siguiente_cursor': siguiente_cursor,
+                'por_pagina': por_pagina
+            }
+            if request.args.get('incluir_total', '').lower() in ('1', 'true', 'si', 'sí'):
+                datos['total'] = obtener_total_analisis(usuario_id)
+            
+            return respuesta_exitosa(
+                datos=datos,
+                mensaje=f"Se encontraron {len(analisis_lista)} análisis"
+            )
         
-        analisis_lista = [analisis.a_dict() for analisis in paginacion.items]
+        pagina = max(1, request.args.get('pagina', 1, type=int))
+        total = obtener_total_analisis(usuario_id)
+        
+        paginacion = ServicioAnalisis.consulta_historial(usuario_id)\
+            .paginate(page=pagina, per_page=por_pagina, error_out=False, count=False)
+        
+        analisis_lista = [analisis.a_dict_resumen() for analisis in paginacion.items]
         
         return respuesta_exitosa(
             datos={
                 'analisis': analisis_lista,
-                'total': paginacion.total,
+                'total': total,
                 'pagina_actual': paginacion.page,
-                'total_paginas': paginacion.pages,
+                'total_paginas': math.ceil(total / por_pagina),
                 'por_pagina': paginacion.per_page
             },
-            mensaje=f"Se encontraron {paginacion.total} análisis"
+            mensaje=f"Se encontraron {total} análisis"
         )
         
     except Exception as e:
         return respuesta_error(f"Error al obtener historial: {str(e)}", codigo=500)
 
 
+@analisis_bp.route('/historial/buscar', methods=['GET'])
+@jwt_required()
+def buscar_historial():
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Endpoint para buscar en el historial del usuario por 'etiqueta',
+                 'min_confianza' (0 a 1, junto con etiqueta), 'proveedor' y
+                 'desde' (fecha ISO). Pagina por cursor igual que /historial.
+    """
+    try:
+        usuario_id = int(get_jwt_identity())
+
+        if not ServicioAuth.usuario_activo(usuario_id):
+            return respuesta_error("Usuario no encontrado", codigo=404)
+
+        etiqueta = request.args.get('etiqueta', '').strip() or None
+        proveedor = request.args.get('proveedor', '').strip().lower() or None
+        min_confianza = request.args.get('min_confianza')
+        desde = request.args.get('desde')
+
+        if not (etiqueta or proveedor or desde):
+            return respuesta_error("Indique al menos uno de: etiqueta, proveedor, desde")
+
+        if min_confianza is not None:
+            if not etiqueta:
+                return respuesta_error("min_confianza requiere etiqueta")
+            try:
+                min_confianza = float(min_confianza)
+            except ValueError:
+                return respuesta_error("min_confianza debe ser un número entre 0 y 1")
+            if not 0 <= min_confianza <= 1:
+                return respuesta_error("min_confianza debe ser un número entre 0 y 1")
+
+        if proveedor and proveedor not in ServicioIA.PROVEEDORES + (ServicioIA.PROVEEDOR_MULTIPLE,):
+            return respuesta_error(f"Proveedor no válido: {proveedor}")
+
+        if desde:
+            try:
+                desde = datetime.fromisoformat(desde)
+            except ValueError:
+                return respuesta_error("desde debe ser una fecha ISO (AAAA-MM-DD)")
+
+        por_pagina = request.args.get('por_pagina', 20, type=int)
+        por_pagina = max(1, min(por_pagina, 100))
+
+        try:
+            analisis_lista, siguiente_cursor = ServicioAnalisis.buscar_historial(
+                usuario_id,
+                por_pagina,
+                etiqueta=etiqueta,
+                min_confianza=min_confianza,
+                proveedor=proveedor,
+                desde=desde or None,
+                cursor=request.args.get('cursor') or None
+            )
+        except ValueError as e:
+            return respuesta_error(str(e))
+
+        return respuesta_exitosa(
+            datos={
+                'analisis': [analisis.a_dict_resumen() for analisis in analisis_lista],
+                'siguiente_cursor': siguiente_cursor,
+                'por_pagina': por_pagina
+            },
+            mensaje=f"Se encontraron {len(analisis_lista)} análisis"
+        )
+
+    except Exception as e:
+        return respuesta_error(f"Error al buscar en historial: {str(e)}", codigo=500)
+
+
 @analisis_bp.route('/historial/<string:id_analisis>', methods=['GET'])
 @jwt_required()
 def obtener_analisis(id_analisis):
@@ -174,17 +607,11 @@ def obtener_analisis(id_analisis):
         if not analisis:
             return respuesta_no_encontrado("Análisis no encontrado")
 
-        datos_analisis = analisis.a_dict()
-
         try:
-            etiquetas = analisis.obtener_etiquetas()
-            resultados_procesados = ServicioInterpretacion.procesar_resultados(
-                analisis.proveedor_ia,
-                etiquetas
-            )
-            datos_analisis['etiquetas_traducidas'] = resultados_procesados['etiquetas']
-            datos_analisis['interpretacion'] = resultados_procesados['interpretacion']
+            resultados_procesados = ServicioAnalisis.obtener_resultados_procesados(analisis)
+            datos_analisis = ServicioAnalisis.a_dict_con_resultados(analisis, resultados_procesados)
         except Exception as e:
+            datos_analisis = analisis.a_dict()
             datos_analisis['etiquetas_traducidas'] = None
             datos_analisis['interpretacion'] = None
 
@@ -261,3 +688,35 @@ def eliminar_analisis(id_analisis):
     except Exception as e:
         db.session.rollback()
         return respuesta_error(f"Error al eliminar análisis: {str(e)}", codigo=500)
+
+
+@analisis_bp.route('/historial', methods=['DELETE'])
+@jwt_required()
+@requiere_json
+def eliminar_analisis_lote():
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Endpoint para eliminar varios análisis en una sola operación.
+                 Cuerpo: {"ids": ["...", ...]}
+    """
+    try:
+        usuario_id = int(get_jwt_identity())
+        ids_analisis = request.get_json().get('ids')
+
+        if not isinstance(ids_analisis, list) or not ids_analisis:
+            return respuesta_error("Se requiere una lista 'ids' con los análisis a eliminar")
+
+        if len(ids_analisis) > MAX_IDS_ELIMINACION:
+            return respuesta_error(f"Se pueden eliminar como máximo {MAX_IDS_ELIMINACION} análisis por petición")
+
+        eliminados = ServicioAnalisis.eliminar_lote(usuario_id, [str(id_analisis) for id_analisis in ids_analisis])
+
+        return respuesta_exitosa(
+            datos={'eliminados': eliminados},
+            mensaje=f"Se eliminaron {len(eliminados)} análisis"
+        )
+
+    except Exception as e:
+        return respuesta_error(f"Error al eliminar análisis: {str(e)}", codigo=500)
+
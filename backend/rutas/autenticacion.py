@@ -7,6 +7,7 @@ Descripción: Rutas de autenticación (registro, login, logout)
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from servicios.servicio_auth import ServicioAuth
+from servicios.pool_contrasenas import PoolSaturadoError
 from utilidades.respuestas import respuesta_exitosa, respuesta_error
 from utilidades.decoradores import requiere_json
 from config.seguridad import limitar_peticiones
@@ -14,6 +15,15 @@ from utilidades.captcha import generar_captcha, validar_captcha
 
 autenticacion_bp = Blueprint('autenticacion', __name__)
 
+SEGUNDOS_REINTENTO_SATURADO = 1
+
+
+def respuesta_saturado(error):
+    """Respuesta 503 cuando el pool de contraseñas no admite más operaciones"""
+    respuesta, codigo = respuesta_error(str(error), error='servicio_saturado', codigo=503)
+    respuesta.headers['Retry-After'] = str(SEGUNDOS_REINTENTO_SATURADO)
+    return respuesta, codigo
+
 
 @autenticacion_bp.route('/captcha', methods=['GET'])
 def obtener_captcha():
@@ -72,6 +82,8 @@ def registrar():
             codigo=201
         )
         
+    except PoolSaturadoError as e:
+        return respuesta_saturado(e)
     except Exception as e:
         return respuesta_error(f"Error al registrar usuario: {str(e)}", codigo=500)
 
@@ -107,6 +119,8 @@ def iniciar_sesion():
             mensaje=mensaje
         )
         
+    except PoolSaturadoError as e:
+        return respuesta_saturado(e)
     except Exception as e:
         return respuesta_error(f"Error al iniciar sesión: {str(e)}", codigo=500)
 
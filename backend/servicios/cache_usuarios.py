@@ -0,0 +1,108 @@
+"""
+Autor: Steeven Vargas
+Fecha: Noviembre 2024
+Descripción: Caché por proceso del estado de los usuarios autenticados.
+             Las rutas protegidas solo necesitan saber si el usuario del JWT
+             existe y está activo; esa respuesta se guarda por id con TTL para
+             no consultar la base de datos en cada petición. Desactivar o
+             eliminar un usuario mediante el ORM invalida su entrada al hacer
+             commit; en otros workers la entrada vence con el TTL.
+"""
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from modelos import db, Usuario
+from utilidades.cache_resultados import CacheLRU
+
+
+CLAVE_INVALIDACIONES = 'usuarios_a_invalidar'
+
+
+class CacheUsuarios:
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Estado activo/inactivo de usuarios por id con TTL
+    """
+
+    def __init__(self, tamano_maximo=1024, ttl_segundos=60):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Constructor de la caché
+        Argumentos entrada:
+            tamano_maximo (int): Usuarios en memoria
+            ttl_segundos (float): Vigencia máxima de cada entrada
+        Returns: Instancia de CacheUsuarios
+        Modificaciones: Ninguna
+        """
+        self._entradas = CacheLRU(tamano_maximo=tamano_maximo, ttl_segundos=ttl_segundos)
+
+    def usuario_activo(self, usuario_id):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Indica si el usuario existe y está activo. Solo se guardan
+                     usuarios existentes; un id desconocido siempre consulta la BD
+        Argumentos entrada:
+            usuario_id (int): ID del usuario
+        Returns:
+            bool: True si existe y está activo
+        Modificaciones: Ninguna
+        """
+        activo = self._entradas.obtener(usuario_id)
+        if activo is not None:
+            return activo
+
+        fila = db.session.query(Usuario.activo).filter(Usuario.id == usuario_id).first()
+        if fila is None:
+            return False
+
+        activo = bool(fila.activo)
+        self._entradas.guardar(usuario_id, activo)
+        return activo
+
+    def invalidar(self, usuario_id):
+        """Descarta la entrada de un usuario"""
+        self._entradas.eliminar(usuario_id)
+
+    def limpiar(self):
+        """Descarta todas las entradas"""
+        self._entradas.limpiar()
+
+    def __len__(self):
+        return len(self._entradas)
+
+
+@event.listens_for(Usuario, 'after_update')
+def _anotar_usuario_modificado(mapper, conexion, usuario):
+    """Anota el usuario si cambió su estado activo"""
+    if inspect(usuario).attrs.activo.history.has_changes():
+        inspect(usuario).session.info.setdefault(CLAVE_INVALIDACIONES, set()).add(usuario.id)
+
+
+@event.listens_for(Usuario, 'after_delete')
+def _anotar_usuario_eliminado(mapper, conexion, usuario):
+    """Anota el usuario eliminado"""
+    inspect(usuario).session.info.setdefault(CLAVE_INVALIDACIONES, set()).add(usuario.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar_tras_commit(sesion):
+    """Invalida los usuarios anotados una vez que el cambio es visible"""
+    usuarios = sesion.info.pop(CLAVE_INVALIDACIONES, None)
+    if not usuarios or not has_app_context():
+        return
+
+    cache = current_app.extensions.get('cache_usuarios')
+    if cache is not None:
+        for usuario_id in usuarios:
+            cache.invalidar(usuario_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_tras_rollback(sesion):
+    """Un cambio revertido no invalida nada"""
+    sesion.info.pop(CLAVE_INVALIDACIONES, None)
@@ -0,0 +1,195 @@
+"""
+Autor: Steeven Vargas
+Fecha: Noviembre 2024
+Descripción: Cola de análisis asíncronos sin broker externo.
+             Un pool acotado de hilos ejecuta ServicioAnalisis fuera del ciclo
+             de la petición; el estado se persiste en TrabajoAnalisis para que
+             cualquier worker pueda responder la consulta de progreso.
+"""
+
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from modelos import db, TrabajoAnalisis
+from servicios.servicio_analisis import ServicioAnalisis
+
+
+registro = logging.getLogger(__name__)
+
+
+class ColaLlenaError(Exception):
+    """Se lanza cuando la cola alcanzó su número máximo de trabajos pendientes"""
+
+
+class ColaAnalisis:
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Pool de hilos con límite de trabajos pendientes
+    """
+
+    def __init__(self, app, max_trabajadores=4, max_en_cola=100):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Constructor de la cola
+        Argumentos entrada:
+            app: Aplicación Flask (cada trabajo corre en su app_context)
+            max_trabajadores (int): Hilos que ejecutan análisis en paralelo
+            max_en_cola (int): Trabajos pendientes máximos (en cola + en curso)
+        Returns: Instancia de ColaAnalisis
+        Modificaciones: Ninguna
+        """
+        self.app = app
+        self.max_trabajadores = max_trabajadores
+        self._cupos = threading.BoundedSemaphore(max_en_cola)
+        self._ejecutor = None
+        self._pid = None
+        self._candado = threading.Lock()
+        self._inicio = datetime.utcnow()
+
+    def marcar_interrumpidos(self):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Pasa a ERROR los trabajos que un proceso anterior dejó sin
+                     terminar: sus hilos ya no existen y nadie los completará.
+                     Solo toca trabajos sin cambios desde antes de crear esta
+                     cola, para no afectar a los de otros workers ya activos.
+        Argumentos entrada: Ninguno
+        Returns:
+            int: Número de trabajos marcados
+        Modificaciones: Ninguna
+        """
+        marcados = TrabajoAnalisis.query.filter(
+            TrabajoAnalisis.estado.in_(TrabajoAnalisis.EN_CURSO),
+            TrabajoAnalisis.fecha_actualizacion < self._inicio
+        ).update({
+            TrabajoAnalisis.estado: TrabajoAnalisis.ERROR,
+            TrabajoAnalisis.mensaje: "Interrumpido por reinicio del servidor"
+        }, synchronize_session=False)
+        db.session.commit()
+
+        if marcados:
+            registro.warning("%d trabajos interrumpidos por reinicio marcados como fallidos", marcados)
+        return marcados
+
+    def _obtener_ejecutor(self):
+        """Crea el pool de hilos de forma perezosa (y de nuevo tras un fork)"""
+        with self._candado:
+            if self._ejecutor is None or self._pid != os.getpid():
+                self._ejecutor = ThreadPoolExecutor(
+                    max_workers=self.max_trabajadores,
+                    thread_name_prefix='analisis'
+                )
+                self._pid = os.getpid()
+            return self._ejecutor
+
+    def encolar(self, usuario_id, nombre_archivo, ruta_archivo, proveedor):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Registra un trabajo y lo envía al pool
+        Argumentos entrada:
+            usuario_id (int): ID del usuario
+            nombre_archivo (str): Nombre original del archivo
+            ruta_archivo (str): Ruta del archivo ya guardado
+            proveedor (str): 'google' o 'imagga'
+        Returns:
+            TrabajoAnalisis: Trabajo creado en estado en_cola
+        Raises:
+            ColaLlenaError: Si no hay cupo para más trabajos
+        Modificaciones: Ninguna
+        """
+        if not self._cupos.acquire(blocking=False):
+            raise ColaLlenaError("Hay demasiados análisis en curso. Intenta nuevamente en unos segundos.")
+
+        try:
+            trabajo = TrabajoAnalisis(
+                id=str(uuid.uuid4()),
+                usuario_id=usuario_id,
+                nombre_archivo=nombre_archivo,
+                proveedor_ia=proveedor
+            )
+            db.session.add(trabajo)
+            db.session.commit()
+
+            self._obtener_ejecutor().submit(
+                self._ejecutar,
+                trabajo.id,
+                usuario_id,
+                nombre_archivo,
+                ruta_archivo,
+                proveedor
+            )
+        except Exception:
+            self._cupos.release()
+            raise
+
+        return trabajo
+
+    def _ejecutar(self, id_trabajo, usuario_id, nombre_archivo, ruta_archivo, proveedor):
+        """Ejecuta un trabajo en segundo plano y persiste su estado"""
+        try:
+            with self.app.app_context():
+                def notificar_progreso(estado, progreso):
+                    self._actualizar(id_trabajo, estado=estado, progreso=progreso)
+
+                try:
+                    analisis, resultados = ServicioAnalisis.ejecutar_analisis(
+                        usuario_id,
+                        nombre_archivo,
+                        ruta_archivo,
+                        proveedor,
+                        notificar_progreso
+                    )
+                except Exception as e:
+                    db.session.rollback()
+                    self._marcar_error(id_trabajo, str(e))
+                    return
+
+                try:
+                    trabajo = db.session.get(TrabajoAnalisis, id_trabajo)
+                    trabajo.estado = TrabajoAnalisis.COMPLETADO
+                    trabajo.progreso = 100
+                    trabajo.mensaje = "Imagen analizada exitosamente"
+                    trabajo.analisis_id = analisis.id
+                    trabajo.establecer_resultado(
+                        ServicioAnalisis.a_dict_con_resultados(analisis, resultados)
+                    )
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    self._marcar_error(id_trabajo, f"Error al guardar el resultado: {str(e)}")
+        finally:
+            self._cupos.release()
+
+    @staticmethod
+    def _marcar_error(id_trabajo, mensaje):
+        """Deja el trabajo en ERROR; si ni eso se puede guardar, lo registra en el log"""
+        try:
+            ColaAnalisis._actualizar(id_trabajo, estado=TrabajoAnalisis.ERROR, mensaje=mensaje[:500])
+        except Exception:
+            db.session.rollback()
+            registro.exception("No se pudo marcar el trabajo %s como fallido", id_trabajo)
+
+    @staticmethod
+    def _actualizar(id_trabajo, **campos):
+        """Actualiza y confirma campos del trabajo"""
+        trabajo = db.session.get(TrabajoAnalisis, id_trabajo)
+        if trabajo is None:
+            return
+        for campo, valor in campos.items():
+            setattr(trabajo, campo, valor)
+        db.session.commit()
+
+    def apagar(self, esperar=True):
+        """Detiene el pool; con esperar=True termina los trabajos en curso"""
+        with self._candado:
+            if self._ejecutor is not None:
+                self._ejecutor.shutdown(wait=esperar)
+                self._ejecutor = None
@@ -0,0 +1,131 @@
+"""
+Autor: Steeven Vargas
+Fecha: Noviembre 2024
+Descripción: Diccionario persistente de traducciones de etiquetas con una
+             caché LRU en memoria delante de la tabla traducciones_etiquetas.
+             Solo los términos nuevos llegan al traductor externo.
+             Nunca confirma ni revierte db.session: las lecturas no hacen
+             autoflush y las escrituras usan su propia conexión, para no
+             afectar al trabajo pendiente de quien traduce.
+"""
+
+from sqlalchemy.dialects.sqlite import insert as insertar_sqlite
+
+from modelos import db, TraduccionEtiqueta
+from utilidades.cache_resultados import CacheLRU
+
+
+class DiccionarioTraducciones:
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Búsqueda y registro de traducciones inglés → español
+    """
+
+    TAMANO_CONSULTA = 500
+
+    def __init__(self, tamano_memoria=5000):
+        """Constructor del diccionario"""
+        self.tamano_memoria = tamano_memoria
+        self.memoria = CacheLRU(tamano_memoria)
+
+    def cargar(self):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Precarga en memoria las traducciones más recientes
+        Argumentos entrada: Ninguno
+        Returns:
+            int: Número de traducciones cargadas
+        Modificaciones: Ninguna
+        """
+        filas = db.session.query(
+            TraduccionEtiqueta.termino_en,
+            TraduccionEtiqueta.termino_es
+        ).order_by(
+            TraduccionEtiqueta.fecha_creacion.desc()
+        ).limit(self.tamano_memoria).all()
+
+        for termino_en, termino_es in reversed(filas):
+            self.memoria.guardar(termino_en, termino_es)
+
+        return len(filas)
+
+    def buscar(self, terminos):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Busca traducciones en memoria y, para los que falten, en la BD
+        Argumentos entrada:
+            terminos (list): Términos en inglés
+        Returns:
+            dict: {termino: traduccion} solo para los términos conocidos
+        Modificaciones: Ninguna
+        """
+        encontradas = {}
+        pendientes = {}
+
+        for termino in terminos:
+            clave = TraduccionEtiqueta.normalizar(termino)
+            traduccion = self.memoria.obtener(clave)
+            if traduccion is not None:
+                encontradas[termino] = traduccion
+            else:
+                pendientes.setdefault(clave, []).append(termino)
+
+        claves = list(pendientes)
+        for inicio in range(0, len(claves), self.TAMANO_CONSULTA):
+            with db.session.no_autoflush:
+                filas = db.session.query(
+                    TraduccionEtiqueta.termino_en,
+                    TraduccionEtiqueta.termino_es
+                ).filter(
+                    TraduccionEtiqueta.termino_en.in_(claves[inicio:inicio + self.TAMANO_CONSULTA])
+                ).all()
+
+            for termino_en, termino_es in filas:
+                self.memoria.guardar(termino_en, termino_es)
+                for termino in pendientes[termino_en]:
+                    encontradas[termino] = termino_es
+
+        return encontradas
+
+    def guardar(self, traducciones):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Registra traducciones nuevas en una transacción propia
+                     (INSERT ... ON CONFLICT DO NOTHING). Si otro worker insertó
+                     el mismo término a la vez, se conserva el existente.
+        Argumentos entrada:
+            traducciones (dict): {termino_en: termino_es}
+        Returns:
+            int: Número de términos insertados
+        Modificaciones: Ninguna
+        """
+        nuevas = {}
+        for termino_en, termino_es in traducciones.items():
+            if termino_es:
+                nuevas[TraduccionEtiqueta.normalizar(termino_en)] = termino_es
+
+        if not nuevas:
+            return 0
+
+        for clave, traduccion in nuevas.items():
+            self.memoria.guardar(clave, traduccion)
+
+        filas = [
+            {'termino_en': clave, 'termino_es': traduccion}
+            for clave, traduccion in nuevas.items()
+        ]
+
+        insertados = 0
+        with db.engine.begin() as conexion:
+            for inicio in range(0, len(filas), self.TAMANO_CONSULTA):
+                resultado = conexion.execute(
+                    insertar_sqlite(TraduccionEtiqueta.__table__).on_conflict_do_nothing(),
+                    filas[inicio:inicio + self.TAMANO_CONSULTA]
+                )
+                insertados += max(resultado.rowcount, 0)
+
+        return insertados
@@ -0,0 +1,84 @@
+"""
+Autor: Steeven Vargas
+Fecha: Noviembre 2024
+Descripción: Pool acotado para hashear y verificar contraseñas con bcrypt.
+             bcrypt libera el GIL mientras calcula, por lo que un pool de hilos
+             reparte el trabajo entre núcleos sin procesos extra. El número de
+             operaciones pendientes tiene tope: al llenarse se rechaza la
+             petición (503) en lugar de dejar que una ráfaga de inicios de
+             sesión acapare los workers del resto de la API.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PoolSaturadoError(Exception):
+    """Se lanza cuando hay demasiadas operaciones de contraseña pendientes"""
+
+
+class PoolContrasenas:
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Pool de hilos con límite de operaciones pendientes
+    """
+
+    def __init__(self, max_hilos=2, max_pendientes=16):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Constructor del pool
+        Argumentos entrada:
+            max_hilos (int): Hashes calculados en paralelo
+            max_pendientes (int): Operaciones máximas (en curso + en espera)
+        Returns: Instancia de PoolContrasenas
+        Modificaciones: Ninguna
+        """
+        self.max_hilos = max_hilos
+        self.max_pendientes = max_pendientes
+        self._cupos = threading.BoundedSemaphore(max_pendientes)
+        self._ejecutor = None
+        self._pid = None
+        self._candado = threading.Lock()
+
+    def _obtener_ejecutor(self):
+        """Crea el pool de hilos de forma perezosa (y de nuevo tras un fork)"""
+        with self._candado:
+            if self._ejecutor is None or self._pid != os.getpid():
+                self._ejecutor = ThreadPoolExecutor(
+                    max_workers=self.max_hilos,
+                    thread_name_prefix='contrasenas'
+                )
+                self._pid = os.getpid()
+            return self._ejecutor
+
+    def ejecutar(self, funcion, *argumentos):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Ejecuta una operación de contraseña en el pool y espera el resultado
+        Argumentos entrada:
+            funcion (callable): Operación (p. ej. Usuario.generar_hash)
+            *argumentos: Argumentos de la operación
+        Returns:
+            object: Resultado de la operación
+        Raises:
+            PoolSaturadoError: Si no hay cupo para más operaciones
+        Modificaciones: Ninguna
+        """
+        if not self._cupos.acquire(blocking=False):
+            raise PoolSaturadoError("El servicio está ocupado. Intenta nuevamente en unos segundos.")
+
+        try:
+            return self._obtener_ejecutor().submit(funcion, *argumentos).result()
+        finally:
+            self._cupos.release()
+
+    def apagar(self, esperar=True):
+        """Detiene el pool"""
+        with self._candado:
+            if self._ejecutor is not None:
+                self._ejecutor.shutdown(wait=esperar)
+                self._ejecutor = None
@@ -0,0 +1,164 @@
+"""
+Autor: Steeven Vargas
+Fecha: Noviembre 2024
+Descripción: Registro diferido de la fecha de última sesión.
+             El inicio de sesión solo anota (usuario_id, instante) en memoria;
+             un hilo aparte escribe los pendientes con un único UPDATE
+             (executemany) cada cierto intervalo, al alcanzar un tamaño de lote
+             y al detener el proceso. Así el login no toma el candado de
+             escritura de SQLite.
+"""
+
+import atexit
+import logging
+import os
+import threading
+
+from sqlalchemy import bindparam, or_, update
+
+from modelos import db, Usuario
+
+
+registro = logging.getLogger(__name__)
+
+tabla_usuarios = Usuario.__table__
+
+# Solo avanza la fecha: si otro worker ya escribió un inicio más reciente, no se pisa
+SENTENCIA_ACTUALIZAR = (
+    update(tabla_usuarios)
+    .where(tabla_usuarios.c.id == bindparam('b_id'))
+    .where(or_(
+        tabla_usuarios.c.fecha_ultima_sesion.is_(None),
+        tabla_usuarios.c.fecha_ultima_sesion < bindparam('b_fecha')
+    ))
+    .values(fecha_ultima_sesion=bindparam('b_fecha', type_=db.DateTime))
+)
+
+
+class RegistroSesiones:
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Acumula fechas de última sesión y las escribe por lotes
+    """
+
+    def __init__(self, app, max_pendientes=100, intervalo_segundos=30):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Constructor del registro
+        Argumentos entrada:
+            app: Aplicación Flask (la escritura corre en su app_context)
+            max_pendientes (int): Usuarios pendientes que adelantan la escritura
+            intervalo_segundos (float): Tiempo máximo entre escrituras
+        Returns: Instancia de RegistroSesiones
+        Modificaciones: Ninguna
+        """
+        self.app = app
+        self.max_pendientes = max_pendientes
+        self.intervalo_segundos = intervalo_segundos
+        self._pendientes = {}
+        self._candado = threading.Lock()
+        self._candado_escritura = threading.Lock()
+        self._despertar = threading.Event()
+        self._hilo = None
+        self._pid = None
+        self._detenido = False
+
+        atexit.register(self.detener)
+
+    def _asegurar_hilo(self):
+        """Arranca el hilo de escritura de forma perezosa (y de nuevo tras un fork; requiere el candado)"""
+        if self._hilo is not None and self._pid == os.getpid():
+            return
+
+        if self._pid is not None and self._pid != os.getpid():
+            # Los pendientes heredados los escribe el proceso padre
+            self._pendientes = {}
+
+        self._despertar = threading.Event()
+        self._hilo = threading.Thread(target=self._bucle, name='registro-sesiones', daemon=True)
+        self._pid = os.getpid()
+        self._hilo.start()
+
+    def _bucle(self):
+        """Escribe los pendientes cada intervalo o cuando se llena el lote"""
+        while not self._detenido:
+            self._despertar.wait(self.intervalo_segundos)
+            self._despertar.clear()
+            if not self._detenido:
+                self.vaciar()
+
+    def registrar(self, usuario_id, instante):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Anota un inicio de sesión sin tocar la base de datos
+        Argumentos entrada:
+            usuario_id (int): ID del usuario
+            instante (datetime): Fecha del inicio de sesión (UTC)
+        Returns: None
+        Modificaciones: Ninguna
+        """
+        with self._candado:
+            self._asegurar_hilo()
+            anterior = self._pendientes.get(usuario_id)
+            if anterior is None or anterior < instante:
+                self._pendientes[usuario_id] = instante
+            lleno = len(self._pendientes) >= self.max_pendientes
+
+        if lleno:
+            self._despertar.set()
+
+    def vaciar(self):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Escribe todos los pendientes en un solo UPDATE por lotes.
+                     Si falla, los pendientes vuelven al búfer para el siguiente intento
+        Argumentos entrada: Ninguno
+        Returns:
+            int: Número de usuarios enviados a la base de datos
+        Modificaciones: Ninguna
+        """
+        with self._candado_escritura:
+            with self._candado:
+                pendientes, self._pendientes = self._pendientes, {}
+
+            if not pendientes:
+                return 0
+
+            filas = [
+                {'b_id': usuario_id, 'b_fecha': instante}
+                for usuario_id, instante in pendientes.items()
+            ]
+
+            try:
+                with self.app.app_context():
+                    with db.engine.begin() as conexion:
+                        conexion.execute(SENTENCIA_ACTUALIZAR, filas)
+            except Exception:
+                registro.exception("No se pudieron guardar %d fechas de última sesión", len(filas))
+                with self._candado:
+                    for usuario_id, instante in pendientes.items():
+                        actual = self._pendientes.get(usuario_id)
+                        if actual is None or actual < instante:
+                            self._pendientes[usuario_id] = instante
+                return 0
+
+            registro.debug("Fechas de última sesión guardadas: %d", len(filas))
+            return len(filas)
+
+    def detener(self):
+        """Detiene el hilo y escribe lo pendiente"""
+        if self._detenido:
+            return
+
+        self._detenido = True
+        self._despertar.set()
+        if self._hilo is not None and self._pid == os.getpid():
+            self._hilo.join(timeout=5)
+        self.vaciar()
+
+    def __len__(self):
+        return len(self._pendientes)
@@ -0,0 +1,511 @@
+"""
+Autor: Steeven Vargas
+Fecha: Noviembre 2024
+Descripción: Servicio que orquesta un análisis completo: proveedor de IA,
+             traducción e interpretación, y registro en base de datos.
+             Lo usan el endpoint síncrono, el de lotes y la cola de trabajos.
+"""
+
+import base64
+import json
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import func, or_
+from sqlalchemy.orm import load_only
+
+from modelos import db, Analisis, AnalisisEtiqueta, Etiqueta, TrabajoAnalisis
+from modelos.analisis import COLUMNAS_RESUMEN, ajustar_contadores
+from servicios.servicio_ia import ServicioIA
+from servicios.servicio_interpretacion import ServicioInterpretacion
+from utilidades.cliente_http import CircuitoAbiertoError
+from utilidades.pool_clientes import PoolClientes
+
+
+pool_ejecutores_lote = PoolClientes(
+    lambda hilos: ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='lote_analisis')
+)
+
+
+def codificar_cursor(analisis):
+    """Cursor opaco con la posición (fecha_analisis, id) del último análisis de la página"""
+    posicion = json.dumps([analisis.fecha_analisis.isoformat(), analisis.id])
+    return base64.urlsafe_b64encode(posicion.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Recupera la posición (fecha_analisis, id) de un cursor
+    Argumentos entrada:
+        cursor (str): Cursor generado por codificar_cursor
+    Returns:
+        tuple: (datetime, str)
+    Raises:
+        ValueError: Si el cursor está malformado
+    Modificaciones: Ninguna
+    """
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        fecha, id_analisis = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        return datetime.fromisoformat(fecha), str(id_analisis)
+    except Exception:
+        raise ValueError("Cursor no válido")
+
+
+class ServicioAnalisis:
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Ejecución y registro de análisis de imágenes
+    """
+
+    @staticmethod
+    def ejecutar_analisis(usuario_id, nombre_archivo, ruta_archivo, proveedor,
+                          notificar_progreso=None):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Analiza una imagen ya guardada en disco y crea el registro Analisis
+        Argumentos entrada:
+            usuario_id (int): ID del usuario propietario
+            nombre_archivo (str): Nombre original (seguro) del archivo
+            ruta_archivo (str): Ruta del archivo guardado
+            proveedor (str o list): 'google', 'imagga', 'ambos' o lista de proveedores
+            notificar_progreso (callable): Opcional, recibe (estado, progreso)
+        Returns:
+            tuple: (Analisis, dict resultados_procesados)
+        Raises:
+            CircuitoAbiertoError: Si los proveedores pedidos están marcados como
+                                  caídos (el archivo se elimina)
+            Exception: Si falla el proveedor de IA (el archivo se elimina)
+        Modificaciones: La traducción e interpretación se guardan en el análisis
+        """
+        notificar = notificar_progreso or (lambda estado, progreso: None)
+
+        proveedores = ServicioIA.normalizar_proveedores(proveedor)
+
+        notificar(TrabajoAnalisis.ANALIZANDO, 10)
+        try:
+            etiquetas, resultados_proveedores = ServicioAnalisis.consultar_proveedores(
+                ruta_archivo,
+                proveedores
+            )
+        except Exception as e:
+            if os.path.exists(ruta_archivo):
+                os.remove(ruta_archivo)
+            if isinstance(e, CircuitoAbiertoError):
+                raise
+            raise Exception(f"Error al analizar imagen: {str(e)}")
+
+        notificar(TrabajoAnalisis.INTERPRETANDO, 60)
+        nuevo_analisis, resultados_procesados = ServicioAnalisis.crear_registro(
+            usuario_id,
+            nombre_archivo,
+            ruta_archivo,
+            ServicioIA.nombre_proveedor(proveedores),
+            etiquetas,
+            resultados_proveedores
+        )
+
+        notificar(TrabajoAnalisis.GUARDANDO, 90)
+        db.session.add(nuevo_analisis)
+        db.session.commit()
+
+        return nuevo_analisis, resultados_procesados
+
+    @staticmethod
+    def consultar_proveedores(ruta_archivo, proveedores):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Obtiene las etiquetas de uno o varios proveedores de IA
+        Argumentos entrada:
+            ruta_archivo (str): Ruta de la imagen
+            proveedores (list): Proveedores ya normalizados
+        Returns:
+            tuple: (list etiquetas, dict resultados por proveedor o None)
+        Modificaciones: Ninguna
+        """
+        if len(proveedores) == 1:
+            return ServicioIA.analizar_imagen(ruta_archivo, proveedores[0]), None
+
+        resultados_proveedores = ServicioIA.analizar_en_paralelo(ruta_archivo, proveedores)
+        return ServicioIA.combinar_etiquetas(resultados_proveedores), resultados_proveedores
+
+    @staticmethod
+    def crear_registro(usuario_id, nombre_archivo, ruta_archivo, proveedor, etiquetas,
+                       resultados_proveedores=None, traducciones=None):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Traduce e interpreta las etiquetas y construye el Analisis
+                     sin agregarlo a la sesión. Si la interpretación falla el
+                     análisis se guarda igual y se calcula al consultarlo.
+        Argumentos entrada:
+            usuario_id (int): ID del usuario propietario
+            nombre_archivo (str): Nombre original (seguro) del archivo
+            ruta_archivo (str): Ruta del archivo guardado
+            proveedor (str): Nombre del proveedor ('google', 'imagga' o 'ambos')
+            etiquetas (list): Etiquetas obtenidas del proveedor
+            resultados_proveedores (dict): Resultados por proveedor en modo múltiple
+            traducciones (dict): Traducciones ya obtenidas; con ellas no se vuelve
+                                 a llamar al diccionario ni al traductor
+        Returns:
+            tuple: (Analisis, dict resultados_procesados)
+        Modificaciones: Ninguna
+        """
+        try:
+            resultados_procesados = ServicioInterpretacion.procesar_resultados(
+                proveedor,
+                etiquetas,
+                traducciones
+            )
+        except Exception:
+            resultados_procesados = None
+
+        nuevo_analisis = Analisis(
+            id=str(uuid.uuid4()),
+            usuario_id=usuario_id,
+            nombre_archivo=nombre_archivo,
+            ruta_archivo=ruta_archivo,
+            proveedor_ia=proveedor,
+            etiquetas=etiquetas,
+            resultados_proveedores=resultados_proveedores
+        )
+
+        if resultados_procesados is not None:
+            nuevo_analisis.establecer_resultados_procesados(resultados_procesados)
+        else:
+            resultados_procesados = {
+                'etiquetas': etiquetas,
+                'interpretacion': None,
+                'total_etiquetas': len(etiquetas)
+            }
+
+        return nuevo_analisis, resultados_procesados
+
+    @staticmethod
+    def ejecutar_lote(usuario_id, archivos, proveedor):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Analiza varias imágenes ya guardadas en disco. Las llamadas a
+                     los proveedores se reparten en un pool acotado de hilos
+                     (MAX_HILOS_LOTE); las traducciones nuevas se piden en un solo
+                     lote antes de crear los registros (un término que quede sin
+                     traducir conserva su nombre, sin reintentos) y todos los
+                     Analisis se confirman en una única transacción. El fallo de
+                     una imagen no detiene el resto.
+        Argumentos entrada:
+            usuario_id (int): ID del usuario propietario
+            archivos (list): Tuplas (nombre_archivo, ruta_archivo)
+            proveedor (str o list): 'google', 'imagga', 'ambos' o lista de proveedores
+        Returns:
+            list: Por cada archivo, en el mismo orden, una tupla
+                  (nombre_archivo, Analisis o None, resultados_procesados o None,
+                  str error o None)
+        Raises:
+            Exception: Si falla la transacción (los archivos se eliminan)
+        Modificaciones: Ninguna
+        """
+        proveedores = ServicioIA.normalizar_proveedores(proveedor)
+        nombre_proveedor = ServicioIA.nombre_proveedor(proveedores)
+        app = current_app._get_current_object()
+
+        def consultar(ruta_archivo):
+            with app.app_context():
+                return ServicioAnalisis.consultar_proveedores(ruta_archivo, proveedores)
+
+        ejecutor = pool_ejecutores_lote.obtener(app.config.get('MAX_HILOS_LOTE', 4))
+        futuros = [ejecutor.submit(consultar, ruta) for _, ruta in archivos]
+
+        consultas = []
+        for (nombre_archivo, ruta_archivo), futuro in zip(archivos, futuros):
+            try:
+                consultas.append(futuro.result())
+            except Exception as e:
+                if os.path.exists(ruta_archivo):
+                    os.remove(ruta_archivo)
+                consultas.append(e)
+
+        terminos = {
+            etiqueta['etiqueta']
+            for consulta in consultas if not isinstance(consulta, Exception)
+            for etiqueta in consulta[0]
+        }
+        traducciones = {}
+        if terminos:
+            try:
+                traducciones = ServicioInterpretacion.traducir_terminos(sorted(terminos))
+            except Exception:
+                pass
+
+        resultados = []
+        for (nombre_archivo, ruta_archivo), consulta in zip(archivos, consultas):
+            if isinstance(consulta, Exception):
+                resultados.append((
+                    nombre_archivo, None, None, f"Error al analizar imagen: {str(consulta)}"
+                ))
+                continue
+
+            etiquetas, resultados_proveedores = consulta
+            nuevo_analisis, resultados_procesados = ServicioAnalisis.crear_registro(
+                usuario_id,
+                nombre_archivo,
+                ruta_archivo,
+                nombre_proveedor,
+                etiquetas,
+                resultados_proveedores,
+                traducciones
+            )
+            db.session.add(nuevo_analisis)
+            resultados.append((nombre_archivo, nuevo_analisis, resultados_procesados, None))
+
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            for _, ruta_archivo in archivos:
+                if os.path.exists(ruta_archivo):
+                    os.remove(ruta_archivo)
+            raise
+
+        return resultados
+
+    @staticmethod
+    def consulta_historial(usuario_id):
+        """
+        Análisis del usuario en el orden del índice ix_analisis_usuario_fecha_id.
+        Solo carga COLUMNAS_RESUMEN: serializar con a_dict_resumen, no con a_dict
+        """
+        return Analisis.query.filter(Analisis.usuario_id == usuario_id)\
+            .options(load_only(*COLUMNAS_RESUMEN))\
+            .order_by(Analisis.fecha_analisis.desc(), Analisis.id)
+
+    @staticmethod
+    def listar_historial_cursor(usuario_id, por_pagina, cursor=None):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Página del historial por cursor (keyset): continúa después
+                     de la posición del cursor en lugar de saltar filas con
+                     OFFSET, por lo que el costo no crece con la profundidad
+        Argumentos entrada:
+            usuario_id (int): ID del usuario
+            por_pagina (int): Análisis por página
+            cursor (str): Cursor de la página anterior o None para la primera
+        Returns:
+            tuple: (list Analisis, str siguiente cursor o None si no hay más)
+        Raises:
+            ValueError: Si el cursor no es válido
+        Modificaciones: Ninguna
+        """
+        return ServicioAnalisis.paginar_por_cursor(
+            ServicioAnalisis.consulta_historial(usuario_id),
+            por_pagina,
+            cursor
+        )
+
+    @staticmethod
+    def paginar_por_cursor(consulta, por_pagina, cursor=None):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Aplica el cursor y el límite a una consulta de análisis
+                     ordenada por (fecha_analisis desc, id)
+        Argumentos entrada:
+            consulta: Query de Analisis en ese orden
+            por_pagina (int): Análisis por página
+            cursor (str): Cursor de la página anterior o None para la primera
+        Returns:
+            tuple: (list Analisis, str siguiente cursor o None si no hay más)
+        Raises:
+            ValueError: Si el cursor no es válido
+        Modificaciones: Ninguna
+        """
+        if cursor:
+            fecha, id_analisis = decodificar_cursor(cursor)
+            # El 'fecha <= cursor' redundante da al planificador un rango sobre
+            # el índice; con solo el OR recorrería desde el inicio de la página 1
+            consulta = consulta.filter(
+                Analisis.fecha_analisis <= fecha,
+                or_(Analisis.fecha_analisis < fecha, Analisis.id > id_analisis)
+            )
+
+        analisis_lista = consulta.limit(por_pagina + 1).all()
+
+        if len(analisis_lista) <= por_pagina:
+            return analisis_lista, None
+
+        analisis_lista = analisis_lista[:por_pagina]
+        return analisis_lista, codificar_cursor(analisis_lista[-1])
+
+    @staticmethod
+    def buscar_historial(usuario_id, por_pagina, etiqueta=None, min_confianza=None,
+                         proveedor=None, desde=None, cursor=None):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Busca en el historial del usuario por etiqueta, confianza
+                     mínima, proveedor y fecha. La etiqueta (sin distinguir
+                     mayúsculas) se resuelve en el vocabulario y los análisis se
+                     obtienen del índice (usuario_id, etiqueta_id, confianza) de
+                     analisis_etiquetas, sin recorrer el historial completo.
+        Argumentos entrada:
+            usuario_id (int): ID del usuario
+            por_pagina (int): Análisis por página
+            etiqueta (str): Nombre de la etiqueta
+            min_confianza (float): Confianza mínima entre 0 y 1 (requiere etiqueta)
+            proveedor (str): 'google', 'imagga' o 'ambos'
+            desde (datetime): Solo análisis desde esta fecha
+            cursor (str): Cursor de la página anterior o None para la primera
+        Returns:
+            tuple: (list Analisis, str siguiente cursor o None si no hay más)
+        Raises:
+            ValueError: Si el cursor no es válido
+        Modificaciones: Ninguna
+        """
+        consulta = ServicioAnalisis.consulta_historial(usuario_id)
+
+        if etiqueta:
+            ids_etiqueta = [
+                id_etiqueta for (id_etiqueta,) in db.session.query(Etiqueta.id).filter(
+                    func.lower(Etiqueta.nombre) == etiqueta.strip().lower()
+                )
+            ]
+
+            # Sin coincidencias en el vocabulario el IN vacío no devuelve filas
+            condiciones = [
+                AnalisisEtiqueta.usuario_id == usuario_id,
+                AnalisisEtiqueta.etiqueta_id.in_(ids_etiqueta)
+            ]
+            if min_confianza is not None:
+                condiciones.append(AnalisisEtiqueta.confianza >= AnalisisEtiqueta.a_porcentaje(min_confianza))
+
+            consulta = consulta.join(
+                AnalisisEtiqueta, AnalisisEtiqueta.analisis_id == Analisis.id
+            ).filter(*condiciones).distinct()
+
+        if proveedor:
+            consulta = consulta.filter(Analisis.proveedor_ia == proveedor)
+
+        if desde is not None:
+            consulta = consulta.filter(Analisis.fecha_analisis >= desde)
+
+        return ServicioAnalisis.paginar_por_cursor(consulta, por_pagina, cursor)
+
+    @staticmethod
+    def eliminar_lote(usuario_id, ids_analisis):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Elimina varios análisis del usuario con un solo DELETE y
+                     descuenta total_analisis en la misma transacción (un DELETE
+                     masivo no pasa por los eventos de flush del ORM, así que
+                     también borra sus filas de analisis_etiquetas). Las
+                     imágenes se borran del disco después del commit.
+        Argumentos entrada:
+            usuario_id (int): ID del usuario propietario
+            ids_analisis (list): IDs de los análisis a eliminar
+        Returns:
+            list: IDs efectivamente eliminados (los ajenos o inexistentes se ignoran)
+        Modificaciones: Ninguna
+        """
+        filas = db.session.query(Analisis.id, Analisis.ruta_archivo).filter(
+            Analisis.usuario_id == usuario_id,
+            Analisis.id.in_(ids_analisis)
+        ).all()
+
+        if not filas:
+            return []
+
+        eliminados = [fila.id for fila in filas]
+        try:
+            db.session.execute(
+                db.delete(AnalisisEtiqueta).where(AnalisisEtiqueta.analisis_id.in_(eliminados)),
+                execution_options={'synchronize_session': False}
+            )
+            resultado = db.session.execute(
+                db.delete(Analisis).where(
+                    Analisis.usuario_id == usuario_id,
+                    Analisis.id.in_(eliminados)
+                ),
+                execution_options={'synchronize_session': False}
+            )
+            # rowcount y no len(filas): otra petición pudo borrar alguno entre medio
+            ajustar_contadores(db.session.connection(), {usuario_id: -resultado.rowcount})
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        for fila in filas:
+            if os.path.exists(fila.ruta_archivo):
+                os.remove(fila.ruta_archivo)
+
+        return eliminados
+
+    @staticmethod
+    def obtener_resultados_procesados(analisis, guardar=True):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Retorna la traducción e interpretación almacenadas. Para
+                     análisis antiguos sin esos datos los calcula una sola vez
+                     y, si guardar es True, los persiste.
+        Argumentos entrada:
+            analisis (Analisis): Registro de análisis
+            guardar (bool): Si True, confirma el cálculo perezoso en la BD
+        Returns:
+            dict: {'etiquetas', 'interpretacion', 'total_etiquetas'}
+        Modificaciones: Ninguna
+        """
+        if analisis.tiene_resultados_procesados():
+            etiquetas_traducidas = analisis.obtener_etiquetas_traducidas()
+            return {
+                'etiquetas': etiquetas_traducidas,
+                'interpretacion': analisis.interpretacion,
+                'total_etiquetas': len(etiquetas_traducidas)
+            }
+
+        resultados_procesados = ServicioInterpretacion.procesar_resultados(
+            analisis.proveedor_ia,
+            analisis.obtener_etiquetas()
+        )
+        analisis.establecer_resultados_procesados(resultados_procesados)
+
+        if guardar:
+            try:
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+
+        return resultados_procesados
+
+    @staticmethod
+    def a_dict_con_resultados(analisis, resultados_procesados):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Serializa un análisis junto con su traducción e interpretación
+        Argumentos entrada:
+            analisis (Analisis): Registro de análisis
+            resultados_procesados (dict): Resultado de procesar_resultados
+        Returns:
+            dict: Datos del análisis para la respuesta JSON
+        Modificaciones: Ninguna
+        """
+        datos = analisis.a_dict()
+        datos['etiquetas_traducidas'] = resultados_procesados['etiquetas']
+        datos['interpretacion'] = resultados_procesados['interpretacion']
+
+        resultados_proveedores = analisis.obtener_resultados_proveedores()
+        if resultados_proveedores is not None:
+            datos['resultados_proveedores'] = resultados_proveedores
+
+        return datos
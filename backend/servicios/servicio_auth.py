@@ -4,6 +4,7 @@ Fecha: Noviembre 2024
 Descripción: Servicio de autenticación y gestión de usuarios
 """
 
+from flask import current_app
 from modelos import db, Usuario
 from flask_jwt_extended import create_access_token
 from utilidades.validadores import validar_contrasena, validar_nombre_usuario
@@ -16,6 +17,27 @@ class ServicioAuth:
     Descripción: Gestión de autenticación de usuarios
     """
     
+    @staticmethod
+    def ejecutar_contrasena(funcion, *argumentos):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Ejecuta una operación de bcrypt en el pool de contraseñas
+                     de la app, o directamente si no hay pool registrado
+        Argumentos entrada:
+            funcion (callable): Usuario.generar_hash o Usuario.comparar_hash
+            *argumentos: Argumentos de la operación
+        Returns:
+            object: Resultado de la operación
+        Raises:
+            PoolSaturadoError: Si el pool no admite más operaciones
+        Modificaciones: Ninguna
+        """
+        pool = current_app.extensions.get('pool_contrasenas')
+        if pool is None:
+            return funcion(*argumentos)
+        return pool.ejecutar(funcion, *argumentos)
+    
     @staticmethod
     def registrar_usuario(nombre_usuario, contrasena):
         """
@@ -27,7 +49,9 @@ class ServicioAuth:
             contrasena (str): Contraseña
         Returns:
             tuple: (exito, mensaje, usuario)
-        Modificaciones: Ninguna
+        Raises:
+            PoolSaturadoError: Si el pool de contraseñas está lleno
+        Modificaciones: El hash se calcula en el pool de contraseñas
         """
         valido, mensaje = validar_nombre_usuario(nombre_usuario)
         if not valido:
@@ -40,10 +64,14 @@ class ServicioAuth:
         if Usuario.existe_usuario(nombre_usuario):
             return False, "El nombre de usuario ya está en uso", None
         
+        contrasena_hash = ServicioAuth.ejecutar_contrasena(
+            Usuario.generar_hash, contrasena, Usuario.rondas_configuradas()
+        )
+        
         try:
             nuevo_usuario = Usuario(
                 nombre_usuario=nombre_usuario,
-                contrasena=contrasena
+                contrasena_hash=contrasena_hash
             )
             
             db.session.add(nuevo_usuario)
@@ -66,25 +94,63 @@ class ServicioAuth:
             contrasena (str): Contraseña
         Returns:
             tuple: (exito, mensaje, token, usuario)
-        Modificaciones: Ninguna
+        Raises:
+            PoolSaturadoError: Si el pool de contraseñas está lleno
+        Modificaciones: Si el costo de bcrypt cambió, la contraseña se vuelve
+                        a hashear con el costo actual tras un inicio correcto.
+                        Verificación y rehash se ejecutan en el pool de contraseñas.
+                        La fecha de última sesión se escribe por lotes
         """
         usuario = Usuario.buscar_por_nombre(nombre_usuario)
         
         if not usuario:
             return False, "Usuario o contraseña incorrectos", None, None
         
-        if not usuario.verificar_contrasena(contrasena):
+        if not ServicioAuth.ejecutar_contrasena(
+            Usuario.comparar_hash, contrasena, usuario.contrasena_hash
+        ):
             return False, "Usuario o contraseña incorrectos", None, None
         
         if not usuario.activo:
             return False, "Usuario inactivo", None, None
         
+        if usuario.necesita_rehash():
+            usuario.contrasena_hash = ServicioAuth.ejecutar_contrasena(
+                Usuario.generar_hash, contrasena, Usuario.rondas_configuradas()
+            )
+            db.session.commit()
+        
         usuario.actualizar_ultima_sesion()
 
         token = create_access_token(identity=str(usuario.id))
 
         return True, "Inicio de sesión exitoso", token, usuario
     
+    @staticmethod
+    def usuario_activo(usuario_id):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Verifica que el usuario del JWT exista y esté activo,
+                     usando la caché de usuarios de la app si está registrada
+        Argumentos entrada:
+            usuario_id (str): ID del usuario (como string desde JWT)
+        Returns:
+            bool: True si existe y está activo
+        Modificaciones: Ninguna
+        """
+        try:
+            id_int = int(usuario_id)
+        except (ValueError, TypeError):
+            return False
+
+        cache = current_app.extensions.get('cache_usuarios')
+        if cache is not None:
+            return cache.usuario_activo(id_int)
+
+        usuario = Usuario.query.get(id_int)
+        return usuario is not None and usuario.activo
+    
     @staticmethod
     def verificar_token(usuario_id):
         """
@@ -95,14 +161,17 @@ class ServicioAuth:
             usuario_id (str): ID del usuario (como string desde JWT)
         Returns:
             tuple: (exito, usuario)
-        Modificaciones: Ninguna
+        Modificaciones: No usa la caché de usuarios: la respuesta es el perfil
+                        completo (fecha_ultima_sesion, total_analisis), que cambia
+                        en cada inicio de sesión y análisis, así que la fila se lee
+                        una vez y de ella sale también el estado activo
         """
         try:
             id_int = int(usuario_id)
         except (ValueError, TypeError):
             return False, None
 
-        usuario = Usuario.query.get(id_int)
+        usuario = db.session.get(Usuario, id_int)
 
         if not usuario or not usuario.activo:
             return False, None
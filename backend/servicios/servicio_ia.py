@@ -8,11 +8,133 @@ Modificaciones: Ninguna
 """
 
 import os
+import time
 import base64
 import requests
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as TimeoutFuturo
 from google.cloud import vision
 from flask import current_app
 
+from utilidades.cache_resultados import CacheResultadosIA, calcular_hash_archivo
+from utilidades.pool_clientes import PoolClientes
+from utilidades.cliente_http import (
+    crear_sesion_http,
+    repartir_plazo,
+    InterruptorCircuito,
+    CircuitoAbiertoError,
+    CuerpoMultipart,
+    ESTADOS_REINTENTABLES
+)
+
+
+def crear_cliente_google(ruta_credenciales):
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Crea un cliente de Google Vision con su propio canal gRPC. Las
+                 credenciales se cargan directamente del archivo, sin modificar
+                 os.environ.
+    Argumentos entrada:
+        ruta_credenciales (str): Ruta al JSON de la cuenta de servicio
+    Returns:
+        vision.ImageAnnotatorClient: Cliente de Google Vision
+    Modificaciones: Ninguna
+    """
+    if ruta_credenciales and os.path.exists(ruta_credenciales):
+        return vision.ImageAnnotatorClient.from_service_account_file(ruta_credenciales)
+    return vision.ImageAnnotatorClient()
+
+
+pool_clientes_google = PoolClientes(crear_cliente_google)
+
+
+class ClienteImagga:
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Cliente HTTP de Imagga con sesión keep-alive, reintentos con
+                 jitter e interruptor de circuito. Se crea uno por worker.
+    """
+
+    def __init__(self, endpoint, api_key, api_secret, tamano_pool=10, reintentos=3,
+                 factor_backoff=0.5, umbral_fallos=5, segundos_apertura=30, timeout=30):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Constructor del cliente de Imagga
+        Argumentos entrada:
+            endpoint (str): URL del endpoint de etiquetado
+            api_key (str): API key de Imagga
+            api_secret (str): API secret de Imagga
+            tamano_pool (int): Conexiones keep-alive máximas
+            reintentos (int): Reintentos ante errores de conexión, 429 y 5xx
+            factor_backoff (float): Factor del backoff exponencial
+            umbral_fallos (int): Fallos consecutivos que abren el circuito
+            segundos_apertura (int): Tiempo que el circuito permanece abierto
+            timeout (float): Plazo total de cada llamada en segundos, incluidos
+                             los reintentos y las esperas entre ellos
+        Returns: Instancia de ClienteImagga
+        Modificaciones: Ninguna
+        """
+        self.endpoint = endpoint
+        self.timeout, backoff_maximo = repartir_plazo(timeout, reintentos, factor_backoff)
+        self.sesion = crear_sesion_http(tamano_pool, reintentos, factor_backoff,
+                                        backoff_maximo=backoff_maximo)
+        self.sesion.headers['Authorization'] = (
+            f'Basic {base64.b64encode(f"{api_key}:{api_secret}".encode()).decode()}'
+        )
+        self.interruptor = InterruptorCircuito(umbral_fallos, segundos_apertura)
+
+    def etiquetar(self, **argumentos_peticion):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Envía una imagen al endpoint de etiquetado
+        Argumentos entrada:
+            **argumentos_peticion: Argumentos para Session.post (data, files...)
+        Returns:
+            dict: Respuesta JSON de Imagga
+        Raises:
+            CircuitoAbiertoError: Si Imagga está marcado como caído
+        Modificaciones: Ninguna
+        """
+        self.interruptor.permitir()
+
+        try:
+            respuesta = self.sesion.post(
+                self.endpoint,
+                timeout=self.timeout,
+                **argumentos_peticion
+            )
+        except requests.RequestException:
+            self.interruptor.registrar_fallo()
+            raise
+
+        if respuesta.status_code in ESTADOS_REINTENTABLES:
+            self.interruptor.registrar_fallo()
+        else:
+            self.interruptor.registrar_exito()
+
+        respuesta.raise_for_status()
+        return respuesta.json()
+
+    def close(self):
+        """Cierra las conexiones abiertas de la sesión"""
+        self.sesion.close()
+
+
+pool_clientes_imagga = PoolClientes(ClienteImagga)
+
+# Un pool de hilos por proveedor: un proveedor lento solo agota sus propios hilos
+pool_ejecutores_proveedores = {
+    proveedor: PoolClientes(
+        lambda hilos, proveedor=proveedor: ThreadPoolExecutor(
+            max_workers=hilos, thread_name_prefix=f'proveedor_{proveedor}'
+        )
+    )
+    for proveedor in ('google', 'imagga')
+}
+
 
 class ServicioIA:
     """
@@ -21,29 +143,51 @@ class ServicioIA:
     Descripción: Clase para gestionar análisis de imágenes con IA
     """
     
+    PROVEEDORES = ('google', 'imagga')
+    PROVEEDOR_MULTIPLE = 'ambos'
+    
     @staticmethod
-    def analizar_con_google(ruta_imagen):
+    def obtener_cliente_google():
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Obtiene un cliente de Google Vision del pool del proceso
+        Argumentos entrada: Ninguno
+        Returns:
+            vision.ImageAnnotatorClient: Cliente reutilizable
+        Modificaciones: Ninguna
+        """
+        return pool_clientes_google.obtener(
+            current_app.config['CREDENCIALES_GOOGLE'],
+            tamano=current_app.config.get('GOOGLE_VISION_CANALES', 1)
+        )
+
+    @staticmethod
+    def analizar_con_google(ruta_imagen, max_resultados=10):
         """
         Autor: Steeven Vargas
         Fecha: Noviembre 2024
         Descripción: Analiza imagen usando Google Cloud Vision API
         Argumentos entrada:
             ruta_imagen (str): Ruta al archivo de imagen
+            max_resultados (int): Número máximo de etiquetas
         Returns:
             list: Lista de etiquetas con confianza
-        Modificaciones: Ninguna
+        Modificaciones: Cliente reutilizado desde el pool del proceso
         """
         try:
-            os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = current_app.config['CREDENCIALES_GOOGLE']
-            
-            cliente = vision.ImageAnnotatorClient()
+            cliente = ServicioIA.obtener_cliente_google()
             
             with open(ruta_imagen, 'rb') as archivo_imagen:
                 contenido = archivo_imagen.read()
             
             imagen = vision.Image(content=contenido)
             
-            respuesta = cliente.label_detection(image=imagen, max_results=10)
+            respuesta = cliente.label_detection(
+                image=imagen,
+                max_results=max_resultados,
+                timeout=current_app.config.get('GOOGLE_VISION_TIMEOUT', 30)
+            )
             etiquetas_raw = respuesta.label_annotations
             
             etiquetas = []
@@ -59,41 +203,54 @@ class ServicioIA:
             raise Exception(f"Error al analizar con Google Vision: {str(e)}")
     
     @staticmethod
-    def analizar_con_imagga(ruta_imagen):
+    def obtener_cliente_imagga():
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Obtiene el cliente de Imagga del worker actual
+        Argumentos entrada: Ninguno
+        Returns:
+            ClienteImagga: Cliente reutilizable
+        Modificaciones: Ninguna
+        """
+        config = current_app.config
+        return pool_clientes_imagga.obtener(
+            config['IMAGGA_ENDPOINT'],
+            config['IMAGGA_API_KEY'],
+            config['IMAGGA_API_SECRET'],
+            config.get('IMAGGA_TAMANO_POOL', 10),
+            config.get('IMAGGA_REINTENTOS', 3),
+            config.get('IMAGGA_FACTOR_BACKOFF', 0.5),
+            config.get('IMAGGA_UMBRAL_FALLOS', 5),
+            config.get('IMAGGA_SEGUNDOS_APERTURA', 30),
+            config.get('IMAGGA_TIMEOUT', 30)
+        )
+
+    @staticmethod
+    def analizar_con_imagga(ruta_imagen, max_resultados=10):
         """
         Autor: Steeven Vargas
         Fecha: Noviembre 2024
         Descripción: Analiza imagen usando Imagga API
         Argumentos entrada:
             ruta_imagen (str): Ruta al archivo de imagen
+            max_resultados (int): Número máximo de etiquetas
         Returns:
             list: Lista de etiquetas con confianza
-        Modificaciones: Ninguna
+        Modificaciones: Sesión HTTP reutilizada; envío multipart por bloques en lugar de base64
         """
         try:
-            api_key = current_app.config['IMAGGA_API_KEY']
-            api_secret = current_app.config['IMAGGA_API_SECRET']
-            endpoint = current_app.config['IMAGGA_ENDPOINT']
+            cliente = ServicioIA.obtener_cliente_imagga()
             
-            with open(ruta_imagen, 'rb') as archivo_imagen:
-                contenido_imagen = base64.b64encode(archivo_imagen.read()).decode('utf-8')
-            
-            headers = {
-                'Authorization': f'Basic {base64.b64encode(f"{api_key}:{api_secret}".encode()).decode()}'
-            }
-            
-            datos = {
-                'image_base64': contenido_imagen
-            }
-            
-            respuesta = requests.post(endpoint, headers=headers, data=datos, timeout=30)
-            respuesta.raise_for_status()
-            
-            resultado = respuesta.json()
+            with CuerpoMultipart('image', ruta_imagen) as cuerpo:
+                resultado = cliente.etiquetar(
+                    data=cuerpo,
+                    headers={'Content-Type': cuerpo.content_type}
+                )
             
             etiquetas = []
             if 'result' in resultado and 'tags' in resultado['result']:
-                for tag in resultado['result']['tags'][:10]:
+                for tag in resultado['result']['tags'][:max_resultados]:
                     etiquetas.append({
                         'etiqueta': tag['tag']['es'] if 'es' in tag['tag'] else tag['tag']['en'],
                         'confianza': round(tag['confidence'] / 100, 2)
@@ -101,25 +258,239 @@ class ServicioIA:
             
             return etiquetas
             
+        except CircuitoAbiertoError:
+            raise
         except Exception as e:
             raise Exception(f"Error al analizar con Imagga: {str(e)}")
     
     @staticmethod
-    def analizar_imagen(ruta_imagen, proveedor='google'):
+    def obtener_cache():
         """
         Autor: Steeven Vargas
         Fecha: Noviembre 2024
-        Descripción: Analiza imagen con el proveedor especificado
+        Descripción: Obtiene la caché de resultados registrada en la aplicación actual
+        Argumentos entrada: Ninguno
+        Returns:
+            CacheResultadosIA o None: Caché de la aplicación, None si está deshabilitada
+        Modificaciones: Ninguna
+        """
+        return current_app.extensions.get('cache_ia')
+
+    @staticmethod
+    def analizar_sin_cache(ruta_imagen, proveedor='google', max_resultados=10):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Analiza imagen llamando directamente al proveedor especificado
         Argumentos entrada:
             ruta_imagen (str): Ruta al archivo de imagen
             proveedor (str): 'google' o 'imagga'
+            max_resultados (int): Número máximo de etiquetas
         Returns:
             list: Lista de etiquetas con confianza
         Modificaciones: Ninguna
         """
         if proveedor == 'google':
-            return ServicioIA.analizar_con_google(ruta_imagen)
+            return ServicioIA.analizar_con_google(ruta_imagen, max_resultados)
         elif proveedor == 'imagga':
-            return ServicioIA.analizar_con_imagga(ruta_imagen)
+            return ServicioIA.analizar_con_imagga(ruta_imagen, max_resultados)
         else:
             raise ValueError(f"Proveedor no válido: {proveedor}. Use 'google' o 'imagga'")
+
+    @staticmethod
+    def analizar_imagen(ruta_imagen, proveedor='google', max_resultados=None):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Analiza imagen con el proveedor especificado. Los resultados se
+                     almacenan en caché por contenido, de modo que una imagen repetida
+                     no vuelve a llamar al proveedor.
+        Argumentos entrada:
+            ruta_imagen (str): Ruta al archivo de imagen
+            proveedor (str): 'google' o 'imagga'
+            max_resultados (int): Número máximo de etiquetas (por defecto MAX_RESULTADOS_IA)
+        Returns:
+            list: Lista de etiquetas con confianza
+        Modificaciones: Caché de resultados por SHA-256 del contenido
+        """
+        if proveedor not in ('google', 'imagga'):
+            raise ValueError(f"Proveedor no válido: {proveedor}. Use 'google' o 'imagga'")
+
+        if max_resultados is None:
+            max_resultados = current_app.config.get('MAX_RESULTADOS_IA', 10)
+
+        cache = ServicioIA.obtener_cache()
+        if cache is None:
+            return ServicioIA.analizar_sin_cache(ruta_imagen, proveedor, max_resultados)
+
+        clave = CacheResultadosIA.calcular_clave(
+            calcular_hash_archivo(ruta_imagen),
+            proveedor,
+            max_resultados
+        )
+
+        etiquetas = cache.obtener(clave)
+        if etiquetas is not None:
+            return etiquetas
+
+        etiquetas = ServicioIA.analizar_sin_cache(ruta_imagen, proveedor, max_resultados)
+        cache.guardar(clave, etiquetas)
+
+        return etiquetas
+
+    @staticmethod
+    def normalizar_proveedores(proveedor):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Convierte el proveedor solicitado en una lista de proveedores
+        Argumentos entrada:
+            proveedor (str o list): 'google', 'imagga', 'ambos', 'google,imagga' o lista
+        Returns:
+            list: Proveedores sin duplicados, en orden de PROVEEDORES
+        Raises:
+            ValueError: Si algún proveedor no es válido
+        Modificaciones: Ninguna
+        """
+        if isinstance(proveedor, str):
+            proveedor = proveedor.lower().strip()
+            if proveedor == ServicioIA.PROVEEDOR_MULTIPLE:
+                return list(ServicioIA.PROVEEDORES)
+            solicitados = [p.strip() for p in proveedor.split(',') if p.strip()]
+        else:
+            solicitados = [str(p).lower().strip() for p in proveedor or []]
+
+        invalidos = [p for p in solicitados if p not in ServicioIA.PROVEEDORES]
+        if not solicitados or invalidos:
+            raise ValueError(
+                f"Proveedor no válido: {', '.join(invalidos) or proveedor}. "
+                f"Use 'google', 'imagga' o 'ambos'"
+            )
+
+        return [p for p in ServicioIA.PROVEEDORES if p in solicitados]
+
+    @staticmethod
+    def nombre_proveedor(proveedores):
+        """Nombre con el que se registra el análisis: el proveedor o 'ambos'"""
+        return proveedores[0] if len(proveedores) == 1 else ServicioIA.PROVEEDOR_MULTIPLE
+
+    @staticmethod
+    def analizar_en_paralelo(ruta_imagen, proveedores, max_resultados=None):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Analiza la misma imagen con varios proveedores a la vez. Cada
+                     proveedor tiene su propio timeout y su propio pool de hilos
+                     (HILOS_POR_PROVEEDOR), de modo que las llamadas que siguen en
+                     curso tras agotar el timeout no quitan hilos al otro
+                     proveedor; la latencia total es la del más lento, no la suma.
+        Argumentos entrada:
+            ruta_imagen (str): Ruta al archivo de imagen
+            proveedores (list): Proveedores a consultar
+            max_resultados (int): Número máximo de etiquetas por proveedor
+        Returns:
+            dict: {proveedor: {'etiquetas': list, 'error': str o None, 'duracion_ms': int}}
+        Raises:
+            CircuitoAbiertoError: Si todos fallan porque su circuito está abierto
+            Exception: Si todos los proveedores fallan
+        Modificaciones: Ninguna
+        """
+        app = current_app._get_current_object()
+        timeouts = {
+            'google': app.config.get('GOOGLE_VISION_TIMEOUT', 30),
+            'imagga': app.config.get('IMAGGA_TIMEOUT', 30)
+        }
+
+        def analizar(proveedor):
+            inicio = time.perf_counter()
+            with app.app_context():
+                etiquetas = ServicioIA.analizar_imagen(ruta_imagen, proveedor, max_resultados)
+            return etiquetas, int((time.perf_counter() - inicio) * 1000)
+
+        hilos = app.config.get('HILOS_POR_PROVEEDOR', 4)
+        inicio = time.monotonic()
+        futuros = {
+            proveedor: pool_ejecutores_proveedores[proveedor].obtener(hilos).submit(analizar, proveedor)
+            for proveedor in proveedores
+        }
+
+        resultados = {}
+        circuitos_abiertos = {}
+        for proveedor, futuro in futuros.items():
+            restante = max(0, inicio + timeouts[proveedor] - time.monotonic())
+            try:
+                etiquetas, duracion_ms = futuro.result(timeout=restante)
+                resultados[proveedor] = {'etiquetas': etiquetas, 'error': None, 'duracion_ms': duracion_ms}
+            except TimeoutFuturo:
+                futuro.cancel()
+                resultados[proveedor] = {
+                    'etiquetas': [],
+                    'error': f"Tiempo de espera agotado ({timeouts[proveedor]} s)",
+                    'duracion_ms': int(timeouts[proveedor] * 1000)
+                }
+            except CircuitoAbiertoError as e:
+                circuitos_abiertos[proveedor] = e
+                resultados[proveedor] = {'etiquetas': [], 'error': str(e), 'duracion_ms': 0}
+            except Exception as e:
+                resultados[proveedor] = {
+                    'etiquetas': [],
+                    'error': str(e),
+                    'duracion_ms': int((time.monotonic() - inicio) * 1000)
+                }
+
+        if len(circuitos_abiertos) == len(resultados):
+            raise CircuitoAbiertoError(
+                "Proveedores no disponibles temporalmente",
+                reintentar_en=min(e.reintentar_en for e in circuitos_abiertos.values())
+            )
+
+        if all(resultado['error'] for resultado in resultados.values()):
+            errores = '; '.join(f"{p}: {r['error']}" for p, r in resultados.items())
+            raise Exception(f"Todos los proveedores fallaron. {errores}")
+
+        return resultados
+
+    @staticmethod
+    def combinar_etiquetas(resultados_proveedores, max_resultados=None):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Une las etiquetas de varios proveedores en un solo ranking.
+                     La confianza combinada es la suma de confianzas dividida por el
+                     número de proveedores que respondieron, de modo que una
+                     etiqueta detectada por todos queda por encima.
+        Argumentos entrada:
+            resultados_proveedores (dict): Salida de analizar_en_paralelo
+            max_resultados (int): Número máximo de etiquetas combinadas
+        Returns:
+            list: Etiquetas con 'etiqueta', 'confianza' y 'proveedores'
+        Modificaciones: Ninguna
+        """
+        if max_resultados is None:
+            max_resultados = current_app.config.get('MAX_RESULTADOS_IA', 10)
+
+        exitosos = {p: r for p, r in resultados_proveedores.items() if not r['error']}
+        combinadas = {}
+
+        for proveedor, resultado in exitosos.items():
+            for etiqueta in resultado['etiquetas']:
+                clave = etiqueta['etiqueta'].strip().lower()
+                entrada = combinadas.setdefault(clave, {
+                    'etiqueta': etiqueta['etiqueta'],
+                    'suma': 0.0,
+                    'proveedores': []
+                })
+                entrada['suma'] += etiqueta['confianza']
+                entrada['proveedores'].append(proveedor)
+
+        total = max(1, len(exitosos))
+        ranking = sorted(
+            combinadas.values(),
+            key=lambda entrada: (-entrada['suma'], entrada['etiqueta'])
+        )
+
+        return [{
+            'etiqueta': entrada['etiqueta'],
+            'confianza': round(entrada['suma'] / total, 2),
+            'proveedores': entrada['proveedores']
+        } for entrada in ranking[:max_resultados]]
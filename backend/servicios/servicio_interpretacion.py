@@ -4,8 +4,10 @@ Fecha: Noviembre 2024
 Descripción: Servicio para traducir e interpretar resultados de análisis de IA
 """
 
-import requests
+from concurrent.futures import ThreadPoolExecutor
+
 from deep_translator import GoogleTranslator
+from flask import current_app, has_app_context
 
 
 class ServicioInterpretacion:
@@ -13,47 +15,150 @@ class ServicioInterpretacion:
     Servicio para traducir etiquetas y generar interpretaciones de resultados
     """
 
+    SEPARADOR_LOTE = '\n'
+    MAX_HILOS_TRADUCCION = 8
+
     @staticmethod
-    def traducir_etiquetas(etiquetas):
+    def crear_traductor():
         """
-        Traduce una lista de etiquetas de inglés a español
+        Crea un traductor inglés → español. Cada hilo debe usar su propia
+        instancia porque GoogleTranslator guarda el texto en estado interno.
+
+        Returns:
+            GoogleTranslator: Traductor configurado
+        """
+        return GoogleTranslator(source='en', target='es')
+
+    @staticmethod
+    def traducir_lote(textos):
+        """
+        Traduce varios textos con una sola llamada de red, uniéndolos por líneas.
+        Si la respuesta no conserva el número de líneas, o la llamada falla,
+        traduce cada texto de forma concurrente.
+
+        Args:
+            textos (list): Textos en inglés
+
+        Returns:
+            list: Traducciones en el mismo orden; None donde la traducción falló
+        """
+        if not textos:
+            return []
+
+        try:
+            traduccion = ServicioInterpretacion.crear_traductor().translate(
+                ServicioInterpretacion.SEPARADOR_LOTE.join(textos)
+            )
+            lineas = (traduccion or '').split(ServicioInterpretacion.SEPARADOR_LOTE)
+            if len(lineas) == len(textos) and all(linea.strip() for linea in lineas):
+                return [linea.strip() for linea in lineas]
+        except Exception:
+            pass
+
+        return ServicioInterpretacion.traducir_concurrente(textos)
+
+    @staticmethod
+    def traducir_concurrente(textos):
+        """
+        Traduce cada texto en paralelo (una llamada por texto)
+
+        Args:
+            textos (list): Textos en inglés
+
+        Returns:
+            list: Traducciones en el mismo orden; None donde la traducción falló
+        """
+        def traducir(texto):
+            try:
+                return ServicioInterpretacion.crear_traductor().translate(texto)
+            except Exception:
+                return None
+
+        if len(textos) == 1:
+            return [traducir(textos[0])]
+
+        hilos = min(ServicioInterpretacion.MAX_HILOS_TRADUCCION, len(textos))
+        with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+            return list(ejecutor.map(traducir, textos))
+
+    @staticmethod
+    def obtener_diccionario():
+        """
+        Obtiene el diccionario persistente de traducciones de la aplicación
+
+        Returns:
+            DiccionarioTraducciones o None: None fuera de un contexto de aplicación
+        """
+        if not has_app_context():
+            return None
+        return current_app.extensions.get('diccionario_traducciones')
+
+    @staticmethod
+    def traducir_terminos(terminos):
+        """
+        Traduce términos consultando primero el diccionario persistente; solo los
+        términos desconocidos se envían al traductor y luego se registran.
+
+        Args:
+            terminos (list): Términos en inglés
+
+        Returns:
+            dict: {termino: traduccion o None si falló}
+        """
+        diccionario = ServicioInterpretacion.obtener_diccionario()
+
+        conocidas = {}
+        if diccionario is not None:
+            try:
+                conocidas = diccionario.buscar(terminos)
+            except Exception:
+                conocidas = {}
+
+        faltantes = list(dict.fromkeys(t for t in terminos if t not in conocidas))
+        nuevas = dict(zip(faltantes, ServicioInterpretacion.traducir_lote(faltantes)))
+
+        if diccionario is not None and any(nuevas.values()):
+            try:
+                diccionario.guardar(nuevas)
+            except Exception:
+                pass
+
+        conocidas.update(nuevas)
+        return conocidas
+
+    @staticmethod
+    def traducir_etiquetas(etiquetas, traducciones=None):
+        """
+        Traduce una lista de etiquetas de inglés a español. Los términos ya
+        conocidos salen del diccionario; los nuevos se traducen en un único lote.
+        Las etiquetas que no se puedan traducir conservan su nombre original.
 
         Args:
             etiquetas (list): Lista de dicts con 'etiqueta' y 'confianza'
+            traducciones (dict): Traducciones ya obtenidas con traducir_terminos;
+                si se indican no se consulta el diccionario ni el traductor
 
         Returns:
             list: Lista de etiquetas traducidas
         """
-        try:
-            translator = GoogleTranslator(source='en', target='es')
-            etiquetas_traducidas = []
-
-            for etiqueta in etiquetas:
-                try:
-                    confianza_porcentaje = int(etiqueta['confianza'] * 100)
-
-                    nombre_traducido = translator.translate(etiqueta['etiqueta'])
-                    etiquetas_traducidas.append({
-                        'nombre': nombre_traducido.capitalize(),
-                        'nombre_original': etiqueta['etiqueta'],
-                        'confianza': confianza_porcentaje
-                    })
-                except Exception as e:
-                    confianza_porcentaje = int(etiqueta['confianza'] * 100)
-                    etiquetas_traducidas.append({
-                        'nombre': etiqueta['etiqueta'].capitalize(),
-                        'nombre_original': etiqueta['etiqueta'],
-                        'confianza': confianza_porcentaje
-                    })
-
-            return etiquetas_traducidas
-
-        except Exception as e:
-            return [{
-                'nombre': etiqueta['etiqueta'].capitalize(),
+        if traducciones is None:
+            try:
+                traducciones = ServicioInterpretacion.traducir_terminos(
+                    [etiqueta['etiqueta'] for etiqueta in etiquetas]
+                )
+            except Exception:
+                traducciones = {}
+
+        etiquetas_traducidas = []
+        for etiqueta in etiquetas:
+            nombre_traducido = traducciones.get(etiqueta['etiqueta'])
+            etiquetas_traducidas.append({
+                'nombre': (nombre_traducido or etiqueta['etiqueta']).capitalize(),
                 'nombre_original': etiqueta['etiqueta'],
                 'confianza': int(etiqueta['confianza'] * 100)
-            } for etiqueta in etiquetas]
+            })
+
+        return etiquetas_traducidas
 
     @staticmethod
     def generar_interpretacion(proveedor, etiquetas_traducidas):
@@ -75,7 +180,8 @@ class ServicioInterpretacion:
 
         nombre_proveedor = {
             'google': 'Google Cloud Vision',
-            'imagga': 'Imagga'
+            'imagga': 'Imagga',
+            'ambos': 'Google Cloud Vision e Imagga'
         }.get(proveedor.lower(), proveedor.upper())
 
         interpretacion = f"Según el modelo {nombre_proveedor}, con un {confianza_principal}% de confianza "
@@ -98,18 +204,19 @@ class ServicioInterpretacion:
         return interpretacion
 
     @staticmethod
-    def procesar_resultados(proveedor, etiquetas):
+    def procesar_resultados(proveedor, etiquetas, traducciones=None):
         """
         Procesa los resultados completos: traduce e interpreta
 
         Args:
             proveedor (str): Nombre del proveedor de IA
             etiquetas (list): Lista de etiquetas originales
+            traducciones (dict): Traducciones ya obtenidas (ver traducir_etiquetas)
 
         Returns:
             dict: Resultados procesados con traducción e interpretación
         """
-        etiquetas_traducidas = ServicioInterpretacion.traducir_etiquetas(etiquetas)
+        etiquetas_traducidas = ServicioInterpretacion.traducir_etiquetas(etiquetas, traducciones)
 
         interpretacion = ServicioInterpretacion.generar_interpretacion(
             proveedor,
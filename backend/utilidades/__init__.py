@@ -10,6 +10,7 @@ from .validadores import (
     validar_nombre_usuario,
     validar_tipo_archivo,
     validar_tamano_archivo,
+    validar_contenido_imagen,
     es_imagen_valida
 )
 
@@ -30,6 +31,7 @@ __all__ = [
     'validar_nombre_usuario',
     'validar_tipo_archivo',
     'validar_tamano_archivo',
+    'validar_contenido_imagen',
     'es_imagen_valida',
     'requiere_autenticacion',
     'requiere_json',
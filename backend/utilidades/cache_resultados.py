@@ -0,0 +1,308 @@
+"""
+Autor: Steeven Vargas
+Fecha: Noviembre 2024
+Descripción: Caché de resultados de análisis de IA direccionada por contenido.
+             Nivel 1: LRU acotado en memoria del proceso.
+             Nivel 2: SQLite en disco con TTL y desalojo por último acceso.
+Argumentos entrada: Ninguno
+Returns: Clases CacheLRU, CacheDisco y CacheResultadosIA
+Modificaciones: Ninguna
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+
+
+TAMANO_BLOQUE_HASH = 64 * 1024
+
+
+def calcular_hash_archivo(ruta_archivo):
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Calcula el SHA-256 del contenido de un archivo leyéndolo por bloques
+    Argumentos entrada:
+        ruta_archivo (str): Ruta al archivo
+    Returns:
+        str: Hash SHA-256 en hexadecimal
+    Modificaciones: Ninguna
+    """
+    hash_sha256 = hashlib.sha256()
+    with open(ruta_archivo, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(TAMANO_BLOQUE_HASH), b''):
+            hash_sha256.update(bloque)
+    return hash_sha256.hexdigest()
+
+
+class CacheLRU:
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Caché LRU acotada y segura entre hilos con TTL por entrada.
+                 Los valores se retornan por referencia: guardar solo valores
+                 inmutables (CacheResultadosIA guarda las etiquetas como JSON)
+    """
+
+    def __init__(self, tamano_maximo=256, ttl_segundos=None):
+        """Constructor de la caché LRU"""
+        self.tamano_maximo = tamano_maximo
+        self.ttl_segundos = ttl_segundos
+        self._entradas = OrderedDict()
+        self._candado = threading.Lock()
+
+    def obtener(self, clave):
+        """Retorna el valor almacenado o None si no existe o expiró"""
+        with self._candado:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return None
+
+            valor, expira = entrada
+            if expira is not None and expira < time.monotonic():
+                del self._entradas[clave]
+                return None
+
+            self._entradas.move_to_end(clave)
+            return valor
+
+    def guardar(self, clave, valor):
+        """Almacena un valor desalojando la entrada menos usada si se excede el tamaño"""
+        if self.tamano_maximo <= 0:
+            return
+
+        expira = time.monotonic() + self.ttl_segundos if self.ttl_segundos else None
+
+        with self._candado:
+            self._entradas[clave] = (valor, expira)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.tamano_maximo:
+                self._entradas.popitem(last=False)
+
+    def eliminar(self, clave):
+        """Elimina una entrada si existe"""
+        with self._candado:
+            self._entradas.pop(clave, None)
+
+    def limpiar(self):
+        """Elimina todas las entradas"""
+        with self._candado:
+            self._entradas.clear()
+
+    def __len__(self):
+        return len(self._entradas)
+
+
+class CacheDisco:
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Caché persistente en SQLite con TTL y número máximo de entradas
+    """
+
+    def __init__(self, ruta_bd, ttl_segundos=7 * 24 * 3600, max_entradas=10000, tabla='cache_resultados'):
+        """Constructor de la caché en disco. Crea la tabla si no existe"""
+        self.ruta_bd = ruta_bd
+        self.ttl_segundos = ttl_segundos
+        self.max_entradas = max_entradas
+        self.tabla = tabla
+
+        with closing(self._conectar()) as conexion, conexion:
+            conexion.execute('PRAGMA journal_mode=WAL')
+            conexion.execute(
+                f'CREATE TABLE IF NOT EXISTS {self.tabla} ('
+                'clave TEXT PRIMARY KEY, '
+                'valor TEXT NOT NULL, '
+                'creado REAL NOT NULL, '
+                'accedido REAL NOT NULL)'
+            )
+            conexion.execute(
+                f'CREATE INDEX IF NOT EXISTS ix_{self.tabla}_accedido '
+                f'ON {self.tabla} (accedido)'
+            )
+
+    def _conectar(self):
+        """Abre una conexión nueva; cada operación usa la suya para ser segura entre hilos"""
+        return sqlite3.connect(self.ruta_bd, timeout=5)
+
+    def obtener(self, clave):
+        """Retorna el valor deserializado o None si no existe o expiró"""
+        ahora = time.time()
+        with closing(self._conectar()) as conexion, conexion:
+            fila = conexion.execute(
+                f'SELECT valor, creado FROM {self.tabla} WHERE clave = ?',
+                (clave,)
+            ).fetchone()
+
+            if fila is None:
+                return None
+
+            valor, creado = fila
+            if self.ttl_segundos and ahora - creado > self.ttl_segundos:
+                conexion.execute(f'DELETE FROM {self.tabla} WHERE clave = ?', (clave,))
+                return None
+
+            conexion.execute(
+                f'UPDATE {self.tabla} SET accedido = ? WHERE clave = ?',
+                (ahora, clave)
+            )
+            return json.loads(valor)
+
+    def guardar(self, clave, valor):
+        """Almacena un valor y aplica expiración y desalojo"""
+        ahora = time.time()
+        with closing(self._conectar()) as conexion, conexion:
+            conexion.execute(
+                f'INSERT OR REPLACE INTO {self.tabla} (clave, valor, creado, accedido) '
+                'VALUES (?, ?, ?, ?)',
+                (clave, json.dumps(valor, ensure_ascii=False), ahora, ahora)
+            )
+            self._desalojar(conexion, ahora)
+
+    def _desalojar(self, conexion, ahora):
+        """Elimina entradas expiradas y las menos usadas por encima del máximo"""
+        if self.ttl_segundos:
+            conexion.execute(
+                f'DELETE FROM {self.tabla} WHERE creado < ?',
+                (ahora - self.ttl_segundos,)
+            )
+
+        if self.max_entradas:
+            conexion.execute(
+                f'DELETE FROM {self.tabla} WHERE clave IN ('
+                f'SELECT clave FROM {self.tabla} ORDER BY accedido DESC '
+                'LIMIT -1 OFFSET ?)',
+                (self.max_entradas,)
+            )
+
+    def limpiar(self):
+        """Elimina todas las entradas"""
+        with closing(self._conectar()) as conexion, conexion:
+            conexion.execute(f'DELETE FROM {self.tabla}')
+
+
+class CacheResultadosIA:
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Caché de dos niveles para resultados de proveedores de IA,
+                 con clave (SHA-256 de la imagen, proveedor, max_resultados)
+    """
+
+    def __init__(self, tamano_memoria=256, ruta_bd=None, ttl_segundos=7 * 24 * 3600,
+                 max_entradas_disco=10000):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Constructor de la caché de resultados
+        Argumentos entrada:
+            tamano_memoria (int): Entradas máximas del nivel en memoria
+            ruta_bd (str): Ruta del archivo SQLite; None deshabilita el nivel en disco
+            ttl_segundos (int): Tiempo de vida de cada resultado
+            max_entradas_disco (int): Entradas máximas del nivel en disco
+        Returns: Instancia de CacheResultadosIA
+        Modificaciones: Ninguna
+        """
+        self.memoria = CacheLRU(tamano_memoria, ttl_segundos)
+        self.disco = CacheDisco(ruta_bd, ttl_segundos, max_entradas_disco) if ruta_bd else None
+
+        self._candado = threading.Lock()
+        self.aciertos_memoria = 0
+        self.aciertos_disco = 0
+        self.fallos = 0
+
+    @staticmethod
+    def calcular_clave(hash_contenido, proveedor, max_resultados):
+        """Construye la clave de caché a partir del hash y los parámetros del análisis"""
+        return f'{hash_contenido}:{proveedor}:{max_resultados}'
+
+    def _contar(self, contador):
+        with self._candado:
+            setattr(self, contador, getattr(self, contador) + 1)
+
+    def obtener(self, clave):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Busca un resultado en memoria y luego en disco. Cada acierto
+                     retorna una copia nueva, que el llamador puede modificar
+        Argumentos entrada:
+            clave (str): Clave de caché
+        Returns:
+            list o None: Etiquetas almacenadas o None si no hay acierto
+        Modificaciones: Ninguna
+        """
+        texto = self.memoria.obtener(clave)
+        if texto is not None:
+            self._contar('aciertos_memoria')
+            return json.loads(texto)
+
+        if self.disco is not None:
+            try:
+                valor = self.disco.obtener(clave)
+            except sqlite3.Error:
+                valor = None
+
+            if valor is not None:
+                self.memoria.guardar(clave, json.dumps(valor))
+                self._contar('aciertos_disco')
+                return valor
+
+        self._contar('fallos')
+        return None
+
+    def guardar(self, clave, valor):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Almacena un resultado en ambos niveles. En memoria se guarda
+                     como JSON, de modo que modificar la lista después no altera
+                     la caché. Un fallo del disco no interrumpe el análisis.
+        Argumentos entrada:
+            clave (str): Clave de caché
+            valor (list): Etiquetas a almacenar
+        Returns: None
+        Modificaciones: Ninguna
+        """
+        self.memoria.guardar(clave, json.dumps(valor))
+
+        if self.disco is not None:
+            try:
+                self.disco.guardar(clave, valor)
+            except sqlite3.Error:
+                pass
+
+    def limpiar(self):
+        """Vacía ambos niveles y reinicia los contadores"""
+        self.memoria.limpiar()
+        if self.disco is not None:
+            self.disco.limpiar()
+        with self._candado:
+            self.aciertos_memoria = 0
+            self.aciertos_disco = 0
+            self.fallos = 0
+
+    def estadisticas(self):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Retorna los contadores de aciertos y fallos
+        Argumentos entrada: Ninguno
+        Returns:
+            dict: Contadores y tasa de aciertos
+        Modificaciones: Ninguna
+        """
+        with self._candado:
+            aciertos = self.aciertos_memoria + self.aciertos_disco
+            total = aciertos + self.fallos
+            return {
+                'aciertos_memoria': self.aciertos_memoria,
+                'aciertos_disco': self.aciertos_disco,
+                'fallos': self.fallos,
+                'tasa_aciertos': round(aciertos / total, 4) if total else 0.0,
+                'entradas_memoria': len(self.memoria)
+            }
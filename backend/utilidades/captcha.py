@@ -5,35 +5,373 @@ Descripción: Sistema de captcha matemático local (sin servicios externos)
              Genera operaciones matemáticas simples para validar usuarios
 Argumentos entrada: Ninguno
 Returns: Funciones de generación y validación de captcha
-Modificaciones: Ninguna
+Modificaciones: Modo sin estado (CAPTCHA_SIN_ESTADO): el token firmado con
+                HMAC contiene la respuesta cifrada y su vencimiento, y solo se
+                comparte entre workers el registro de tokens ya usados
 """
 
+import base64
+import hashlib
+import heapq
+import hmac
+import logging
 import random
 import secrets
-from datetime import datetime, timedelta
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
 
+from flask import current_app, has_app_context
 
-captchas_activos = {}
 
+registro = logging.getLogger(__name__)
 
-def limpiar_captchas_expirados():
+
+MAX_CAPTCHAS_ACTIVOS = 10000
+SEGUNDOS_EXPIRACION = 5 * 60
+
+
+class EntradaCaptcha:
+    """Respuesta esperada de un captcha; __slots__ evita un dict por entrada"""
+
+    __slots__ = ('respuesta', 'creado', 'intentos')
+
+    def __init__(self, respuesta, creado):
+        self.respuesta = respuesta
+        self.creado = creado
+        self.intentos = 0
+
+
+class AlmacenCaptchas:
     """
     Autor: Steeven Vargas
     Fecha: Noviembre 2024
-    Descripción: Elimina captchas expirados (más de 5 minutos)
-    Argumentos entrada: Ninguno
-    Returns: None
+    Descripción: Captchas activos en orden de creación con tamaño máximo.
+                 Como todos expiran tras el mismo tiempo, los expirados están
+                 siempre al inicio: la limpieza solo retira cabezas vencidas y
+                 no recorre el resto. Al llegar al máximo se descarta el más antiguo.
+    """
+
+    def __init__(self, max_entradas=MAX_CAPTCHAS_ACTIVOS, ttl_segundos=SEGUNDOS_EXPIRACION,
+                 reloj=time.monotonic):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Constructor del almacén
+        Argumentos entrada:
+            max_entradas (int): Captchas activos máximos
+            ttl_segundos (float): Segundos de validez de cada captcha
+            reloj (callable): Fuente de tiempo en segundos (inyectable en pruebas)
+        Returns: Instancia de AlmacenCaptchas
+        Modificaciones: Ninguna
+        """
+        self.max_entradas = max_entradas
+        self.ttl_segundos = ttl_segundos
+        self._reloj = reloj
+        self._candado = threading.Lock()
+        self._entradas = OrderedDict()
+
+    def agregar(self, token, respuesta):
+        """Registra un captcha nuevo, retirando expirados y el más antiguo si está lleno"""
+        with self._candado:
+            ahora = self._reloj()
+            self._limpiar_expirados(ahora)
+            while len(self._entradas) >= self.max_entradas:
+                self._entradas.popitem(last=False)
+            self._entradas[token] = EntradaCaptcha(respuesta, ahora)
+
+    def obtener(self, token):
+        """Retorna la entrada del captcha o None si no existe o expiró"""
+        with self._candado:
+            entrada = self._entradas.get(token)
+            if entrada is None:
+                return None
+            if self._reloj() - entrada.creado > self.ttl_segundos:
+                del self._entradas[token]
+                return None
+            return entrada
+
+    def eliminar(self, token):
+        """Elimina un captcha si existe"""
+        with self._candado:
+            self._entradas.pop(token, None)
+
+    def _limpiar_expirados(self, ahora):
+        """Retira los captchas vencidos del inicio (requiere el candado tomado)"""
+        limite = ahora - self.ttl_segundos
+        while self._entradas:
+            token, entrada = next(iter(self._entradas.items()))
+            if entrada.creado >= limite:
+                return
+            del self._entradas[token]
+
+    def limpiar(self):
+        """Elimina todos los captchas"""
+        with self._candado:
+            self._entradas.clear()
+
+    def __contains__(self, token):
+        return self.obtener(token) is not None
+
+    def __len__(self):
+        return len(self._entradas)
+
+
+captchas_activos = AlmacenCaptchas()
+
+
+class RegistroUsosMemoria:
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Tokens de captcha firmados ya usados, con un montículo por
+                 vencimiento. Solo se olvidan tokens ya expirados (que se
+                 rechazan de todos modos); si el registro está lleno de tokens
+                 vigentes, los nuevos se rechazan en lugar de olvidar un nonce
+                 que aún se podría reutilizar.
+    """
+
+    def __init__(self, max_entradas=100000, reloj=time.time):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Constructor del registro
+        Argumentos entrada:
+            max_entradas (int): Tokens vigentes máximos; con el registro lleno
+                                los tokens nuevos se rechazan
+            reloj (callable): Tiempo de pared en segundos
+        Returns: Instancia de RegistroUsosMemoria
+        Modificaciones: Ninguna
+        """
+        self.max_entradas = max_entradas
+        self._reloj = reloj
+        self._candado = threading.Lock()
+        self._usados = set()
+        self._vencimientos = []
+
+    def registrar(self, identificador, expira):
+        """
+        Marca un token como usado
+        Returns: True si es el primer uso; False si ya se usó, expiró o no hay cupo
+        """
+        with self._candado:
+            ahora = self._reloj()
+            if expira < ahora:
+                return False
+
+            while self._vencimientos and self._vencimientos[0][0] < ahora:
+                _, vencido = heapq.heappop(self._vencimientos)
+                self._usados.discard(vencido)
+
+            if identificador in self._usados:
+                return False
+
+            if len(self._usados) >= self.max_entradas:
+                registro.warning("Registro de captchas usados lleno; se rechaza el token")
+                return False
+
+            self._usados.add(identificador)
+            heapq.heappush(self._vencimientos, (expira, identificador))
+            return True
+
+    def __len__(self):
+        return len(self._usados)
+
+
+class RegistroUsosSQLite:
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Tokens de captcha usados en un archivo SQLite (modo WAL)
+                 compartido por los workers del host
+    """
+
+    PURGA_CADA = 1000
+
+    def __init__(self, ruta_bd, reloj=time.time):
+        """Constructor del registro. Crea la tabla si no existe"""
+        self.ruta_bd = ruta_bd
+        self._reloj = reloj
+        self._contador = 0
+
+        with closing(self._conectar()) as conexion:
+            conexion.execute('PRAGMA journal_mode=WAL')
+            conexion.execute(
+                'CREATE TABLE IF NOT EXISTS captchas_usados ('
+                'identificador TEXT PRIMARY KEY, '
+                'expira REAL NOT NULL)'
+            )
+            conexion.execute(
+                'CREATE INDEX IF NOT EXISTS ix_captchas_usados_expira '
+                'ON captchas_usados (expira)'
+            )
+
+    def _conectar(self):
+        """Abre una conexión nueva en modo autocommit; cada operación usa la suya"""
+        return sqlite3.connect(self.ruta_bd, timeout=5, isolation_level=None)
+
+    def registrar(self, identificador, expira):
+        """Marca un token como usado (ver RegistroUsosMemoria.registrar)"""
+        ahora = self._reloj()
+        if expira < ahora:
+            return False
+
+        self._contador += 1
+        with closing(self._conectar()) as conexion:
+            if self._contador % self.PURGA_CADA == 0:
+                conexion.execute('DELETE FROM captchas_usados WHERE expira < ?', (ahora,))
+            cursor = conexion.execute(
+                'INSERT OR IGNORE INTO captchas_usados (identificador, expira) VALUES (?, ?)',
+                (identificador, expira)
+            )
+            return cursor.rowcount == 1
+
+
+class RegistroUsosRedis:
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Tokens de captcha usados en Redis (SET NX con vencimiento)
+    """
+
+    def __init__(self, cliente, prefijo='captcha_usado:', reloj=time.time):
+        """Constructor del registro"""
+        self.cliente = cliente
+        self.prefijo = prefijo
+        self._reloj = reloj
+
+    def registrar(self, identificador, expira):
+        """Marca un token como usado (ver RegistroUsosMemoria.registrar)"""
+        segundos = int(expira - self._reloj())
+        if segundos < 0:
+            return False
+        return bool(self.cliente.set(f'{self.prefijo}{identificador}', 1, nx=True, ex=max(1, segundos)))
+
+
+def crear_registro_usos(backend='memoria', ruta_bd=None, url_redis=None):
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Crea el registro de captchas usados en el mismo almacén que el
+                 limitador de peticiones (LIMITADOR_BACKEND)
+    Argumentos entrada:
+        backend (str): 'memoria', 'sqlite' o 'redis'
+        ruta_bd (str): Archivo SQLite para el backend 'sqlite'
+        url_redis (str): URL de conexión para el backend 'redis'
+    Returns:
+        Registro con el método registrar(identificador, expira)
+    Raises:
+        ValueError: Si el backend no es válido o falta su configuración
     Modificaciones: Ninguna
     """
-    ahora = datetime.now()
-    captchas_expirados = []
-    
-    for token, datos in captchas_activos.items():
-        if ahora - datos['creado'] > timedelta(minutes=5):
-            captchas_expirados.append(token)
-    
-    for token in captchas_expirados:
-        del captchas_activos[token]
+    if backend == 'memoria':
+        return RegistroUsosMemoria()
+
+    if backend == 'sqlite':
+        if not ruta_bd:
+            raise ValueError("El backend 'sqlite' requiere LIMITADOR_RUTA_BD")
+        return RegistroUsosSQLite(ruta_bd)
+
+    if backend == 'redis':
+        if not url_redis:
+            raise ValueError("El backend 'redis' requiere LIMITADOR_URL_REDIS")
+        try:
+            import redis
+        except ImportError:
+            raise ValueError("El backend 'redis' requiere el paquete redis")
+        return RegistroUsosRedis(redis.Redis.from_url(url_redis))
+
+    raise ValueError(f"Backend no válido: {backend}. Use 'memoria', 'sqlite' o 'redis'")
+
+
+registro_usos = RegistroUsosMemoria()
+
+PREFIJO_FIRMADO = 'v1.'
+
+
+def captcha_sin_estado():
+    """Indica si los captchas se emiten como tokens firmados (CAPTCHA_SIN_ESTADO)"""
+    return has_app_context() and current_app.config.get('CAPTCHA_SIN_ESTADO', False)
+
+
+def obtener_registro_usos():
+    """Registro de tokens usados de la aplicación; sin aplicación, el del proceso"""
+    if has_app_context():
+        return current_app.extensions.get('registro_captchas', registro_usos)
+    return registro_usos
+
+
+def _firmar(texto):
+    """HMAC-SHA256 del texto con una clave derivada de SECRET_KEY"""
+    clave = f"captcha:{current_app.config['SECRET_KEY']}".encode('utf-8')
+    return hmac.new(clave, texto.encode('utf-8'), hashlib.sha256).digest()
+
+
+def _codificar(datos):
+    return base64.urlsafe_b64encode(datos).rstrip(b'=').decode('ascii')
+
+
+def firmar_captcha(respuesta, ahora=None):
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Crea un token de captcha sin estado:
+                 v1.<expira>.<nonce>.<resumen de la respuesta>.<firma>.
+                 El resumen es un HMAC de la respuesta, por lo que el cliente no
+                 puede deducirla aunque el rango de respuestas sea pequeño.
+    Argumentos entrada:
+        respuesta (int): Respuesta correcta
+        ahora (float): Tiempo actual (por defecto time.time())
+    Returns:
+        str: Token firmado
+    Modificaciones: Ninguna
+    """
+    expira = int((ahora if ahora is not None else time.time()) + SEGUNDOS_EXPIRACION)
+    nonce = secrets.token_urlsafe(12)
+    resumen = _codificar(_firmar(f'respuesta:{nonce}:{respuesta}')[:16])
+    cuerpo = f'{PREFIJO_FIRMADO}{expira}.{nonce}.{resumen}'
+    return f'{cuerpo}.{_codificar(_firmar(cuerpo))}'
+
+
+def validar_captcha_firmado(token, respuesta_usuario, ahora=None):
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Valida un token sin estado. Cada token admite un solo intento:
+                 se registra como usado antes de comparar la respuesta, así no
+                 se puede probar todo el rango de respuestas con el mismo token.
+    Argumentos entrada:
+        token (str): Token generado por firmar_captcha
+        respuesta_usuario (str o int): Respuesta del usuario
+        ahora (float): Tiempo actual (por defecto time.time())
+    Returns:
+        tuple: (bool exito, str mensaje)
+    Modificaciones: Ninguna
+    """
+    ahora = ahora if ahora is not None else time.time()
+    partes = token.split('.')
+    if len(partes) != 5 or not partes[1].isdigit():
+        return False, "Captcha inválido o expirado"
+
+    _, expira, nonce, resumen, firma = partes
+    cuerpo = token.rsplit('.', 1)[0]
+    if not hmac.compare_digest(firma, _codificar(_firmar(cuerpo))) or int(expira) < ahora:
+        return False, "Captcha inválido o expirado"
+
+    try:
+        respuesta_int = int(respuesta_usuario)
+    except (ValueError, TypeError):
+        return False, "Respuesta inválida"
+
+    if not obtener_registro_usos().registrar(nonce, int(expira)):
+        return False, "Captcha inválido o expirado"
+
+    if not hmac.compare_digest(resumen, _codificar(_firmar(f'respuesta:{nonce}:{respuesta_int}')[:16])):
+        return False, "Respuesta incorrecta. El captcha quedó inválido, genera uno nuevo"
+
+    return True, "Captcha validado correctamente"
 
 
 def generar_captcha():
@@ -48,14 +386,10 @@ def generar_captcha():
             'pregunta': str (operación matemática),
             'tipo': str (tipo de operación)
         }
-    Modificaciones: Ninguna
+    Modificaciones: Almacén acotado; la expiración ocurre al agregar.
+                    Con CAPTCHA_SIN_ESTADO el token es firmado y no se almacena.
+                    Sin print(): logging con nivel, sin respuestas ni tokens
     """
-    limpiar_captchas_expirados()
-
-    print(f"[CAPTCHA DEBUG] Generando nuevo captcha - Captchas activos antes: {len(captchas_activos)}")
-
-    token = secrets.token_urlsafe(32)
-    
     operaciones = ['suma', 'resta', 'multiplicacion']
     tipo_operacion = random.choice(operaciones)
     
@@ -77,14 +411,13 @@ def generar_captcha():
         respuesta = num1 * num2
         pregunta = f"¿Cuánto es {num1} × {num2}?"
     
-    captchas_activos[token] = {
-        'respuesta': respuesta,
-        'creado': datetime.now(),
-        'intentos': 0
-    }
+    if captcha_sin_estado():
+        token = firmar_captcha(respuesta)
+    else:
+        token = secrets.token_urlsafe(32)
+        captchas_activos.agregar(token, respuesta)
 
-    print(f"[CAPTCHA DEBUG] Captcha generado - Pregunta: '{pregunta}', Respuesta: {respuesta}, Token: {token[:20]}...")
-    print(f"[CAPTCHA DEBUG] Captchas activos después: {len(captchas_activos)}")
+    registro.debug("Captcha generado (%s); activos: %d", tipo_operacion, len(captchas_activos))
 
     return {
         'token': token,
@@ -103,39 +436,37 @@ def validar_captcha(token, respuesta_usuario):
         respuesta_usuario (int): Respuesta proporcionada por el usuario
     Returns:
         tuple: (bool exito, str mensaje)
-    Modificaciones: Ninguna
+    Modificaciones: Los tokens firmados se validan sin consultar captchas_activos.
+                    Sin print(): logging con nivel, sin respuestas ni tokens
     """
-    print(f"[CAPTCHA DEBUG] Validando captcha - Token: {token[:20]}..., Respuesta: {respuesta_usuario}")
-    print(f"[CAPTCHA DEBUG] Captchas activos: {len(captchas_activos)} tokens")
+    if token.startswith(PREFIJO_FIRMADO):
+        return validar_captcha_firmado(token, respuesta_usuario)
 
-    if token not in captchas_activos:
-        print(f"[CAPTCHA DEBUG] Token NO encontrado en captchas activos")
-        return False, "Captcha inválido o expirado"
+    datos_captcha = captchas_activos.obtener(token)
 
-    datos_captcha = captchas_activos[token]
-    print(f"[CAPTCHA DEBUG] Token encontrado - Respuesta esperada: {datos_captcha['respuesta']}, Intentos: {datos_captcha['intentos']}")
+    if datos_captcha is None:
+        registro.debug("Captcha no encontrado o expirado")
+        return False, "Captcha inválido o expirado"
 
-    if datos_captcha['intentos'] >= 3:
-        print(f"[CAPTCHA DEBUG] Demasiados intentos - eliminando token")
-        del captchas_activos[token]
+    if datos_captcha.intentos >= 3:
+        registro.info("Captcha descartado por demasiados intentos")
+        captchas_activos.eliminar(token)
         return False, "Demasiados intentos incorrectos"
 
-    datos_captcha['intentos'] += 1
+    datos_captcha.intentos += 1
 
     try:
         respuesta_int = int(respuesta_usuario)
-        print(f"[CAPTCHA DEBUG] Respuesta convertida a int: {respuesta_int}")
     except (ValueError, TypeError):
-        print(f"[CAPTCHA DEBUG] Error al convertir respuesta a int")
         return False, "Respuesta inválida"
 
-    if respuesta_int == datos_captcha['respuesta']:
-        print(f"[CAPTCHA DEBUG] ✓ Respuesta CORRECTA - eliminando token")
-        del captchas_activos[token]
+    if respuesta_int == datos_captcha.respuesta:
+        registro.debug("Captcha validado")
+        captchas_activos.eliminar(token)
         return True, "Captcha validado correctamente"
     else:
-        print(f"[CAPTCHA DEBUG] ✗ Respuesta INCORRECTA - Intentos restantes: {3 - datos_captcha['intentos']}")
-        return False, f"Respuesta incorrecta. Intentos restantes: {3 - datos_captcha['intentos']}"
+        registro.debug("Respuesta de captcha incorrecta; intentos: %d", datos_captcha.intentos)
+        return False, f"Respuesta incorrecta. Intentos restantes: {3 - datos_captcha.intentos}"
 
 
 def obtener_nuevo_captcha_si_falla(token_anterior):
@@ -149,7 +480,6 @@ def obtener_nuevo_captcha_si_falla(token_anterior):
         dict: Nuevo captcha
     Modificaciones: Ninguna
     """
-    if token_anterior in captchas_activos:
-        del captchas_activos[token_anterior]
+    captchas_activos.eliminar(token_anterior)
     
     return generar_captcha()
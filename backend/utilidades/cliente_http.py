@@ -0,0 +1,300 @@
+"""
+Autor: Steeven Vargas
+Fecha: Noviembre 2024
+Descripción: Utilidades HTTP para proveedores externos: sesiones con pool de
+             conexiones keep-alive, reintentos con backoff exponencial y jitter,
+             e interruptor de circuito para fallar rápido cuando el proveedor cae.
+Argumentos entrada: Ninguno
+Returns: crear_sesion_http, repartir_plazo, ReintentoConJitter, InterruptorCircuito,
+         CuerpoMultipart
+Modificaciones: Ninguna
+"""
+
+import os
+import random
+import secrets
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+ESTADOS_REINTENTABLES = (429, 500, 502, 503, 504)
+
+# Parte del plazo reservada a las esperas entre reintentos y, de cada intento,
+# parte dedicada a establecer la conexión (el resto es para la lectura)
+FRACCION_ESPERAS = 0.2
+FRACCION_CONEXION = 0.25
+
+
+class CircuitoAbiertoError(Exception):
+    """Se lanza cuando el interruptor está abierto y la llamada se rechaza sin intentarla"""
+
+    def __init__(self, mensaje, reintentar_en=1):
+        super().__init__(mensaje)
+        self.reintentar_en = reintentar_en
+
+
+class ReintentoConJitter(Retry):
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Política de reintentos de urllib3 con jitter completo sobre el
+                 backoff exponencial, para que los workers no reintenten a la vez
+    """
+
+    def get_backoff_time(self):
+        """Retorna un tiempo de espera aleatorio entre 0 y el backoff exponencial"""
+        backoff = super().get_backoff_time()
+        if backoff <= 0:
+            return 0
+        return random.uniform(0, backoff)
+
+    def get_retry_after(self, response):
+        """Retry-After del servidor, sin superar backoff_max"""
+        espera = super().get_retry_after(response)
+        if espera is None:
+            return None
+        return min(espera, self.backoff_max)
+
+
+def repartir_plazo(plazo, reintentos, factor_backoff):
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Reparte el plazo total de una llamada entre sus intentos y las
+                 esperas entre ellos, para que la llamada con todos sus
+                 reintentos no dure más que el plazo
+    Argumentos entrada:
+        plazo (float): Segundos máximos de la llamada completa
+        reintentos (int): Reintentos máximos
+        factor_backoff (float): Factor del backoff exponencial
+    Returns:
+        tuple: ((timeout conexión, timeout lectura) por intento, backoff_max)
+    Modificaciones: Ninguna
+    """
+    backoff_maximo = 0
+    if reintentos > 0:
+        backoff_maximo = min(
+            factor_backoff * 2 ** (reintentos - 1),
+            plazo * FRACCION_ESPERAS / reintentos
+        )
+
+    por_intento = (plazo - reintentos * backoff_maximo) / (reintentos + 1)
+    conexion = por_intento * FRACCION_CONEXION
+    return (conexion, por_intento - conexion), backoff_maximo
+
+
+def crear_sesion_http(tamano_pool=10, reintentos=3, factor_backoff=0.5,
+                      estados_reintentables=ESTADOS_REINTENTABLES, backoff_maximo=None):
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Crea una sesión de requests con pool de conexiones y reintentos
+    Argumentos entrada:
+        tamano_pool (int): Conexiones máximas por host mantenidas abiertas
+        reintentos (int): Reintentos máximos ante errores de conexión, 429 y 5xx
+        factor_backoff (float): Factor del backoff exponencial en segundos
+        estados_reintentables (tuple): Códigos HTTP que se reintentan
+        backoff_maximo (float): Espera máxima entre reintentos, también para
+                                Retry-After (por defecto la de urllib3)
+    Returns:
+        requests.Session: Sesión configurada
+    Modificaciones: Ninguna
+    """
+    politica_reintentos = ReintentoConJitter(
+        total=reintentos,
+        connect=reintentos,
+        read=reintentos,
+        status=reintentos,
+        backoff_factor=factor_backoff,
+        status_forcelist=estados_reintentables,
+        allowed_methods=None,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+        backoff_max=Retry.DEFAULT_BACKOFF_MAX if backoff_maximo is None else backoff_maximo
+    )
+
+    adaptador = HTTPAdapter(
+        pool_connections=tamano_pool,
+        pool_maxsize=tamano_pool,
+        max_retries=politica_reintentos
+    )
+
+    sesion = requests.Session()
+    sesion.mount('https://', adaptador)
+    sesion.mount('http://', adaptador)
+    sesion.headers['Connection'] = 'keep-alive'
+
+    return sesion
+
+
+class InterruptorCircuito:
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Interruptor de circuito (cerrado → abierto → semiabierto).
+                 Tras umbral_fallos fallos consecutivos rechaza las llamadas
+                 durante segundos_apertura; después deja pasar una de prueba.
+    """
+
+    CERRADO = 'cerrado'
+    ABIERTO = 'abierto'
+    SEMIABIERTO = 'semiabierto'
+
+    def __init__(self, umbral_fallos=5, segundos_apertura=30):
+        """Constructor del interruptor"""
+        self.umbral_fallos = umbral_fallos
+        self.segundos_apertura = segundos_apertura
+        self._candado = threading.Lock()
+        self._estado = self.CERRADO
+        self._fallos_consecutivos = 0
+        self._abierto_desde = 0.0
+
+    @property
+    def estado(self):
+        """Estado actual del interruptor"""
+        with self._candado:
+            return self._estado
+
+    def permitir(self):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Verifica si se permite una llamada al proveedor
+        Argumentos entrada: Ninguno
+        Returns: None
+        Raises:
+            CircuitoAbiertoError: Si el circuito está abierto
+        Modificaciones: Ninguna
+        """
+        with self._candado:
+            if self._estado == self.CERRADO:
+                return
+
+            restante = self._abierto_desde + self.segundos_apertura - time.monotonic()
+            if self._estado == self.ABIERTO and restante <= 0:
+                self._estado = self.SEMIABIERTO
+                return
+
+            raise CircuitoAbiertoError(
+                f"Proveedor no disponible temporalmente. Reintenta en {max(1, int(restante))} s",
+                reintentar_en=max(1, restante)
+            )
+
+    def registrar_exito(self):
+        """Cierra el circuito y reinicia el contador de fallos"""
+        with self._candado:
+            self._estado = self.CERRADO
+            self._fallos_consecutivos = 0
+
+    def registrar_fallo(self):
+        """Cuenta un fallo y abre el circuito al alcanzar el umbral"""
+        with self._candado:
+            self._fallos_consecutivos += 1
+            if (self._estado == self.SEMIABIERTO
+                    or self._fallos_consecutivos >= self.umbral_fallos):
+                self._estado = self.ABIERTO
+                self._abierto_desde = time.monotonic()
+
+
+class CuerpoMultipart:
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Cuerpo multipart/form-data que se lee del disco por bloques.
+                 A diferencia de files= de requests, no carga el archivo completo
+                 en memoria: la cabecera y el cierre del multipart son los únicos
+                 bytes que se construyen. Soporta tell/seek para que urllib3
+                 pueda rebobinarlo al reintentar.
+    """
+
+    TAMANO_BLOQUE = 64 * 1024
+
+    def __init__(self, campo, ruta_archivo, nombre_archivo=None,
+                 tipo_mime='application/octet-stream'):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Constructor del cuerpo multipart
+        Argumentos entrada:
+            campo (str): Nombre del campo del formulario (p. ej. 'image')
+            ruta_archivo (str): Archivo a enviar
+            nombre_archivo (str): Nombre informado al servidor
+            tipo_mime (str): Content-Type de la parte del archivo
+        Returns: Instancia de CuerpoMultipart
+        Modificaciones: Ninguna
+        """
+        limite = secrets.token_hex(16)
+        nombre_archivo = nombre_archivo or os.path.basename(ruta_archivo)
+
+        self.content_type = f'multipart/form-data; boundary={limite}'
+        self._cabecera = (
+            f'--{limite}\r\n'
+            f'Content-Disposition: form-data; name="{campo}"; filename="{nombre_archivo}"\r\n'
+            f'Content-Type: {tipo_mime}\r\n\r\n'
+        ).encode('utf-8')
+        self._cierre = f'\r\n--{limite}--\r\n'.encode('utf-8')
+
+        self._archivo = open(ruta_archivo, 'rb')
+        self._tamano_archivo = os.fstat(self._archivo.fileno()).st_size
+        self._inicio_cierre = len(self._cabecera) + self._tamano_archivo
+        self._longitud = self._inicio_cierre + len(self._cierre)
+        self._posicion = 0
+
+    def __len__(self):
+        return self._longitud
+
+    def __iter__(self):
+        while True:
+            bloque = self.read(self.TAMANO_BLOQUE)
+            if not bloque:
+                return
+            yield bloque
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        self.close()
+
+    def read(self, tamano=-1):
+        """Lee hasta tamano bytes desde la posición actual"""
+        if tamano is None or tamano < 0:
+            tamano = self._longitud - self._posicion
+
+        fragmentos = []
+        while tamano > 0 and self._posicion < self._longitud:
+            if self._posicion < len(self._cabecera):
+                datos = self._cabecera[self._posicion:self._posicion + tamano]
+            elif self._posicion < self._inicio_cierre:
+                desplazamiento = self._posicion - len(self._cabecera)
+                self._archivo.seek(desplazamiento)
+                datos = self._archivo.read(min(tamano, self._tamano_archivo - desplazamiento))
+                if not datos:
+                    raise IOError("El archivo se truncó durante el envío")
+            else:
+                desplazamiento = self._posicion - self._inicio_cierre
+                datos = self._cierre[desplazamiento:desplazamiento + tamano]
+
+            fragmentos.append(datos)
+            self._posicion += len(datos)
+            tamano -= len(datos)
+
+        return b''.join(fragmentos)
+
+    def tell(self):
+        return self._posicion
+
+    def seek(self, desplazamiento, desde=os.SEEK_SET):
+        if desde == os.SEEK_CUR:
+            desplazamiento += self._posicion
+        elif desde == os.SEEK_END:
+            desplazamiento += self._longitud
+        self._posicion = min(max(0, desplazamiento), self._longitud)
+        return self._posicion
+
+    def close(self):
+        self._archivo.close()
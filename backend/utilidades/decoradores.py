@@ -6,7 +6,7 @@ Descripción: Decoradores personalizados para rutas
 from functools import wraps
 from flask import request, jsonify
 from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
-from modelos import Usuario
+from servicios.servicio_auth import ServicioAuth
 
 def requiere_autenticacion(funcion):
     """Decorador que requiere autenticación JWT"""
@@ -15,10 +15,8 @@ def requiere_autenticacion(funcion):
         try:
             verify_jwt_in_request()
             usuario_id = get_jwt_identity()
-            # Convertir a int (viene como string desde JWT)
-            usuario = Usuario.query.get(int(usuario_id))
 
-            if not usuario or not usuario.activo:
+            if not ServicioAuth.usuario_activo(usuario_id):
                 return jsonify({
                     'exito': False,
                     'mensaje': 'Usuario no encontrado o inactivo',
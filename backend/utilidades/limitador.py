@@ -0,0 +1,335 @@
+"""
+Autor: Steeven Vargas
+Fecha: Noviembre 2024
+Descripción: Limitador de peticiones por ventana deslizante con costo constante
+             por petición. Cada clave guarda solo sus marcas de tiempo dentro de
+             la ventana (como máximo 'limite'), y las claves inactivas se
+             eliminan de forma perezosa con un heap ordenado por vencimiento.
+             Además de la versión en memoria hay almacenes compartidos entre
+             workers: SQLite (mismo host) y Redis (varios hosts).
+Argumentos entrada: Ninguno
+Returns: LimitadorMemoria, LimitadorSQLite, LimitadorRedis, crear_limitador, ResultadoLimite
+Modificaciones: Almacenes compartidos SQLite y Redis
+"""
+
+import heapq
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque, namedtuple
+from contextlib import closing
+
+
+ResultadoLimite = namedtuple('ResultadoLimite', ['permitido', 'restantes', 'reintentar_en'])
+
+
+class LimitadorMemoria:
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Ventana deslizante por clave en memoria del proceso, segura
+                 entre hilos
+    """
+
+    PURGAS_POR_PETICION = 2
+
+    def __init__(self, ventana_segundos=60, reloj=time.monotonic):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Constructor del limitador
+        Argumentos entrada:
+            ventana_segundos (float): Duración de la ventana deslizante
+            reloj (callable): Fuente de tiempo en segundos (inyectable en pruebas)
+        Returns: Instancia de LimitadorMemoria
+        Modificaciones: Ninguna
+        """
+        self.ventana_segundos = ventana_segundos
+        self._reloj = reloj
+        self._candado = threading.Lock()
+        self._marcas = {}
+        self._vencimientos = []
+
+    def registrar(self, clave, limite):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Cuenta una petición de la clave si no supera el límite
+        Argumentos entrada:
+            clave (str): Identificador del cliente
+            limite (int): Peticiones máximas dentro de la ventana
+        Returns:
+            ResultadoLimite: permitido, peticiones restantes y segundos hasta
+                             que se libere un cupo (0 si se permitió)
+        Modificaciones: Ninguna
+        """
+        if limite <= 0:
+            # Ruta deshabilitada (límite 0): se rechaza sin registrar nada
+            return ResultadoLimite(False, 0, self.ventana_segundos)
+
+        with self._candado:
+            ahora = self._reloj()
+            self._purgar(ahora)
+
+            marcas = self._marcas.get(clave)
+            if marcas is None:
+                marcas = deque()
+                self._marcas[clave] = marcas
+                heapq.heappush(self._vencimientos, (ahora + self.ventana_segundos, clave))
+
+            limite_inferior = ahora - self.ventana_segundos
+            while marcas and marcas[0] <= limite_inferior:
+                marcas.popleft()
+
+            if len(marcas) >= limite:
+                reintentar_en = marcas[len(marcas) - limite] + self.ventana_segundos - ahora
+                return ResultadoLimite(False, 0, max(reintentar_en, 0))
+
+            marcas.append(ahora)
+            return ResultadoLimite(True, limite - len(marcas), 0)
+
+    def _purgar(self, ahora):
+        """
+        Elimina hasta PURGAS_POR_PETICION claves vencidas (requiere el candado).
+        Una entrada del heap puede estar desactualizada si la clave recibió
+        peticiones después; en ese caso se vuelve a encolar con su vencimiento real.
+        """
+        for _ in range(self.PURGAS_POR_PETICION):
+            if not self._vencimientos or self._vencimientos[0][0] > ahora:
+                return
+
+            _, clave = heapq.heappop(self._vencimientos)
+            marcas = self._marcas.get(clave)
+            if marcas is None:
+                continue
+
+            vence = marcas[-1] + self.ventana_segundos if marcas else ahora
+            if vence <= ahora:
+                del self._marcas[clave]
+            else:
+                heapq.heappush(self._vencimientos, (vence, clave))
+
+    def limpiar(self):
+        """Elimina todos los contadores"""
+        with self._candado:
+            self._marcas.clear()
+            self._vencimientos.clear()
+
+    def __len__(self):
+        return len(self._marcas)
+
+
+class LimitadorSQLite:
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Ventana deslizante en un archivo SQLite (modo WAL) compartido
+                 por todos los workers del host. La consulta y el registro se
+                 hacen en una transacción IMMEDIATE, de modo que dos workers no
+                 pueden aprobar a la vez la última petición permitida. Cada hilo
+                 reutiliza su propia conexión (se reabre tras un fork).
+    """
+
+    PURGA_CADA = 1000
+    PURGA_MAXIMA = 500
+
+    def __init__(self, ruta_bd, ventana_segundos=60, reloj=time.time):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Constructor del limitador. Crea la tabla si no existe
+        Argumentos entrada:
+            ruta_bd (str): Archivo SQLite compartido
+            ventana_segundos (float): Duración de la ventana deslizante
+            reloj (callable): Tiempo de pared en segundos, común a todos los procesos
+        Returns: Instancia de LimitadorSQLite
+        Modificaciones: Ninguna
+        """
+        self.ruta_bd = ruta_bd
+        self.ventana_segundos = ventana_segundos
+        self._reloj = reloj
+        self._contador = 0
+        self._local = threading.local()
+
+        with closing(sqlite3.connect(ruta_bd, timeout=5, isolation_level=None)) as conexion:
+            conexion.execute('PRAGMA journal_mode=WAL')
+            conexion.execute(
+                'CREATE TABLE IF NOT EXISTS marcas_limite ('
+                'clave TEXT NOT NULL, '
+                'instante REAL NOT NULL)'
+            )
+            conexion.execute(
+                'CREATE INDEX IF NOT EXISTS ix_marcas_limite_clave '
+                'ON marcas_limite (clave, instante)'
+            )
+            conexion.execute(
+                'CREATE INDEX IF NOT EXISTS ix_marcas_limite_instante '
+                'ON marcas_limite (instante)'
+            )
+
+    def _conexion(self):
+        """
+        Conexión en modo autocommit del hilo actual, creada en su primer uso.
+        Con WAL, synchronous=NORMAL no arriesga la consistencia y evita un
+        fsync por petición (solo se podrían perder marcas ante un corte de luz).
+        """
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None or self._local.pid != os.getpid():
+            conexion = sqlite3.connect(self.ruta_bd, timeout=5, isolation_level=None)
+            conexion.execute('PRAGMA synchronous=NORMAL')
+            self._local.conexion = conexion
+            self._local.pid = os.getpid()
+        return conexion
+
+    def registrar(self, clave, limite):
+        """Cuenta una petición de la clave si no supera el límite (ver LimitadorMemoria)"""
+        if limite <= 0:
+            return ResultadoLimite(False, 0, self.ventana_segundos)
+
+        ahora = self._reloj()
+        limite_inferior = ahora - self.ventana_segundos
+        self._contador += 1
+
+        conexion = self._conexion()
+        conexion.execute('BEGIN IMMEDIATE')
+        try:
+            conexion.execute(
+                'DELETE FROM marcas_limite WHERE clave = ? AND instante <= ?',
+                (clave, limite_inferior)
+            )
+            if self._contador % self.PURGA_CADA == 0:
+                # Claves inactivas: se borra un bloque acotado para no alargar
+                # la transacción que bloquea a los demás workers
+                conexion.execute(
+                    'DELETE FROM marcas_limite WHERE rowid IN ('
+                    'SELECT rowid FROM marcas_limite WHERE instante <= ? LIMIT ?)',
+                    (limite_inferior, self.PURGA_MAXIMA)
+                )
+
+            marcas = [fila[0] for fila in conexion.execute(
+                'SELECT instante FROM marcas_limite WHERE clave = ? ORDER BY instante',
+                (clave,)
+            )]
+
+            if len(marcas) >= limite:
+                conexion.execute('COMMIT')
+                reintentar_en = marcas[len(marcas) - limite] + self.ventana_segundos - ahora
+                return ResultadoLimite(False, 0, max(reintentar_en, 0))
+
+            conexion.execute(
+                'INSERT INTO marcas_limite (clave, instante) VALUES (?, ?)',
+                (clave, ahora)
+            )
+            conexion.execute('COMMIT')
+        except Exception:
+            if conexion.in_transaction:
+                conexion.execute('ROLLBACK')
+            raise
+
+        return ResultadoLimite(True, limite - len(marcas) - 1, 0)
+
+    def limpiar(self):
+        """Elimina todos los contadores"""
+        self._conexion().execute('DELETE FROM marcas_limite')
+
+
+class LimitadorRedis:
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Ventana deslizante sobre un sorted set de Redis por clave.
+                 Funciona con cualquier cliente compatible con redis-py
+                 (pipeline, zadd, zcard, zrem, zrange, zremrangebyscore, pexpire).
+    """
+
+    def __init__(self, cliente, ventana_segundos=60, prefijo='limite:', reloj=time.time):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Constructor del limitador
+        Argumentos entrada:
+            cliente: Cliente Redis (redis.Redis o compatible)
+            ventana_segundos (float): Duración de la ventana deslizante
+            prefijo (str): Prefijo de las claves en Redis
+            reloj (callable): Tiempo de pared en segundos
+        Returns: Instancia de LimitadorRedis
+        Modificaciones: Ninguna
+        """
+        self.cliente = cliente
+        self.ventana_segundos = ventana_segundos
+        self.prefijo = prefijo
+        self._reloj = reloj
+
+    def registrar(self, clave, limite):
+        """
+        Cuenta una petición de la clave si no supera el límite (ver LimitadorMemoria).
+        La marca se agrega antes de contar, en la misma transacción, y se retira
+        si excede el límite: así dos workers no pueden superar el límite a la vez.
+        """
+        if limite <= 0:
+            return ResultadoLimite(False, 0, self.ventana_segundos)
+
+        ahora = self._reloj()
+        clave_redis = f'{self.prefijo}{clave}'
+        miembro = f'{ahora:.6f}:{uuid.uuid4().hex[:8]}'
+
+        pipeline = self.cliente.pipeline(transaction=True)
+        pipeline.zremrangebyscore(clave_redis, '-inf', ahora - self.ventana_segundos)
+        pipeline.zadd(clave_redis, {miembro: ahora})
+        pipeline.zcard(clave_redis)
+        pipeline.pexpire(clave_redis, int(self.ventana_segundos * 1000))
+        _, _, total, _ = pipeline.execute()
+
+        if total <= limite:
+            return ResultadoLimite(True, limite - total, 0)
+
+        self.cliente.zrem(clave_redis, miembro)
+        indice = total - 1 - limite
+        marcas = self.cliente.zrange(clave_redis, indice, indice, withscores=True)
+        reintentar_en = marcas[0][1] + self.ventana_segundos - ahora if marcas else self.ventana_segundos
+        return ResultadoLimite(False, 0, max(reintentar_en, 0))
+
+    def limpiar(self):
+        """Elimina todos los contadores con el prefijo del limitador"""
+        claves = list(self.cliente.scan_iter(match=f'{self.prefijo}*'))
+        if claves:
+            self.cliente.delete(*claves)
+
+
+def crear_limitador(backend='memoria', ventana_segundos=60, ruta_bd=None, url_redis=None):
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Crea el almacén del limitador según la configuración
+    Argumentos entrada:
+        backend (str): 'memoria' (por proceso), 'sqlite' (compartido en el host)
+                       o 'redis' (compartido entre hosts)
+        ventana_segundos (float): Duración de la ventana deslizante
+        ruta_bd (str): Archivo SQLite para el backend 'sqlite'
+        url_redis (str): URL de conexión para el backend 'redis'
+    Returns:
+        Limitador con el método registrar(clave, limite)
+    Raises:
+        ValueError: Si el backend no es válido o falta su configuración
+    Modificaciones: Ninguna
+    """
+    if backend == 'memoria':
+        return LimitadorMemoria(ventana_segundos)
+
+    if backend == 'sqlite':
+        if not ruta_bd:
+            raise ValueError("El backend 'sqlite' del limitador requiere LIMITADOR_RUTA_BD")
+        return LimitadorSQLite(ruta_bd, ventana_segundos)
+
+    if backend == 'redis':
+        if not url_redis:
+            raise ValueError("El backend 'redis' del limitador requiere LIMITADOR_URL_REDIS")
+        try:
+            import redis
+        except ImportError:
+            raise ValueError("El backend 'redis' del limitador requiere el paquete redis")
+        return LimitadorRedis(redis.Redis.from_url(url_redis), ventana_segundos)
+
+    raise ValueError(f"Backend de limitador no válido: {backend}. Use 'memoria', 'sqlite' o 'redis'")
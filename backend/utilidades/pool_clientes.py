@@ -0,0 +1,130 @@
+"""
+Autor: Steeven Vargas
+Fecha: Noviembre 2024
+Descripción: Pool de clientes de larga duración compartidos por todo el proceso.
+             Los clientes se crean de forma perezosa, se reparten en round-robin
+             y se recrean automáticamente tras un fork (workers de gunicorn).
+Argumentos entrada: Ninguno
+Returns: Clase PoolClientes
+Modificaciones: Ninguna
+"""
+
+import os
+import threading
+import weakref
+
+
+_pools_registrados = weakref.WeakSet()
+
+
+def _reiniciar_pools_tras_fork():
+    """Descarta los clientes heredados del proceso padre en el proceso hijo"""
+    for pool in list(_pools_registrados):
+        pool._reiniciar_en_hijo()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reiniciar_pools_tras_fork)
+
+
+class PoolClientes:
+    """
+    Autor: Steeven Vargas
+    Fecha: Noviembre 2024
+    Descripción: Pool de clientes seguro entre hilos y procesos
+    """
+
+    def __init__(self, fabrica):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Constructor del pool
+        Argumentos entrada:
+            fabrica (callable): Función que crea un cliente nuevo a partir de
+                                los argumentos pasados a obtener()
+        Returns: Instancia de PoolClientes
+        Modificaciones: Ninguna
+        """
+        self.fabrica = fabrica
+        self._candado = threading.Lock()
+        self._clientes = []
+        self._argumentos = None
+        self._tamano = 0
+        self._siguiente = 0
+        self._pid = os.getpid()
+        _pools_registrados.add(self)
+
+    def obtener(self, *argumentos_fabrica, tamano=1):
+        """
+        Autor: Steeven Vargas
+        Fecha: Noviembre 2024
+        Descripción: Retorna un cliente del pool, creándolo si es necesario.
+                     Si cambian los argumentos de la fábrica o el tamaño, el pool
+                     se reconstruye.
+        Argumentos entrada:
+            *argumentos_fabrica: Argumentos con los que se crea cada cliente
+            tamano (int): Número de clientes (canales) del pool
+        Returns:
+            object: Cliente listo para usar
+        Modificaciones: Ninguna
+        """
+        tamano = max(1, int(tamano))
+
+        with self._candado:
+            if self._pid != os.getpid():
+                self._descartar()
+                self._pid = os.getpid()
+
+            if self._argumentos != argumentos_fabrica or self._tamano != tamano:
+                self._descartar()
+                self._argumentos = argumentos_fabrica
+                self._tamano = tamano
+
+            indice = self._siguiente % tamano
+            self._siguiente = indice + 1
+
+            if indice == len(self._clientes):
+                self._clientes.append(self.fabrica(*argumentos_fabrica))
+
+            return self._clientes[indice]
+
+    def reiniciar(self):
+        """Descarta todos los clientes; el siguiente obtener() crea nuevos"""
+        with self._candado:
+            self._descartar()
+            self._argumentos = None
+            self._tamano = 0
+
+    def _descartar(self):
+        """
+        Cierra y elimina los clientes actuales (requiere el candado tomado).
+        Los pools de hilos (ThreadPoolExecutor) se apagan sin esperar: sus
+        tareas en curso terminan y luego los hilos salen.
+        """
+        for cliente in self._clientes:
+            if callable(getattr(cliente, 'shutdown', None)):
+                cliente.shutdown(wait=False)
+                continue
+            cerrar = getattr(cliente, 'close', None)
+            if not callable(cerrar):
+                cerrar = getattr(getattr(cliente, 'transport', None), 'close', None)
+            if callable(cerrar):
+                try:
+                    cerrar()
+                except Exception:
+                    pass
+        self._clientes = []
+        self._siguiente = 0
+
+    def _reiniciar_en_hijo(self):
+        """
+        Tras un fork el candado puede haber quedado tomado y los canales gRPC del
+        padre no son utilizables: se reemplazan sin cerrarlos.
+        """
+        self._candado = threading.Lock()
+        self._clientes = []
+        self._siguiente = 0
+        self._pid = os.getpid()
+
+    def __len__(self):
+        return len(self._clientes)
@@ -36,10 +36,14 @@ def validar_nombre_usuario(nombre):
     
     return True, "Nombre de usuario válido"
 
+def validar_extension(nombre_archivo):
+    """Valida que el nombre de archivo tenga extensión de imagen"""
+    extensiones_permitidas = {'jpg', 'jpeg', 'png', 'gif', 'webp'}
+    return '.' in nombre_archivo and            nombre_archivo.rsplit('.', 1)[1].lower() in extensiones_permitidas
+
 def validar_tipo_archivo(archivo):
     """Valida que el archivo sea una imagen"""
-    extensiones_permitidas = {'jpg', 'jpeg', 'png', 'gif', 'webp'}
-    return '.' in archivo.filename and            archivo.filename.rsplit('.', 1)[1].lower() in extensiones_permitidas
+    return validar_extension(archivo.filename)
 
 def validar_tamano_archivo(archivo, tamano_maximo=5*1024*1024):
     """Valida el tamaño del archivo"""
@@ -48,6 +52,18 @@ def validar_tamano_archivo(archivo, tamano_maximo=5*1024*1024):
     archivo.seek(0)
     return tamano <= tamano_maximo
 
+def validar_contenido_imagen(archivo):
+    """Valida por la firma de los primeros bytes que el contenido es jpg, png, gif o webp"""
+    archivo.seek(0)
+    cabecera = archivo.read(12)
+    archivo.seek(0)
+    return (
+        cabecera.startswith(b'\xff\xd8\xff')
+        or cabecera.startswith(b'\x89PNG\r\n\x1a\n')
+        or cabecera[:6] in (b'GIF87a', b'GIF89a')
+        or (cabecera[:4] == b'RIFF' and cabecera[8:12] == b'WEBP')
+    )
+
 def es_imagen_valida(archivo):
     """Verifica que el archivo es una imagen válida"""
     if not archivo:
@@ -59,4 +75,7 @@ def es_imagen_valida(archivo):
     if not validar_tamano_archivo(archivo):
         return False, "El archivo es demasiado grande. Máximo 5MB"
     
+    if not validar_contenido_imagen(archivo):
+        return False, "El contenido del archivo no es una imagen válida"
+    
     return True, "Imagen válida"